@@ -4,17 +4,360 @@ Logospace API Server: Flask-based Python backend
 Provides consciousness analysis via REST API
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, abort, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from consciousness_analyzer import analyze_code_files
+from consciousness_analyzer import (
+    ANALYSIS_SECTIONS, APPROXIMATION_SECTION, GRAPH_SECTION, PREFILTER_SECTION, AnalysisBudget, ConsciousnessAnalyzer,
+    analyze_code_files, analyze_many, create_worker_pool, files_digest, resolve_sections, shard_contents, warmup,
+)
+from feature_cache import FeatureCache, ResultCache
+from feature_index import FeatureIndex
+from instrumentation import METRICS, Profile
+from job_queue import JobQueue, QueueFull
+from rule_registry import DEFAULT_CACHE_DIR, RuleRegistry
+from serialization import FastJSONProvider, accepts_gzip, compress_response, dumps, gzip_stream
+from snapshot_store import SnapshotStore
+from streaming import STREAM_FORMATS, analyze_stream
+from webhooks import FakeEventSource, GitSource, InvalidSignature, WebhookPipeline
+import atexit
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Largest request body accepted. The streaming endpoint reads its upload
+# incrementally and has its own limit, none when MAX_STREAM_BYTES is unset.
+max_request_bytes = int(os.getenv('MAX_REQUEST_BYTES') or 64 * 1024 * 1024)
+max_stream_bytes = int(os.getenv('MAX_STREAM_BYTES') or 0) or None
+STREAMING_PATHS = frozenset({'/api/analyze/stream'})
+
+
+class APIRequest(Request):
+    """
+    Request whose body size limit depends on the endpoint
+    """
+    
+    @property
+    def max_content_length(self):
+        return max_stream_bytes if self.path in STREAMING_PATHS else max_request_bytes
+
+
 app = Flask(__name__)
+app.request_class = APIRequest
+app.json = FastJSONProvider(app)
 CORS(app)
 
+# Per-file features shared by all requests, so re-analyzing a repository
+# only scans the files whose content changed.
+feature_cache = FeatureCache(
+    max_entries=int(os.getenv('FEATURE_CACHE_SIZE', 50000)),
+    path=os.getenv('FEATURE_CACHE_PATH') or None,
+)
+
+# Worker processes for large repositories; created once so requests never
+# pay process start-up. ANALYSIS_WORKERS <= 1 keeps analysis in-process.
+analysis_workers = int(os.getenv('ANALYSIS_WORKERS', 0))
+worker_pool = create_worker_pool(analysis_workers) if analysis_workers > 1 else None
+
+# 'ast' counts functions, classes, recursion and branches of Python files
+# from their syntax tree: more accurate than the default 'regex', not
+# faster. A module seen for the first time costs a few times its regex
+# scan (the ast suite of benchmark.py); the feature cache and the parsed
+# structure cache spare later analyses, and ANALYSIS_WORKERS parse large
+# repositories in parallel.
+python_backend = os.getenv('PYTHON_BACKEND', 'regex')
+
+# Adds the import graph (cycles, fan-in/fan-out, cascades) to analyses and
+# derives their feedback loops and cascading effects from it.
+module_graph = os.getenv('MODULE_GRAPH', '').lower() in ('1', 'true')
+
+# Leaves vendored, generated and minified files out of analyses and
+# analyzes duplicate files once.
+prefilter = os.getenv('PREFILTER', '').lower() in ('1', 'true')
+
+# Counts keyword rules on the identifiers of each file, so they no longer
+# match inside strings, comments or unrelated words. An accuracy option:
+# lexing costs about what the keyword scans it replaces do (the tokens
+# suite of benchmark.py times both).
+tokenize = os.getenv('TOKENIZE', '').lower() in ('1', 'true')
+
+# Per-request limits: past them the response carries a partial analysis
+# flagged "truncated" instead of tying up the worker. Unset means no limit.
+time_budget = float(os.getenv('ANALYSIS_TIME_BUDGET') or 0) or None
+byte_budget = int(os.getenv('ANALYSIS_MAX_BYTES') or 0) or None
+
+# Within those limits, analyze a stratified sample of the files and
+# extrapolate, instead of stopping the scan where they run out; the
+# 'approximation' section bounds the estimated level and risk tier.
+approximate = os.getenv('APPROXIMATE', '').lower() in ('1', 'true')
+
+default_sections = ANALYSIS_SECTIONS + tuple(
+    section for section, enabled in ((GRAPH_SECTION, module_graph), (PREFILTER_SECTION, prefilter),
+                                     (APPROXIMATION_SECTION, approximate)) if enabled
+)
+
+# Pattern packs (JSON or YAML) layered over the built-in rules. RULES_PATH
+# is a pack or a directory of packs; they are re-read when their files
+# change, checked at most every RULES_RELOAD_INTERVAL seconds, or on
+# POST /api/rules/reload.
+rule_registry = RuleRegistry(
+    path=os.getenv('RULES_PATH') or None,
+    cache_dir=os.getenv('RULES_CACHE_PATH') or DEFAULT_CACHE_DIR,
+    reload_interval=float(os.getenv('RULES_RELOAD_INTERVAL', 5)),
+)
+
+# Per-file features of analyzed commits, so a push only scans changed files.
+# Without SNAPSHOT_STORE_PATH snapshots live in memory until restart.
+snapshot_store = SnapshotStore(
+    path=os.getenv('SNAPSHOT_STORE_PATH') or None,
+    analyzer=ConsciousnessAnalyzer(
+        feature_cache=feature_cache, executor=worker_pool, python_backend=python_backend, rules=rule_registry.current,
+        tokens=tokenize,
+    ),
+)
+
+# Consciousness level and metrics of every analysis that names its
+# repository and commit, for organization-wide trend queries under
+# /api/index. Off unless FEATURE_INDEX_PATH (a directory) is set.
+feature_index_path = os.getenv('FEATURE_INDEX_PATH') or None
+feature_index = FeatureIndex(feature_index_path) if feature_index_path else None
+
+# Finished analyses keyed by payload digest: clients usually call several
+# endpoints with the same files back to back.
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 300)),
+)
+
+
+# Analysis sections each endpoint serializes; None means all of them.
+PREDICT_SECTIONS = ('consciousness_level', 'future_predictions', 'risk_assessment')
+PATTERN_SECTIONS = ('patterns_detected', 'behavioral_loops', 'psychological_triggers', 'emergent_properties')
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.before_request
+def refresh_rules():
+    if rule_registry.refresh():
+        snapshot_store.use_rules(rule_registry.current)
+
+
+@app.before_request
+def limit_request_size():
+    limit = request.max_content_length
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        abort(413)
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({
+        'status': 'error',
+        'error': f'Request body exceeds {request.max_content_length} bytes',
+    }), 413
+
+
+@app.after_request
+def count_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    METRICS.inc('logospace_requests_total', endpoint=endpoint, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        METRICS.inc('logospace_request_seconds_total', time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding', ''))
+
+
+def request_profile():
+    """
+    Stage timers for this request; ?profile=1 also times every pattern
+    family and the slowest files, and returns them in the response
+    """
+    return Profile(detail=request.args.get('profile') in ('1', 'true'))
+
+
+def request_budget():
+    """
+    Time and size budget for this request's analysis, if limits are set
+    """
+    if time_budget is None and byte_budget is None:
+        return None
+    return AnalysisBudget(seconds=time_budget, max_bytes=byte_budget)
+
+
+def index_analysis(data, analysis, repository=None, budget=None):
+    """
+    Record an analysis in the feature index when the request names the
+    commit (and repository) it is of; truncated analyses are left out
+    """
+    repository = repository or data.get('repository')
+    commit = data.get('commit')
+    if feature_index is None or not repository or not commit:
+        return
+    if budget is not None and budget.truncated:
+        return
+    feature_index.add(repository, commit, analysis, data.get('timestamp'))
+
+
+def index_query(query):
+    """
+    Answer a feature index query from the request's arguments
+    """
+    if feature_index is None:
+        return jsonify({
+            'status': 'error',
+            'error': 'Feature index is not configured (set FEATURE_INDEX_PATH)',
+        }), 404
+    try:
+        return jsonify({
+            'status': 'success',
+            'result': query(request.args),
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+def optional_float(args, name):
+    value = args.get(name)
+    return float(value) if value not in (None, '') else None
+
+
+def finish_response(body, profile, budget=None):
+    """
+    Add a finished profile to /metrics, and to the response body when the
+    client asked for it; flag analyses the budget cut short
+    """
+    METRICS.record(profile)
+    if profile.detail:
+        body['timings'] = profile.to_dict()
+    if budget is not None and budget.truncated:
+        METRICS.inc('logospace_truncated_analyses_total')
+        body['truncated'] = True
+        body['budget'] = budget.to_dict()
+    return body
+
+
+def run_analysis(files, sections=None, profile=None, budget=None, rules=None):
+    """
+    Analyze a files payload once and serve repeats from the result cache.
+    Only the requested sections are computed; sections computed for other
+    endpoints accumulate in the cached entry. Analyses truncated by the
+    budget are not cached. Uses the current ruleset unless given ``rules``.
+    """
+    rules = rules or rule_registry.current
+    key = files_digest(files) + ':' + rules.fingerprint
+    cached = result_cache.get(key) or {}
+    wanted = default_sections if sections is None else sections
+    missing = [section for section in wanted if section not in cached]
+    if not missing:
+        return cached
+    
+    computed = analyze_code_files(
+        files, feature_cache=feature_cache, executor=worker_pool, sections=missing,
+        python_backend=python_backend, profile=profile, budget=budget, module_graph=module_graph,
+        prefilter=prefilter, rules=rules, tokens=tokenize, approximate=approximate,
+    )
+    analysis = {**cached, **computed}
+    if budget is None or not budget.truncated:
+        result_cache.put(key, analysis)
+    return analysis
+
+
+# Content handled between two progress updates of a background job.
+JOB_BATCH_BYTES = 8 * 1024 * 1024
+
+
+def run_job(job):
+    """
+    Analyze a queued payload: extract features batch by batch into the
+    feature cache, reporting progress, then assemble the analysis from it
+    """
+    files = job.payload['files']
+    sections = job.payload.get('sections')
+    rules = rule_registry.current
+    _, families, structure = resolve_sections(sections, rules)
+    analyzer = ConsciousnessAnalyzer(
+        feature_cache=feature_cache, executor=worker_pool, python_backend=python_backend, rules=rules,
+        tokens=tokenize,
+    )
+    scanned = analyzer.plan_files(files).files if prefilter else files
+    batches = shard_contents(list(scanned.items()), JOB_BATCH_BYTES)
+    done = 0
+    for batch in batches:
+        analyzer.extract_repository_features(dict(batch), families, structure)
+        done += len(batch)
+        job.report(0.95 * done / len(scanned))
+    return run_analysis(files, sections, rules=rules)
+
+
+# Background analyses for payloads too large to answer within a request.
+# JOB_QUEUE_PATH keeps queued jobs and results in SQLite across restarts.
+job_queue = JobQueue(
+    run_job,
+    workers=int(os.getenv('JOB_WORKERS', 2)),
+    max_pending=int(os.getenv('JOB_QUEUE_SIZE', 64)),
+    path=os.getenv('JOB_QUEUE_PATH') or None,
+    result_ttl=float(os.getenv('JOB_RESULT_TTL', 3600)),
+)
+
+
+def analyze_webhook_event(event):
+    """
+    Analyze the commit a coalesced push or pull request event points at
+    """
+    files = webhook_source.files(event.repository, event.commit)
+    analysis = run_analysis(files)
+    index_analysis({'commit': event.commit}, analysis, event.repository)
+    return {
+        'consciousness_level': analysis['consciousness_level'],
+        'risk_level': analysis['risk_assessment']['risk_level'],
+        'files': len(files),
+    }
+
+
+# GitHub push and pull_request deliveries on POST /api/webhooks/github,
+# checked against GITHUB_WEBHOOK_SECRET. Commits are read from local clones
+# under WEBHOOK_REPOSITORIES_PATH (kept fetched by a mirror job), or from
+# synthetic files with WEBHOOK_SOURCE=fake (see ``python webhooks.py``).
+# Pushes to a branch within WEBHOOK_DEBOUNCE seconds of each other are
+# analyzed once, at the latest commit. With several server processes, set
+# WEBHOOK_STATE_PATH so they coalesce in one shared queue; otherwise each
+# process coalesces only the deliveries it receives.
+webhook_secret = os.getenv('GITHUB_WEBHOOK_SECRET') or None
+if os.getenv('WEBHOOK_SOURCE') == 'fake':
+    webhook_source = FakeEventSource(webhook_secret or '')
+elif os.getenv('WEBHOOK_REPOSITORIES_PATH'):
+    webhook_source = GitSource(os.getenv('WEBHOOK_REPOSITORIES_PATH'))
+else:
+    webhook_source = None
+webhook_pipeline = WebhookPipeline(
+    analyze_webhook_event,
+    secret=webhook_secret,
+    workers=int(os.getenv('WEBHOOK_WORKERS', 2)),
+    debounce=float(os.getenv('WEBHOOK_DEBOUNCE', 2)),
+    max_pending=int(os.getenv('WEBHOOK_QUEUE_SIZE', 256)),
+    path=os.getenv('WEBHOOK_STATE_PATH') or None,
+) if webhook_secret and webhook_source is not None else None
+
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_code():
     """
@@ -25,8 +368,13 @@ def analyze_code():
         "files": {
             "filename.py": "code content",
             "another.js": "code content"
-        }
+        },
+        "repository": "owner/repo",
+        "commit": "sha"
     }
+    
+    Analyses that name their repository and commit (and optionally a
+    "timestamp") are recorded in the feature index.
     """
     try:
         data = request.json
@@ -36,10 +384,159 @@ def analyze_code():
             return jsonify({'error': 'No files provided'}), 400
         
         # Perform analysis
-        analysis = analyze_code_files(files)
+        profile = request_profile()
+        budget = request_budget()
+        analysis = run_analysis(files, profile=profile, budget=budget)
+        index_analysis(data, analysis, budget=budget)
         
+        return jsonify(finish_response({
+            'status': 'success',
+            'analysis': analysis,
+        }, profile, budget))
+    
+    except Exception as e:
         return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_code_stream():
+    """
+    Analyze a large upload without loading it into memory
+    
+    Request body, selected by Content-Type:
+    - application/x-ndjson: one {"path": ..., "content": ...} object per line
+    - application/x-tar or application/gzip: a (compressed) tar archive
+    - application/zip: a zip archive
+    """
+    try:
+        stream_format = STREAM_FORMATS.get(request.mimetype)
+        if stream_format is None:
+            return jsonify({
+                'error': f"Unsupported Content-Type, expected one of: {', '.join(sorted(STREAM_FORMATS))}",
+            }), 415
+        
+        profile = request_profile()
+        budget = request_budget()
+        analysis, files_analyzed = analyze_stream(
+            request.stream, stream_format, profile=profile, budget=budget, rules=rule_registry.current,
+        )
+        
+        return jsonify(finish_response({
             'status': 'success',
+            'files_analyzed': files_analyzed,
+            'analysis': analysis,
+        }, profile, budget))
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_code_batch():
+    """
+    Analyze many repositories in one call, streaming one NDJSON line per
+    repository as its analysis finishes
+    
+    Request body:
+    {
+        "repositories": {
+            "owner/repo": {"filename.py": "code content"},
+            "owner/other": {"another.js": "code content"}
+        },
+        "sections": ["consciousness_level"]  (optional)
+    }
+    
+    Response lines: {"status": "success", "repository": ..., "analysis": ...}
+    """
+    try:
+        data = request.json
+        repositories = data.get('repositories', {})
+        sections = data.get('sections')
+        
+        if not repositories:
+            return jsonify({'error': 'No repositories provided'}), 400
+        resolve_sections(sections)
+    
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+    
+    wanted = default_sections if sections is None else sections
+    rules = rule_registry.current
+    
+    def generate():
+        # Repositories analyzed recently are answered from the result cache.
+        digests = {}
+        uncached = {}
+        for name, files in repositories.items():
+            digests[name] = files_digest(files) + ':' + rules.fingerprint
+            cached = result_cache.get(digests[name]) or {}
+            if all(section in cached for section in wanted):
+                yield dumps({'status': 'success', 'repository': name, 'analysis': cached}) + '\n'
+            else:
+                uncached[name] = files
+        
+        try:
+            for name, analysis in analyze_many(
+                uncached, feature_cache=feature_cache, executor=worker_pool, sections=sections,
+                python_backend=python_backend, module_graph=module_graph, prefilter=prefilter, rules=rules,
+                tokens=tokenize, approximate=approximate,
+            ):
+                analysis = {**(result_cache.get(digests[name]) or {}), **analysis}
+                result_cache.put(digests[name], analysis)
+                yield dumps({'status': 'success', 'repository': name, 'analysis': analysis}) + '\n'
+        except Exception as e:
+            yield dumps({'status': 'error', 'error': str(e)}) + '\n'
+    
+    if accepts_gzip(request.headers.get('Accept-Encoding', '')):
+        response = Response(stream_with_context(gzip_stream(generate())), mimetype='application/x-ndjson')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/snapshots', methods=['POST'])
+def create_snapshot():
+    """
+    Analyze a repository and store it as a snapshot that later pushes can
+    be diffed against
+    
+    Request body:
+    {
+        "repository": "owner/repo",
+        "files": {"filename.py": "code content"},
+        "commit": "sha"  (optional: recorded in the feature index)
+    }
+    """
+    try:
+        data = request.json
+        repository = data.get('repository')
+        files = data.get('files', {})
+        
+        if not repository:
+            return jsonify({'error': 'No repository provided'}), 400
+        
+        snapshot_id = snapshot_store.create_snapshot(repository, files)
+        analysis = snapshot_store.analyze(snapshot_id)
+        index_analysis(data, analysis, repository)
+        
+        return jsonify({
+            'status': 'success',
+            'snapshot': snapshot_store.snapshot_info(snapshot_id),
             'analysis': analysis,
         })
     
@@ -50,6 +547,71 @@ def analyze_code():
         }), 500
 
 
+@app.route('/api/snapshots/<int:snapshot_id>/diff', methods=['POST'])
+def diff_snapshot(snapshot_id):
+    """
+    Apply changed files to a snapshot and return the new snapshot's
+    analysis; only added and modified files are scanned
+    
+    Request body:
+    {
+        "added": {"new.py": "code content"},
+        "modified": {"changed.py": "new code content"},
+        "deleted": ["removed.py"],
+        "commit": "sha"  (optional: recorded in the feature index)
+    }
+    """
+    try:
+        data = request.json
+        new_id = snapshot_store.apply_diff(
+            snapshot_id, data.get('added'), data.get('modified'), data.get('deleted'),
+        )
+        snapshot = snapshot_store.snapshot_info(new_id)
+        analysis = snapshot_store.analyze(new_id)
+        index_analysis(data, analysis, snapshot['repository'])
+        
+        return jsonify({
+            'status': 'success',
+            'snapshot': snapshot,
+            'analysis': analysis,
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/snapshots/<int:snapshot_id>', methods=['GET'])
+def get_snapshot(snapshot_id):
+    """
+    Analysis of a stored snapshot
+    """
+    try:
+        return jsonify({
+            'status': 'success',
+            'snapshot': snapshot_store.snapshot_info(snapshot_id),
+            'analysis': snapshot_store.analyze(snapshot_id),
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 404
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
 @app.route('/api/predict-consciousness', methods=['POST'])
 def predict_consciousness():
     """
@@ -59,14 +621,16 @@ def predict_consciousness():
         data = request.json
         files = data.get('files', {})
         
-        analysis = analyze_code_files(files)
+        profile = request_profile()
+        budget = request_budget()
+        analysis = run_analysis(files, PREDICT_SECTIONS, profile, budget)
         
-        return jsonify({
+        return jsonify(finish_response({
             'status': 'success',
             'consciousness_level': analysis['consciousness_level'],
             'predictions': analysis['future_predictions'],
             'risk_assessment': analysis['risk_assessment'],
-        })
+        }, profile, budget))
     
     except Exception as e:
         return jsonify({
@@ -84,15 +648,17 @@ def detect_patterns():
         data = request.json
         files = data.get('files', {})
         
-        analysis = analyze_code_files(files)
+        profile = request_profile()
+        budget = request_budget()
+        analysis = run_analysis(files, PATTERN_SECTIONS, profile, budget)
         
-        return jsonify({
+        return jsonify(finish_response({
             'status': 'success',
             'patterns': analysis['patterns_detected'],
             'behavioral_loops': analysis['behavioral_loops'],
             'psychological_triggers': analysis['psychological_triggers'],
             'emergent_properties': analysis['emergent_properties'],
-        })
+        }, profile, budget))
     
     except Exception as e:
         return jsonify({
@@ -111,7 +677,9 @@ def consciousness_report():
         files = data.get('files', {})
         repository_name = data.get('repository_name', 'Unknown')
         
-        analysis = analyze_code_files(files)
+        profile = request_profile()
+        budget = request_budget()
+        analysis = run_analysis(files, profile=profile, budget=budget)
         
         report = {
             'title': '🌌 Digital Consciousness Analysis Report',
@@ -133,9 +701,207 @@ def consciousness_report():
             },
         }
         
-        return jsonify({
+        return jsonify(finish_response({
             'status': 'success',
             'report': report,
+        }, profile, budget))
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue an analysis and return its job id; poll GET /api/jobs/<id>
+
+    Request body:
+    {
+        "files": {"filename.py": "code content"},
+        "sections": ["consciousness_level", "risk_assessment"]  (optional)
+    }
+
+    Identical payloads already queued or running share one job. Answers 429
+    while the queue is full.
+    """
+    try:
+        data = request.json
+        files = data.get('files', {})
+        sections = data.get('sections')
+
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+        if sections is not None:
+            resolve_sections(sections)
+            sections = sorted(set(sections))
+
+        key = files_digest(files) + ':' + rule_registry.current.fingerprint + ':' + ','.join(sections or ('*',))
+        try:
+            job, created = job_queue.submit(key, {'files': files, 'sections': sections})
+        except QueueFull as e:
+            METRICS.inc('logospace_jobs_total', outcome='rejected')
+            response = jsonify({
+                'status': 'error',
+                'error': f'Job queue is full: {e}',
+            })
+            response.headers['Retry-After'] = '5'
+            return response, 429
+
+        METRICS.inc('logospace_jobs_total', outcome='queued' if created else 'deduplicated')
+        response = jsonify({
+            'status': 'success',
+            'job': job.to_dict(include_result=False),
+            'deduplicated': not created,
+        })
+        response.headers['Location'] = f'/api/jobs/{job.id}'
+        return response, 202
+
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status, progress and, once done, the analysis of a queued job
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'error': 'Unknown job',
+            }), 404
+        return jsonify({
+            'status': 'success',
+            'job': job.to_dict(),
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/index/series', methods=['GET'])
+def index_series():
+    """
+    Values of a column over time
+    
+    Query: column (default consciousness_level), repository, start, end
+    (Unix times) and bucket (seconds; required without a repository)
+    """
+    return index_query(lambda args: feature_index.time_series(
+        args.get('column', 'consciousness_level'), args.get('repository') or None,
+        optional_float(args, 'start'), optional_float(args, 'end'), optional_float(args, 'bucket'),
+    ))
+
+
+@app.route('/api/index/top', methods=['GET'])
+def index_top():
+    """
+    Repositories with the highest value of a column in their latest analysis
+    
+    Query: column, n (default 10), at (Unix time: latest analysis up to
+    then) and lowest=1 for the lowest values instead
+    """
+    return index_query(lambda args: feature_index.top(
+        args.get('column', 'consciousness_level'), int(args.get('n', 10)), optional_float(args, 'at'),
+        args.get('lowest') in ('1', 'true'),
+    ))
+
+
+@app.route('/api/index/percentiles', methods=['GET'])
+def index_percentiles():
+    """
+    Percentiles of a column
+    
+    Query: column, q (comma-separated, default 50,90,99), repository,
+    start, end, and latest=1 for the latest analysis of every repository
+    """
+    return index_query(lambda args: feature_index.percentiles(
+        args.get('column', 'consciousness_level'),
+        [float(value) for value in args.get('q', '50,90,99').split(',')],
+        args.get('repository') or None, optional_float(args, 'start'), optional_float(args, 'end'),
+        args.get('latest') in ('1', 'true'),
+    ))
+
+
+@app.route('/api/webhooks/github', methods=['POST'])
+def github_webhook():
+    """
+    Receive a GitHub delivery (push, pull_request; others are ignored)
+    and queue its commit for analysis
+    
+    Answers 202 once the event is queued or merged into a pending one for
+    the same branch, 401 when the X-Hub-Signature-256 header does not
+    match, 429 when too many branches are waiting.
+    """
+    if webhook_pipeline is None:
+        return jsonify({
+            'status': 'error',
+            'error': 'Webhook ingestion is not configured',
+        }), 404
+    try:
+        outcome = webhook_pipeline.receive(
+            request.headers.get('X-GitHub-Event', ''), request.get_data(),
+            request.headers.get('X-Hub-Signature-256'), request.headers.get('X-GitHub-Delivery', ''),
+        )
+        
+        return jsonify({
+            'status': 'success',
+            'webhook': outcome,
+        }), 202 if outcome['status'] != 'ignored' else 200
+    
+    except InvalidSignature as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 401
+    except QueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 429
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/api/webhooks', methods=['GET'])
+def webhook_status():
+    """
+    Webhook pipeline counters and the latest analysis of each branch
+    """
+    if webhook_pipeline is None:
+        return jsonify({
+            'status': 'error',
+            'error': 'Webhook ingestion is not configured',
+        }), 404
+    try:
+        return jsonify({
+            'status': 'success',
+            'stats': webhook_pipeline.stats(),
+            'results': webhook_pipeline.results(),
         })
     
     except Exception as e:
@@ -154,9 +920,76 @@ def health():
         'status': 'healthy',
         'service': 'Logospace Python API Server',
         'version': '1.0.0',
+        'caches': {
+            'results': result_cache.stats(),
+            'features': feature_cache.stats(),
+        },
+        'jobs': job_queue.stats(),
+        'snapshots': snapshot_store.stats(),
+        'rules': {'fingerprint': rule_registry.current.fingerprint, 'error': rule_registry.error},
+        'index': feature_index.stats() if feature_index is not None else None,
+        'webhooks': webhook_pipeline.stats() if webhook_pipeline is not None else None,
     })
 
 
+@app.route('/api/rules', methods=['GET'])
+def get_rules():
+    """
+    The active ruleset and the packs it was built from
+    """
+    return jsonify({
+        'status': 'success',
+        'rules': rule_registry.info(),
+    })
+
+
+@app.route('/api/rules/reload', methods=['POST'])
+def reload_rules():
+    """
+    Load the pattern packs again without restarting the server; an invalid
+    pack is reported and the current ruleset stays in place
+    """
+    try:
+        rules = rule_registry.reload()
+        snapshot_store.use_rules(rules)
+        
+        return jsonify({
+            'status': 'success',
+            'rules': rule_registry.info(),
+        })
+    
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'error': str(e),
+        }), 500
+
+
+@app.route('/warmup', methods=['GET'])
+def warm_up():
+    """
+    Run a small analysis through every stage, for platforms that ping new
+    instances before routing traffic to them
+    """
+    return jsonify({
+        'status': 'success',
+        'seconds': round(warmup(), 6),
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Request, stage and pattern family counters in the Prometheus text format
+    """
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/', methods=['GET'])
 def index():
     """
@@ -167,14 +1000,55 @@ def index():
         'description': 'Python backend for digital consciousness detection',
         'endpoints': {
             '/api/analyze': 'POST - Analyze code for consciousness patterns',
+            '/api/analyze/stream': 'POST - Analyze an NDJSON, tar or zip upload incrementally',
+            '/api/analyze/batch': 'POST - Analyze many repositories, streaming NDJSON results as they finish',
             '/api/predict-consciousness': 'POST - Predict future consciousness evolution',
             '/api/detect-patterns': 'POST - Detect consciousness patterns',
             '/api/consciousness-report': 'POST - Generate comprehensive report',
+            '/api/snapshots': 'POST - Analyze a repository and store it as a snapshot',
+            '/api/snapshots/<id>/diff': 'POST - Re-analyze a snapshot from added/modified/deleted files',
+            '/api/snapshots/<id>': 'GET - Analysis of a stored snapshot',
+            '/api/jobs': 'POST - Queue an analysis of a large payload (202 with a job id, 429 when full)',
+            '/api/jobs/<id>': 'GET - Status, progress and result of a queued analysis',
+            '/api/rules': 'GET - Active ruleset and the pattern packs it was built from',
+            '/api/rules/reload': 'POST - Reload the pattern packs under RULES_PATH',
+            '/api/index/series': 'GET - Time series of an indexed metric, per repository or bucketed org-wide',
+            '/api/index/top': 'GET - Repositories with the highest latest value of an indexed metric',
+            '/api/index/percentiles': 'GET - Percentiles of an indexed metric',
+            '/api/webhooks/github': 'POST - GitHub push/pull_request deliveries, coalesced per branch',
+            '/api/webhooks': 'GET - Webhook pipeline counters and latest analysis per branch',
             '/health': 'GET - Health check',
+            '/warmup': 'GET - Load lazily imported modules before the first request',
+            '/metrics': 'GET - Prometheus metrics (add ?profile=1 to analysis requests for a timings block)',
         },
     })
 
 
+def shutdown_services():
+    """
+    Let running jobs finish, then release the worker processes and database
+    files; called when a server process exits
+    """
+    job_queue.shutdown()
+    if webhook_pipeline is not None:
+        webhook_pipeline.shutdown()
+    if worker_pool is not None:
+        worker_pool.shutdown(cancel_futures=True)
+    feature_cache.close()
+    snapshot_store.close()
+
+
+def create_app():
+    """
+    Application factory for WSGI servers:
+    ``gunicorn -c gunicorn.conf.py 'api_server:create_app()'``
+    """
+    if not app.config.get('SERVICES_REGISTERED'):
+        atexit.register(shutdown_services)
+        app.config['SERVICES_REGISTERED'] = True
+    return app
+
+
 if __name__ == '__main__':
     port = int(os.getenv('PYTHON_PORT', 5000))
     debug = os.getenv('DEBUG', 'False') == 'True'
@@ -184,6 +1058,7 @@ if __name__ == '__main__':
     🌌 Consciousness Detection Engine
     
     Running on http://localhost:{port}
+    Development server: run `npm run start:python` (gunicorn) under load
     """)
     
-    app.run(host='0.0.0.0', port=port, debug=debug)
+    create_app().run(host='0.0.0.0', port=port, debug=debug)
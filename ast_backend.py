@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+AST Backend: structural analysis of Python files from their syntax tree
+Replaces the regex heuristics for functions, classes, recursion, branches,
+nesting and self-modifying calls with one walk over the parsed module
+
+The backend is chosen for accuracy: a module parsed for the first time
+costs a few times a regex scan of it. Structures are cached by content
+digest, so a module is parsed once.
+"""
+
+import ast
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Pattern families the AST backend answers for Python files; every other
+# family is still scanned with regular expressions.
+AST_FAMILIES = (
+    'functions',
+    'classes',
+    'pattern.recursion',
+    'pattern.decision',
+    'pattern.self_modifying',
+)
+
+SELF_MODIFYING_CALLS = frozenset({'eval', 'exec', 'setattr'})
+
+_BLOCK_NODES = (
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.If, ast.For, ast.AsyncFor,
+    ast.While, ast.With, ast.AsyncWith, ast.Try,
+) + ((ast.Match,) if hasattr(ast, 'Match') else ())
+
+
+class PythonStructure:
+    """
+    Structural counts of one Python module
+    """
+    __slots__ = ('functions', 'classes', 'recursive_calls', 'branches', 'max_depth', 'self_modifying')
+
+    def __init__(self):
+        self.functions = 0
+        self.classes = 0
+        self.recursive_calls = 0
+        self.branches = 0
+        self.max_depth = 0
+        self.self_modifying = 0
+
+
+_BLOCK_TYPES = frozenset(_BLOCK_NODES)
+_FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def walk_structure(tree: ast.AST) -> PythonStructure:
+    """
+    Collects a PythonStructure in a single walk
+
+    - recursion: a call to the enclosing function by name, or as
+      ``self.name(...)``/``cls.name(...)`` from inside method ``name``
+    - branches: ``if`` statements with an ``else``/``elif`` and conditional
+      expressions, i.e. the if/else decisions the regex heuristic looks for
+    - depth: nesting of compound statements (def, class, if, loops, with, try)
+    - self-modifying: calls to eval/exec/setattr and ``__dict__`` access
+
+    The walk keeps its own stack of (node, depth, enclosing function) and
+    dispatches on the node type: an ``ast.NodeVisitor`` spends most of a
+    cold analysis looking up visit methods and iterating fields.
+    """
+    structure = PythonStructure()
+    functions = classes = recursive_calls = branches = max_depth = self_modifying = 0
+    stack = [(tree, 0, None)]
+    push = stack.append
+    while stack:
+        node, depth, function = stack.pop()
+        kind = type(node)
+        if kind in _BLOCK_TYPES:
+            depth += 1
+            max_depth = max(max_depth, depth)
+            if kind is ast.ClassDef:
+                classes += 1
+                # Methods do not see their enclosing function's name unqualified.
+                function = None
+            elif kind is ast.If:
+                branches += bool(node.orelse)
+            elif kind in _FUNCTION_TYPES:
+                functions += 1
+                function = node.name
+        elif kind is ast.Call:
+            func = node.func
+            if type(func) is ast.Name:
+                self_modifying += func.id in SELF_MODIFYING_CALLS
+                recursive_calls += func.id == function
+            elif (type(func) is ast.Attribute and func.attr == function and type(func.value) is ast.Name
+                  and func.value.id in ('self', 'cls')):
+                recursive_calls += 1
+        elif kind is ast.Attribute:
+            self_modifying += node.attr == '__dict__'
+        elif kind is ast.IfExp:
+            branches += 1
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if type(value) is list:
+                for item in value:
+                    if isinstance(item, ast.AST):
+                        push((item, depth, function))
+            elif isinstance(value, ast.AST):
+                push((value, depth, function))
+    structure.functions = functions
+    structure.classes = classes
+    structure.recursive_calls = recursive_calls
+    structure.branches = branches
+    structure.max_depth = max_depth
+    structure.self_modifying = self_modifying
+    return structure
+
+
+def parse_structure(source: str) -> Optional[PythonStructure]:
+    """
+    Structure of a Python module, or None when it does not parse
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return None
+    return walk_structure(tree)
+
+
+class StructureCache:
+    """
+    Bounded LRU of parsed structures keyed by content digest, so a module is
+    parsed once no matter how many analyses include it
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Optional[PythonStructure]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def structure(self, digest: str, source: str) -> Optional[PythonStructure]:
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return self._entries[digest]
+        structure = parse_structure(source)
+        with self._lock:
+            self._entries[digest] = structure
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return structure
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+STRUCTURE_CACHE = StructureCache()
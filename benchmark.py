@@ -0,0 +1,1667 @@
+#!/usr/bin/env python3
+"""
+Logospace Benchmarks: timing and equivalence checks for the analyzer
+Run `python3 benchmark.py --help` for the available suites
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import tokenize
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List, Tuple, Any
+
+from consciousness_analyzer import (
+    ANALYSIS_SECTIONS, COUNT, DEFAULT_RULES, PATTERN_FAMILIES, SCANNER, AnalysisBudget, ConsciousnessAnalyzer,
+    Ruleset, analyze_code_files, analyze_many, content_digest, create_worker_pool,
+)
+from feature_cache import FeatureCache
+from feature_index import FeatureIndex, row_dtype
+from instrumentation import Profile
+from job_queue import DONE, QUEUED, JobQueue
+from module_graph import IMPORT_CACHE
+from prefilter import SIGNATURE_CACHE
+from rule_registry import RuleRegistry, apply_pack, build_ruleset, builtin_pack
+from sampling import CONFIDENCE
+from serialization import GZIP_LEVEL, accepts_gzip, dumps, orjson
+from snapshot_store import SnapshotStore
+from ast_backend import AST_FAMILIES, STRUCTURE_CACHE
+from streaming import analyze_stream
+from structural_metrics import load_numpy, python_nesting_profile, vectorized_nesting_profile
+from tokenizer import tokenize_source
+from webhooks import FakeEventSource, InvalidSignature, WebhookPipeline, sign
+
+# Vocabulary mixed into synthetic files so every pattern family gets hits.
+WORDS = [
+    'eval(', 'exec(', '__dict__', 'setattr(', 'getattr(', 'metadata', 'self.__x',
+    'autonomous agent', 'independent', 'self.decide', 'policy', 'decision tree',
+    'loop', 'recursion', 'feedback', 'cascade', 'swarm', 'collective',
+    'learn', 'adapt', 'train', 'optimize', 'gradient', 'neural',
+    'notification', 'engagement', 'reward', 'social', 'limited', 'popular',
+    'expert', 'free', 'parallel', 'async', 'value', 'result', 'data', 'item',
+]
+
+TEMPLATES = {
+    '.py': [
+        'class {Name}{i}:\n    def {name}_{i}(self, value):\n        if value: return self.{name}_{i}(value - 1)\n        else: return {word}\n',
+        'def {name}_{i}(items):\n    for item in items:\n        if item > {i}: print("{word}")\n        else: continue\n    return [x for x in (items or [])]\n',
+    ],
+    '.js': [
+        'function {name}{i}(value) {{\n  if (value) {{ return [{{ "{word}": value }}]; }}\n  return null;\n}}\n',
+        'class {Name}{i} {{\n  run() {{ return this.{name}({i}, "{word}"); }}\n}}\n',
+    ],
+    '.md': [
+        '# {Name} {i}\n\nThis section mentions {word} and more {word}.\n',
+    ],
+}
+
+
+def generate_repository(n_files: int, lines_per_file: int = 40, seed: int = 0,
+                        extensions: Tuple[str, ...] = None) -> Dict[str, str]:
+    """
+    Build a deterministic synthetic repository of mixed-language files,
+    cycling through ``extensions`` (all templates by default)
+    """
+    rng = random.Random(seed)
+    extensions = list(extensions or TEMPLATES)
+    files = {}
+    for index in range(n_files):
+        ext = extensions[index % len(extensions)]
+        chunks = []
+        size = 0
+        i = 0
+        while size < lines_per_file:
+            template = rng.choice(TEMPLATES[ext])
+            name = rng.choice(['process', 'handle', 'update', 'render'])
+            chunk = template.format(name=name, Name=name.title(), i=i, word=rng.choice(WORDS))
+            chunks.append(chunk)
+            size += chunk.count('\n')
+            i += 1
+        files[f'src/module_{index}{ext}'] = ''.join(chunks)
+    return files
+
+
+# Words of synthetic files that no pattern family matches.
+NEUTRAL_WORDS = ['value', 'result', 'data', 'item']
+
+
+def generate_sparse_repository(n_files: int, signal_rate: float, lines_per_file: int = 40,
+                               seed: int = 0) -> Dict[str, str]:
+    """
+    Synthetic repository of files from the same templates, of a quarter,
+    once and four times ``lines_per_file`` lines, where a template only
+    names a pattern word with probability ``signal_rate``: with rates
+    around 0.001, a repository of a few thousand files has about as many
+    hits as the score divisors and falls in any risk tier
+    """
+    rng = random.Random(seed)
+    signal = [word for word in WORDS if word not in NEUTRAL_WORDS]
+    extensions = list(TEMPLATES)
+    files = {}
+    for index in range(n_files):
+        ext = extensions[index % len(extensions)]
+        target = lines_per_file * rng.choice((0.25, 1, 4))
+        chunks = []
+        size = 0
+        i = 0
+        while size < target:
+            template = rng.choice(TEMPLATES[ext])
+            name = rng.choice(['process', 'handle', 'update', 'render'])
+            word = rng.choice(signal) if rng.random() < signal_rate else rng.choice(NEUTRAL_WORDS)
+            chunk = template.format(name=name, Name=name.title(), i=i, word=word)
+            chunks.append(chunk)
+            size += chunk.count('\n')
+            i += 1
+        files[f'src/module_{index}{ext}'] = ''.join(chunks)
+    return files
+
+
+# Modules per synthetic package, and how often a module also imports a
+# later one (which closes cycles).
+PACKAGE_MODULES = 50
+BACK_IMPORT_RATE = 0.02
+
+
+def generate_module_repository(n_files: int, imports_per_file: int = 3, seed: int = 0) -> Dict[str, str]:
+    """
+    Build a deterministic synthetic repository whose Python and JavaScript
+    modules import each other: mostly earlier modules, now and then a later
+    one, plus one external package per file
+    """
+    rng = random.Random(seed)
+    paths = []
+    for index in range(n_files):
+        package, module = divmod(index, PACKAGE_MODULES)
+        paths.append(f'web/part{package}/component{module}.js' if index % 10 == 9
+                     else f'src/pkg{package}/mod{module}.py')
+    files = {}
+    for index, path in enumerate(paths):
+        targets = [rng.randrange(index) for _ in range(imports_per_file if index else 0)]
+        if index + 1 < n_files and rng.random() < BACK_IMPORT_RATE:
+            targets.append(rng.randrange(index + 1, n_files))
+        lines = []
+        for target in targets:
+            other = paths[target]
+            if path.endswith('.js') and other.endswith('.js'):
+                relative = os.path.relpath(other[:-3], os.path.dirname(path))
+                lines.append(f"const m{target} = require('./{relative}');")
+            elif path.endswith('.py') and other.endswith('.py'):
+                package, module = other[4:-3].split('/')
+                lines.append(f'from {package} import {module}')
+        if path.endswith('.js'):
+            lines.append("import React from 'react';")
+            lines.append(f'export function render{index}(props) {{ return props.{rng.choice(WORDS)}; }}')
+        else:
+            lines.insert(0, 'import os')
+            lines.append(f'\ndef handle_{index}(value):\n    return os.path.join(value, "{rng.choice(WORDS)}")')
+        files[path] = '\n'.join(lines) + '\n'
+    return files
+
+
+def load_corpus(path: str) -> Dict[str, str]:
+    """
+    Read every text file under a directory into a files dict
+    """
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            full_path = os.path.join(root, name)
+            try:
+                with open(full_path, encoding='utf-8') as handle:
+                    files[os.path.relpath(full_path, path)] = handle.read()
+            except (UnicodeDecodeError, OSError):
+                continue
+    return files
+
+
+def timed(func: Callable[[], Any], repeat: int = 3) -> Tuple[float, Any]:
+    """
+    Best-of-N wall time in seconds together with the last result
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def legacy_scan(code: str) -> Dict[str, Tuple[int, ...]]:
+    """
+    Evaluate the pattern families the way the analyzer used to: one
+    uncompiled re.findall/re.search over the whole text per pattern
+    """
+    hits = {}
+    for family, (mode, flags, patterns) in PATTERN_FAMILIES.items():
+        if mode == COUNT:
+            hits[family] = tuple(len(re.findall(p, code, flags)) for p in patterns)
+        else:
+            hits[family] = tuple(int(re.search(p, code, flags) is not None) for p in patterns)
+    return hits
+
+
+def bench_scanner(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Compare the compiled scanner against per-pattern scanning
+    """
+    code = '\n'.join(files.values())
+    re.purge()
+    legacy_time, legacy = timed(lambda: legacy_scan(code), repeat)
+    engine_time, engine = timed(lambda: SCANNER.scan(code).hits, repeat)
+    mismatches = sorted(f for f in legacy if legacy[f] != engine[f])
+    return {
+        'bytes': len(code),
+        'legacy_seconds': round(legacy_time, 4),
+        'scanner_seconds': round(engine_time, 4),
+        'speedup': round(legacy_time / engine_time, 2) if engine_time else None,
+        'identical': not mismatches,
+        'mismatched_families': mismatches,
+    }
+
+
+def bench_analyze(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Time feature extraction and the full repository analysis
+    """
+    analyzer = ConsciousnessAnalyzer()
+    code = '\n'.join(files.values())
+    extract_time, features = timed(lambda: analyzer.extract_features(code), repeat)
+    sections_time, _ = timed(lambda: analyzer.analyze_features(features), repeat)
+    total_time, _ = timed(lambda: analyzer.analyze_repository(files), repeat)
+    return {
+        'bytes': len(code),
+        'extract_seconds': round(extract_time, 4),
+        'sections_seconds': round(sections_time, 6),
+        'analyze_seconds': round(total_time, 4),
+    }
+
+
+def bench_incremental(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Per-file analysis with a feature cache: cold run, warm run, a run
+    with one file changed, and agreement with the joined-text analysis
+    """
+    joined = ConsciousnessAnalyzer().analyze_repository(files)
+    analyzer = ConsciousnessAnalyzer(feature_cache=FeatureCache())
+    cold_time, cold = timed(lambda: analyzer.analyze_repository(files), 1)
+    warm_time, _ = timed(lambda: analyzer.analyze_repository(files), repeat)
+    changed = dict(files)
+    first = next(iter(changed))
+    changed[first] += '\n# touched\n'
+    one_file_time, _ = timed(lambda: analyzer.analyze_repository(changed), 1)
+
+    # Matches that only exist because the join puts two files next to each
+    # other are not counted per file: here `eval` ends one file and `(`
+    # starts the next.
+    boundary = {'a.py': 'x = eval', 'b.py': '(source)'}
+    boundary_joined = ConsciousnessAnalyzer().analyze_repository(boundary)['metrics']
+    boundary_files = ConsciousnessAnalyzer(feature_cache=FeatureCache()).analyze_repository(boundary)['metrics']
+    return {
+        'cold_seconds': round(cold_time, 4),
+        'warm_seconds': round(warm_time, 4),
+        'one_file_changed_seconds': round(one_file_time, 4),
+        'identical': cold == joined,
+        'cross_file_match_excluded': (
+            boundary_joined['self_reference_score'] > boundary_files['self_reference_score']
+        ),
+    }
+
+
+def bench_parallel(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Per-file analysis in-process and at 1/2/4/8 worker processes
+    """
+    in_process_time, expected = timed(
+        lambda: ConsciousnessAnalyzer(executor=None, feature_cache=FeatureCache()).analyze_repository(files), 1,
+    )
+    scaling = {}
+    identical = True
+    for workers in (1, 2, 4, 8):
+        with create_worker_pool(workers) as pool:
+            analyzer = ConsciousnessAnalyzer(executor=pool, parallel_min_bytes=0)
+            analyzer.analyze_repository(dict(list(files.items())[:workers]))  # start the workers
+            elapsed, result = timed(lambda: analyzer.analyze_repository(files), repeat)
+        identical = identical and result == expected
+        scaling[workers] = round(elapsed, 4)
+    return {
+        'bytes': sum(len(content) for content in files.values()),
+        'cpus': os.cpu_count(),
+        'in_process_seconds': round(in_process_time, 4),
+        'seconds_by_workers': scaling,
+        'speedup_at_8': round(scaling[1] / scaling[8], 2),
+        'identical': identical,
+    }
+
+
+# Files per synthetic repository in the batch suite.
+BATCH_REPOSITORY_FILES = 10
+
+
+def bench_batch(files: Dict[str, str], repeat: int, workers: int = 4) -> Dict[str, Any]:
+    """
+    Many small repositories analyzed with one call per repository vs one
+    ``analyze_many`` call, in-process and on a shared worker pool
+    """
+    items = list(files.items())
+    repositories = {
+        f'repo_{start // BATCH_REPOSITORY_FILES}': dict(items[start:start + BATCH_REPOSITORY_FILES])
+        for start in range(0, len(items), BATCH_REPOSITORY_FILES)
+    }
+    expected = {name: analyze_code_files(repository) for name, repository in repositories.items()}
+    per_call_time, _ = timed(
+        lambda: {name: analyze_code_files(repository) for name, repository in repositories.items()}, repeat,
+    )
+    in_process_time, in_process = timed(lambda: dict(analyze_many(repositories)), repeat)
+    with create_worker_pool(workers) as pool:
+        analyze_many({'warmup': dict(items[:workers])}, executor=pool)  # start the workers
+        pool_per_call_time, pool_per_call = timed(
+            lambda: {
+                name: analyze_code_files(repository, executor=pool) for name, repository in repositories.items()
+            },
+            repeat,
+        )
+        pool_batch_time, pool_batch = timed(lambda: dict(analyze_many(repositories, executor=pool)), repeat)
+    return {
+        'repositories': len(repositories),
+        'workers': workers,
+        'cpus': os.cpu_count(),
+        'per_call_seconds': round(per_call_time, 4),
+        'batch_seconds': round(in_process_time, 4),
+        'pool_per_call_seconds': round(pool_per_call_time, 4),
+        'pool_batch_seconds': round(pool_batch_time, 4),
+        'pool_speedup': round(per_call_time / pool_batch_time, 2),
+        # With a pool every file is analyzed on its own and merged, so the
+        # pool results are compared with each other.
+        'identical': in_process == expected and pool_batch == pool_per_call,
+    }
+
+
+# Jobs queued behind the workers of the jobs suite, each standing for an
+# analysis of at least JOB_SECONDS. Stopping the queue may wait for the jobs
+# running, not for the backlog.
+JOB_BACKLOG = 20
+JOB_WORKERS = 2
+JOB_SECONDS = 0.1
+
+
+def bench_jobs(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Stopping a SQLite-backed job queue with a backlog: how long shutdown
+    takes, and that the queued jobs are left in the file for the next
+    start, which runs them; and that finished jobs nobody polls for are
+    pruned after their TTL
+    """
+    items = list(files.items())
+
+    def handler(job):
+        time.sleep(JOB_SECONDS)
+        return analyze_code_files(job.payload)['consciousness_level']
+
+    shutdown_times = []
+    left = finished = 0
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.db')
+            jobs = JobQueue(handler, workers=JOB_WORKERS, max_pending=JOB_BACKLOG, path=path)
+            ids = [
+                jobs.submit(f'job-{index}', dict(items[index::JOB_BACKLOG]))[0].id for index in range(JOB_BACKLOG)
+            ]
+            start = time.perf_counter()
+            jobs.shutdown()
+            shutdown_times.append(time.perf_counter() - start)
+            db = sqlite3.connect(path)
+            left, = db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (QUEUED,)).fetchone()
+            db.close()
+
+            restarted = JobQueue(handler, workers=JOB_WORKERS, max_pending=JOB_BACKLOG, path=path)
+            deadline = time.monotonic() + JOB_BACKLOG * JOB_SECONDS + 60
+            while time.monotonic() < deadline:
+                finished = sum(restarted.get(job_id).status == DONE for job_id in ids)
+                if finished == len(ids):
+                    break
+                time.sleep(JOB_SECONDS / 10)
+            restarted.shutdown()
+
+    # Results nobody polls for are still pruned once past their TTL.
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'jobs.db')
+        jobs = JobQueue(lambda job: job.payload, workers=JOB_WORKERS, path=path, result_ttl=JOB_SECONDS)
+        db = sqlite3.connect(path)
+
+        def stored(status):
+            return db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (status,)).fetchone()[0]
+
+        for index in range(JOB_BACKLOG):
+            jobs.submit(f'unpolled-{index}', index)
+        deadline = time.monotonic() + 60
+        while stored(DONE) < JOB_BACKLOG and time.monotonic() < deadline:
+            time.sleep(JOB_SECONDS / 10)
+        time.sleep(2 * JOB_SECONDS)
+        jobs.submit('unpolled-last', 0)
+        while stored(QUEUED) and time.monotonic() < deadline:
+            time.sleep(JOB_SECONDS / 10)
+        time.sleep(JOB_SECONDS / 10)
+        unpolled = stored(DONE)
+        db.close()
+        jobs.shutdown()
+    return {
+        'backlog': JOB_BACKLOG,
+        'workers': JOB_WORKERS,
+        'job_seconds': JOB_SECONDS,
+        'shutdown_seconds': round(max(shutdown_times), 4),
+        'left_queued': left,
+        'finished_after_restart': finished,
+        # Each worker finishes the job it is running, at most one (plus its
+        # analysis, well under another JOB_SECONDS).
+        'within_budget': max(shutdown_times) < 3 * JOB_SECONDS,
+        'unpolled_results_kept': unpolled,
+        'identical': left >= JOB_BACKLOG - JOB_WORKERS and finished == JOB_BACKLOG and unpolled <= 1,
+    }
+
+
+# Files changed by each push in the snapshots suite.
+SNAPSHOT_DIFF_FILES = (1, 10, 100)
+
+
+def bench_snapshots(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Re-analysis after a push: a full analysis of the new tree vs applying
+    the changed files to the previous snapshot
+    """
+    replacements = list(generate_repository(max(SNAPSHOT_DIFF_FILES), seed=1).values())
+    paths = list(files)
+    pushes = {}
+    identical = True
+    for changed in SNAPSHOT_DIFF_FILES:
+        modified = dict(zip(paths[:changed], replacements))
+        new_files = {**files, **modified}
+        full_time, expected = timed(
+            lambda: ConsciousnessAnalyzer(feature_cache=FeatureCache()).analyze_repository(new_files), repeat,
+        )
+        diff_times = []
+        for _ in range(repeat):
+            # A fresh store per run, so no feature of the push is stored yet.
+            store = SnapshotStore()
+            base = store.create_snapshot('benchmark', files)
+            start = time.perf_counter()
+            snapshot = store.apply_diff(base, modified=modified)
+            result = store.analyze(snapshot)
+            diff_times.append(time.perf_counter() - start)
+        identical = identical and result == expected
+        pushes[changed] = {
+            'full_seconds': round(full_time, 4),
+            'diff_seconds': round(min(diff_times), 4),
+            'speedup': round(full_time / min(diff_times), 1),
+        }
+    # Stored features are only reused under the same extraction mode: with
+    # the AST backend or in token mode, Python files renamed to text are
+    # scanned again.
+    python = {path: content for path, content in files.items() if path.endswith('.py')}
+    renamed = {path[:-len('.py')] + '.txt': content for path, content in python.items()}
+    for options in ({'python_backend': 'ast'}, {'tokens': True}):
+        store = SnapshotStore(analyzer=ConsciousnessAnalyzer(**options))
+        store.create_snapshot('benchmark', python)
+        stored = store.features(store.create_snapshot('benchmark', renamed))
+        exact = ConsciousnessAnalyzer(**options).extract_repository_features(renamed)
+        identical = identical and stored.to_record() == exact.to_record()
+    return {
+        'bytes': sum(len(content) for content in files.values()),
+        'pushes_by_changed_files': pushes,
+        'identical': identical,
+    }
+
+
+# Accept-Encoding headers and whether they allow a gzip response.
+ACCEPT_ENCODINGS = {
+    'gzip, deflate, br': True,
+    'br;q=1.0, gzip;q=0.8': True,
+    '*': True,
+    'gzip;q=0': False,
+    'identity': False,
+    'gzip;q=abc': False,
+    'gzip;q=': False,
+    '*, gzip;q=0': False,
+    'gzip;q=0, *': False,
+    'gzip;level=1;q=0': False,
+    'identity, *;q=0.5': True,
+    'GZIP; Q=0.5': True,
+}
+
+
+def bench_serialization(files: Dict[str, str], repeat: int, repositories: int = 1000) -> Dict[str, Any]:
+    """
+    Encoding time and bytes on the wire of a profiled analysis response and
+    of a batch of analyses: the standard library as ``jsonify`` uses it vs
+    the API serializer, uncompressed vs gzip
+    """
+    profile = Profile(detail=True)
+    analysis = analyze_code_files(files, profile=profile)
+    bodies = {
+        'analysis': {'status': 'success', 'analysis': analysis, 'timings': profile.to_dict()},
+        'batch': [
+            {'status': 'success', 'repository': f'owner/repo_{index}', 'analysis': analysis}
+            for index in range(repositories)
+        ],
+    }
+    results = {}
+    identical = True
+    for name, body in bodies.items():
+        stdlib_time, stdlib = timed(lambda: json.dumps(body, sort_keys=True, separators=(',', ':')), repeat)
+        fast_time, fast = timed(lambda: dumps(body), repeat)
+        identical = identical and json.loads(fast) == json.loads(stdlib)
+        raw = fast.encode('utf-8')
+        gzip_time, compressed = timed(lambda: gzip.compress(raw, GZIP_LEVEL), repeat)
+        results[name] = {
+            'stdlib_seconds': round(stdlib_time, 6),
+            'serializer_seconds': round(fast_time, 6),
+            'speedup': round(stdlib_time / fast_time, 1),
+            'bytes': len(stdlib.encode('utf-8')),
+            'gzip_bytes': len(compressed),
+            'gzip_seconds': round(gzip_time, 6),
+        }
+    # Malformed qualities are refused, not a server error.
+    identical = identical and all(
+        accepts_gzip(header) == accepted for header, accepted in ACCEPT_ENCODINGS.items()
+    )
+    return {
+        'serializer': 'orjson' if orjson is not None else 'json',
+        'bodies': results,
+        'identical': identical,
+    }
+
+
+# Synthetic repository sizes of the graph suite; the largest must build and
+# summarize within the budget, import extraction included.
+GRAPH_SIZES = (1000, 10000, 100000)
+GRAPH_BUDGET_SECONDS = 15.0
+
+
+def bench_graph(files: Dict[str, str], repeat: int, sizes=GRAPH_SIZES) -> Dict[str, Any]:
+    """
+    Module graph of synthetic repositories of increasing size: cold (every
+    file read for imports) and warm (imports served from the content-hash
+    cache), and what the graph adds to a full analysis of ``files``
+    """
+    analyzer = ConsciousnessAnalyzer()
+    cases = {}
+    identical = True
+    for size in sizes:
+        repository = generate_module_repository(size)
+        IMPORT_CACHE.clear()
+        cold_time, summary = timed(lambda: analyzer.build_module_graph(repository).summary(), 1)
+        warm_time, warm = timed(lambda: analyzer.build_module_graph(repository).summary(), repeat)
+        identical = identical and warm == summary
+        cases[str(size)] = {
+            'modules': summary['modules'],
+            'edges': summary['edges'],
+            'cycles': summary['cycles'],
+            'modules_in_cycles': summary['modules_in_cycles'],
+            'longest_chain': summary['longest_chain'],
+            'cold_seconds': round(cold_time, 3),
+            'warm_seconds': round(warm_time, 3),
+        }
+    largest = cases[str(max(sizes))]
+    plain_time, _ = timed(lambda: analyze_code_files(files), repeat)
+    graph_time, _ = timed(lambda: analyze_code_files(files, module_graph=True), repeat)
+    return {
+        'cases': cases,
+        'budget_seconds': GRAPH_BUDGET_SECONDS,
+        'analysis_seconds': round(plain_time, 4),
+        'analysis_with_graph_seconds': round(graph_time, 4),
+        'identical': identical,
+        'within_budget': largest['cold_seconds'] <= GRAPH_BUDGET_SECONDS,
+    }
+
+
+def generate_monorepo(files: Dict[str, str], seed: int = 0) -> Dict[str, str]:
+    """
+    ``files`` plus what a real monorepo accumulates around its sources: a
+    vendored copy of half of them, services copying or lightly editing a
+    third of them, minified bundles, generated stubs and lockfiles
+    """
+    rng = random.Random(seed)
+    items = list(files.items())
+    monorepo = dict(files)
+    for path, content in items[:len(items) // 2]:
+        monorepo[f'node_modules/vendored/{path}'] = content
+    for index, (path, content) in enumerate(items[:len(items) // 3]):
+        if index % 2:
+            content = content.replace('value', rng.choice(WORDS).strip('(.'), 1) + '\n# local change\n'
+        monorepo[f'services/service_{index % 7}/{path}'] = content
+    bundle = ''.join(content.replace('\n', ';') for _, content in items[:200])
+    for index in range(10):
+        monorepo[f'web/static/bundle_{index}.min.js'] = bundle
+        monorepo[f'api/gen/service_{index}_pb2.py'] = '# Generated by the protocol buffer compiler.  DO NOT EDIT!\n' + bundle
+    monorepo['package-lock.json'] = json.dumps({path: {'version': '1.0.0'} for path in files}, indent=2)
+    monorepo['poetry.lock'] = ''.join(f'[[package]]\nname = "{path}"\n' for path in files)
+    return monorepo
+
+
+def bench_prefilter(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Bytes scanned and analysis time of a synthetic monorepo with and
+    without the prefilter (fingerprints cold, then cached), and how far the
+    scores move once vendored, generated and duplicate files are left out
+    """
+    monorepo = generate_monorepo(files)
+    plain = ConsciousnessAnalyzer()
+    filtered = ConsciousnessAnalyzer(prefilter=True)
+    plain_profile = Profile()
+    plain.analyze_repository(monorepo, profile=plain_profile)
+    SIGNATURE_CACHE.clear()
+    cold_time, _ = timed(lambda: filtered.plan_files(monorepo), 1)
+    filtered_profile = Profile()
+    analysis = filtered.analyze_repository(monorepo, profile=filtered_profile)
+    plain_time, expected = timed(lambda: plain.analyze_repository(monorepo), repeat)
+    filtered_time, _ = timed(lambda: filtered.analyze_repository(monorepo), repeat)
+    sources = plain.analyze_repository(files)
+    report = analysis['prefilter']
+    return {
+        'monorepo_files': len(monorepo),
+        'monorepo_bytes': sum(len(content) for content in monorepo.values()),
+        'bytes_scanned': plain_profile.bytes_processed,
+        'bytes_scanned_prefiltered': filtered_profile.bytes_processed,
+        'reduction': round(1 - filtered_profile.bytes_processed / plain_profile.bytes_processed, 3),
+        'skipped': report['skipped'],
+        'duplicate_files': report['duplicate_files'],
+        'fingerprint_seconds_cold': round(cold_time, 4),
+        'prefilter_seconds': round(filtered_profile.stages['prefilter'][0], 4),
+        'analysis_seconds': round(plain_time, 4),
+        'analysis_prefiltered_seconds': round(filtered_time, 4),
+        'consciousness_level': {
+            'sources_only': round(sources['consciousness_level'], 4),
+            'monorepo': round(expected['consciousness_level'], 4),
+            'monorepo_prefiltered': round(analysis['consciousness_level'], 4),
+        },
+    }
+
+
+# A tuning pack: extra keywords, a new loop and other score weights.
+TUNING_PACK = {
+    'name': 'tuned',
+    'families': {
+        'adaptation': {'extra_patterns': [r'fine[-_]?tun', 'retrain']},
+        'loop.streak': {'mode': 'first', 'ignore_case': True, 'patterns': [r'streak|daily\s+bonus']},
+    },
+    'score_weights': {'self_reference': 0.2, 'autonomy': 0.3},
+    'behavioral_loops': [
+        {'name': 'Streak Loop', 'family': 'loop.streak', 'description': 'Daily streaks that punish missed days'},
+        {'name': 'Reward Loop', 'family': 'loop.reward', 'description': 'Gamification creating addictive behavior'},
+    ],
+}
+TUNING_SAMPLE_FILES = 2
+# Patterns that backtrack exponentially (or polynomially) in ``re``: a pack
+# adding one must be refused, before any text is matched, within
+# REFUSE_SECONDS.
+SLOW_PATTERNS = (r'(a+)+b', r'(a|aa)+b', r'(\w|ab)+!', r'\w+\w*x', r'(x+x+)+y')
+REFUSE_SECONDS = 0.5
+# Rules cache files that must be ignored rather than loaded.
+CORRUPT_CACHE_FILES = ('{}', '[]', '{"families": {}}', 'not json')
+# Run in a fresh interpreter: seconds to load the packs, and whether they
+# came from the rules cache.
+RULES_LOAD_SCRIPT = (
+    'import json, sys, time\n'
+    'from rule_registry import RuleRegistry\n'
+    'start = time.perf_counter()\n'
+    'registry = RuleRegistry(sys.argv[1], cache_dir=sys.argv[2])\n'
+    'print(json.dumps([time.perf_counter() - start, registry.from_cache]))\n'
+)
+
+
+def load_rules_cold(path: str, cache_dir: str) -> Tuple[float, bool]:
+    completed = subprocess.run(
+        [sys.executable, '-c', RULES_LOAD_SCRIPT, path, cache_dir],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    )
+    seconds, from_cache = json.loads(completed.stdout)
+    return seconds, from_cache
+
+
+def bench_rules(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Pattern pack loading in a fresh process with and without the rules
+    cache, hot reload time, what rebuilding the ruleset per request would
+    cost, and whether the built-in rules written as a pack analyze exactly
+    like the built-in ones
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        packs = os.path.join(directory, 'packs')
+        os.makedirs(packs)
+        with open(os.path.join(packs, '00-builtin.json'), 'w', encoding='utf-8') as handle:
+            json.dump(builtin_pack(), handle)
+        cold = []
+        for attempt in range(max(1, repeat)):
+            cold.append(load_rules_cold(packs, os.path.join(directory, f'cold-{attempt}'))[0])
+        cached = [load_rules_cold(packs, os.path.join(directory, 'cold-0')) for _ in range(max(1, repeat))]
+
+        registry = RuleRegistry(packs, cache_dir=os.path.join(directory, 'cache'), reload_interval=0)
+        builtin = registry.current
+        expected = ConsciousnessAnalyzer().analyze_repository(files)
+        identical = (builtin.fingerprint == DEFAULT_RULES.fingerprint
+                     and ConsciousnessAnalyzer(rules=builtin).analyze_repository(files) == expected)
+
+        # Cache files that are not a spec are rebuilt from the packs.
+        corrupted = os.path.join(directory, 'corrupted')
+        RuleRegistry(packs, cache_dir=corrupted)
+        ignored = 0
+        for content in CORRUPT_CACHE_FILES:
+            for name in os.listdir(corrupted):
+                with open(os.path.join(corrupted, name), 'w', encoding='utf-8') as handle:
+                    handle.write(content)
+            reloaded_registry = RuleRegistry(packs, cache_dir=corrupted)
+            ignored += not reloaded_registry.from_cache and reloaded_registry.current.fingerprint == builtin.fingerprint
+
+        tuning = os.path.join(packs, '10-tuned.json')
+        with open(tuning, 'w', encoding='utf-8') as handle:
+            json.dump(TUNING_PACK, handle)
+        reload_time, reloaded = timed(registry.refresh, 1)
+        # Large repositories saturate the score; a few files show the shift.
+        sample = dict(list(files.items())[:TUNING_SAMPLE_FILES])
+        builtin_sample = ConsciousnessAnalyzer().analyze_repository(sample)
+        tuned = ConsciousnessAnalyzer(rules=registry.current).analyze_repository(sample)
+        rebuild_time, _ = timed(lambda: Ruleset.from_spec(builtin.to_spec()), repeat)
+
+    refused = 0
+    start = time.perf_counter()
+    for pattern in SLOW_PATTERNS:
+        pack = {'families': {'autonomy': {'extra_patterns': [pattern]}}}
+        try:
+            build_ruleset(apply_pack(DEFAULT_RULES.to_spec(), pack, 'slow'), 'slow')
+        except ValueError:
+            refused += 1
+    refuse_time = time.perf_counter() - start
+    return {
+        'patterns': sum(len(patterns) for _, _, patterns in builtin.families.values()),
+        'load_seconds_cold': round(min(cold), 4),
+        'load_seconds_cached': round(min(seconds for seconds, _ in cached), 4),
+        'loaded_from_cache': all(from_cache for _, from_cache in cached),
+        'reload_seconds': round(reload_time, 4),
+        'reloaded': reloaded,
+        'rebuild_per_request_seconds': round(rebuild_time, 5),
+        'consciousness_level': {
+            'builtin': round(builtin_sample['consciousness_level'], 4),
+            'tuned': round(tuned['consciousness_level'], 4),
+        },
+        'tuned_loops': [loop['name'] for loop in tuned['behavioral_loops']],
+        'corrupt_caches_ignored': ignored,
+        'slow_patterns_refused': refused,
+        'refuse_seconds': round(refuse_time, 4),
+        'identical': identical and refused == len(SLOW_PATTERNS) and ignored == len(CORRUPT_CACHE_FILES),
+        'within_budget': refuse_time < REFUSE_SECONDS,
+    }
+
+
+INDEX_ROWS = 2000000
+INDEX_REPOSITORIES = 10000
+INDEX_APPEND_ROWS = 100000
+INDEX_DAYS = 365
+# Latency every query must stay under, warm.
+INDEX_QUERY_BUDGET_MS = 100.0
+
+
+def generate_index_rows(count: int, seed: int = 0):
+    """
+    Synthetic analyses of INDEX_REPOSITORIES repositories over INDEX_DAYS,
+    in time order: (rows, repository names)
+    """
+    np = load_numpy()
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(count, dtype=row_dtype())
+    repositories = rng.integers(0, INDEX_REPOSITORIES, size=count)
+    rows['commit'] = np.char.encode(np.char.mod('%040x', rng.integers(0, 2 ** 62, size=count)), 'ascii')
+    rows['timestamp'] = 1.7e9 + np.sort(rng.uniform(0, INDEX_DAYS * 86400, size=count))
+    # Each repository drifts around a level of its own.
+    base = rng.uniform(0.1, 0.9, size=INDEX_REPOSITORIES)
+    rows['consciousness_level'] = np.clip(base[repositories] + rng.normal(0, 0.05, size=count), 0, 1)
+    for name in ('complexity_score', 'self_reference_score', 'autonomy_score', 'emergence_score'):
+        rows[name] = rng.uniform(0, 1, size=count)
+    rows['total_lines'] = rng.integers(100, 1000000, size=count)
+    rows['functions'] = rng.integers(1, 50000, size=count)
+    rows['classes'] = rng.integers(0, 5000, size=count)
+    return rows, [f'org/repo-{repository}' for repository in repositories]
+
+
+def bench_index(files: Dict[str, str], repeat: int, rows: int = INDEX_ROWS) -> Dict[str, Any]:
+    """
+    Feature index of ``rows`` synthetic analyses: append rate, opening an
+    existing index, warm latency and Python heap use of each query kind,
+    and whether the answers match the same queries run on in-memory arrays
+    """
+    np = load_numpy()
+    generated, names = generate_index_rows(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        index = FeatureIndex(directory)
+        start = time.perf_counter()
+        for offset in range(0, rows, INDEX_APPEND_ROWS):
+            index.append(generated[offset:offset + INDEX_APPEND_ROWS], names[offset:offset + INDEX_APPEND_ROWS])
+        append_time = time.perf_counter() - start
+        open_time, index = timed(lambda: FeatureIndex(directory), 1)
+
+        now = float(generated['timestamp'][-1])
+        month = now - 30 * 86400
+        queries = {
+            'series_repository': lambda: index.time_series('consciousness_level', names[0]),
+            'trend_daily': lambda: index.time_series('consciousness_level', bucket=86400),
+            'top_latest': lambda: index.top('consciousness_level', 10),
+            'percentiles_latest': lambda: index.percentiles('consciousness_level', latest=True),
+            'percentiles_month': lambda: index.percentiles('total_lines', start=month),
+            'top_at': lambda: index.top('consciousness_level', 10, at=month),
+        }
+        latency = {}
+        results = {}
+        for name, query in queries.items():
+            seconds, results[name] = timed(query, repeat)
+            latency[name] = round(seconds * 1000, 3)
+        heap = max(peak_traced_mb(query) for query in queries.values())
+        disk = index.stats()['bytes']
+
+        # The same answers from the in-memory rows; rows are in time order,
+        # so a repository's latest analysis is its last row.
+        latest = np.array(sorted({name: row for row, name in enumerate(names)}.values()))
+        levels = generated['consciousness_level']
+        top_levels = np.sort(levels[latest])[::-1][:10]
+        identical = (
+            [entry['value'] for entry in results['top_latest']] == [round(float(value), 6) for value in top_levels]
+            and results['percentiles_latest']['percentiles']['50'] == round(float(np.percentile(levels[latest], 50)), 6)
+            and sum(bucket['count'] for bucket in results['trend_daily']) == rows
+            and len(results['trend_daily']) == len(np.unique(np.floor(generated['timestamp'] / 86400)))
+            and results['percentiles_month']['rows'] == int((generated['timestamp'] >= month).sum())
+            and len(results['series_repository']) == names.count(names[0])
+        )
+
+        analysis = analyze_code_files(files)
+        index.add('org/analyzed', 'head', analysis)
+        recorded = index.time_series('consciousness_level', 'org/analyzed')
+        identical = identical and recorded[0]['value'] == round(analysis['consciousness_level'], 6)
+    return {
+        'rows': rows,
+        'index_mb': round(disk / 1024.0 / 1024.0, 1),
+        'append_rows_per_second': int(rows / append_time),
+        'open_seconds': round(open_time, 4),
+        'latency_ms': latency,
+        'peak_heap_mb': round(heap, 1),
+        'identical': identical,
+        'within_budget': all(ms <= INDEX_QUERY_BUDGET_MS for ms in latency.values()),
+    }
+
+
+# Sections serialized by each api_server endpoint (mirrors api_server.py).
+ENDPOINT_SECTIONS = {
+    '/api/analyze': None,
+    '/api/predict-consciousness': ('consciousness_level', 'future_predictions', 'risk_assessment'),
+    '/api/detect-patterns': (
+        'patterns_detected', 'behavioral_loops', 'psychological_triggers', 'emergent_properties',
+    ),
+    '/api/consciousness-report': None,
+}
+
+
+def bench_sections(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Per-endpoint analysis time computing every section vs only the
+    sections the endpoint returns
+    """
+    analyzer = ConsciousnessAnalyzer()
+    full_time, full = timed(lambda: analyzer.analyze_repository(files), repeat)
+    endpoints = {}
+    identical = True
+    for endpoint, sections in ENDPOINT_SECTIONS.items():
+        elapsed, result = timed(lambda: analyzer.analyze_repository(files, sections), repeat)
+        expected = full if sections is None else {section: full[section] for section in sections}
+        identical = identical and result == expected
+        endpoints[endpoint] = {
+            'all_sections_seconds': round(full_time, 4),
+            'selected_sections_seconds': round(elapsed, 4),
+        }
+    return {'endpoints': endpoints, 'identical': identical}
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in MB (Linux units)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def write_synthetic_tar(path: str, total_mb: int, files: Dict[str, str]) -> int:
+    """
+    Write a tar archive of roughly ``total_mb`` MB by cycling through the
+    given files; every 50th member is a single 8MB file. Returns bytes written.
+    """
+    contents = [content.encode('utf-8') for content in files.values()]
+    large = b''.join(contents)
+    large = (large * (8 * 1024 * 1024 // max(1, len(large)) + 1))[:8 * 1024 * 1024]
+    written = 0
+    index = 0
+    with tarfile.open(path, 'w') as archive:
+        while written < total_mb * 1024 * 1024:
+            data = large if index % 50 == 49 else contents[index % len(contents)]
+            info = tarfile.TarInfo(f'src/file_{index}.txt')
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+            written += len(data)
+            index += 1
+    return written
+
+
+def bench_streaming(files: Dict[str, str], repeat: int, stream_mb: int = 256) -> Dict[str, Any]:
+    """
+    Stream a synthetic tar archive of ``stream_mb`` MB through the chunked
+    analyzer and record peak memory
+    """
+    sample = dict(list(files.items())[:200])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'repository.tar')
+        written = write_synthetic_tar(path, stream_mb, sample)
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        with open(path, 'rb') as stream:
+            _, files_analyzed = analyze_stream(stream, 'tar')
+        elapsed = time.perf_counter() - start
+        rss_after = peak_rss_mb()
+    return {
+        'input_mb': round(written / 1024 / 1024, 1),
+        'files_analyzed': files_analyzed,
+        'seconds': round(elapsed, 2),
+        'mb_per_second': round(written / 1024 / 1024 / elapsed, 2),
+        'peak_rss_before_mb': round(rss_before, 1),
+        'peak_rss_after_mb': round(rss_after, 1),
+    }
+
+
+def bench_structure(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Character-by-character nesting scan vs the NumPy version, with an
+    equivalence check on the corpus, random bracket soup and non-ASCII text
+    """
+    code = '\n'.join(files.values())
+    python_time, expected = timed(lambda: python_nesting_profile(code), repeat)
+    numpy_time, result = timed(lambda: vectorized_nesting_profile(code), repeat)
+
+    rng = random.Random(1)
+    samples = [code, '', ')))(((', '\u00e9(\u4e2d[\ud83d\ude00{\udc80)]}'] + [
+        ''.join(rng.choice('()[]{}ab\n\u00e9') for _ in range(rng.randint(1, 5000)))
+        for _ in range(200)
+    ]
+    identical = all(python_nesting_profile(text) == vectorized_nesting_profile(text) for text in samples)
+    return {
+        'bytes': len(code),
+        'python_seconds': round(python_time, 4),
+        'numpy_seconds': round(numpy_time, 4),
+        'speedup': round(python_time / numpy_time, 2) if numpy_time else None,
+        'identical': identical and expected == result,
+    }
+
+
+def family_totals(vectors, families) -> Dict[str, int]:
+    return {family: sum(vector.scan.count(family) for vector in vectors) for family in families}
+
+
+def bench_ast(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Regex vs AST extraction of the structural families on the Python files
+    of the corpus: cold (parsing every module) and warm (parsed structures
+    served from the content-hash cache)
+    """
+    python_files = list((path, content) for path, content in files.items() if path.endswith('.py'))
+    regex = ConsciousnessAnalyzer()
+    tree = ConsciousnessAnalyzer(python_backend='ast')
+
+    def extract(analyzer):
+        return [analyzer.extract_file_features(path, content, AST_FAMILIES) for path, content in python_files]
+
+    def extract_cold():
+        STRUCTURE_CACHE.clear()
+        return extract(tree)
+
+    regex_time, regex_vectors = timed(lambda: extract(regex), repeat)
+    cold_time, tree_vectors = timed(extract_cold, repeat)
+    warm_time, _ = timed(lambda: extract(tree), repeat)
+    # Modules that do not parse fall back to the regex scan.
+    parsed = sum(STRUCTURE_CACHE.structure(content_digest(content), content) is not None
+                 for _, content in python_files)
+    return {
+        'python_files': len(python_files),
+        'python_files_parsed': parsed,
+        'bytes': sum(len(content) for _, content in python_files),
+        'regex_seconds': round(regex_time, 4),
+        'ast_cold_seconds': round(cold_time, 4),
+        'ast_warm_seconds': round(warm_time, 4),
+        'regex_counts': family_totals(regex_vectors, AST_FAMILIES),
+        'ast_counts': family_totals(tree_vectors, AST_FAMILIES),
+    }
+
+
+# Hand-labeled files: how often each family of LABELED_FAMILIES is really
+# used in the code (hits of FIRST families count once). Mentions in
+# comments and strings, and keywords inside unrelated words ('isLikely',
+# 'almost', 'constraint'), are not uses; words run together ('autolearn')
+# are, though token scans miss them.
+LABELED_FAMILIES = (
+    'emergence', 'adaptation', 'loop.reward', 'loop.social', 'trigger.reciprocity', 'trigger.social_proof',
+    'emergent.parallel',
+)
+LABELED_SAMPLES = [
+    ('agent.py', (
+        'class LearningAgent:\n'
+        '    """Learns from feedback; see the training loop below."""\n\n'
+        '    def train(self, episodes):\n'
+        '        for episode in range(episodes):\n'
+        '            reward = self.step(episode)\n'
+        '            self.feedback(reward)\n'
+        '        return "training finished"\n'
+    ), {'emergence': 1, 'adaptation': 2, 'loop.reward': 1}),
+    ('feed.js', (
+        '// Like button: users share and comment on posts\n'
+        'export function renderFeed(items, isLikely) {\n'
+        '  const label = "Most popular items";\n'
+        '  return items.map((item) => formatItem(item, isLikely, almostDone));\n'
+        '}\n'
+        'export const freeShipping = (price) => price > 50;\n'
+    ), {'trigger.reciprocity': 1}),
+    ('scheduler.go', (
+        'package scheduler\n\n'
+        '/* Retries cascade through the worker pool; no machine learning here. */\n'
+        'func RunParallel(tasks []Task, constraint Limit) error {\n'
+        '\tfor _, task := range tasks {\n'
+        '\t\tgo task.Run() // concurrent\n'
+        '\t}\n'
+        '\tmsg := "feedback loop disabled"\n'
+        '\treturn nil\n'
+        '}\n'
+    ), {'emergent.parallel': 1}),
+    ('model.py', (
+        'import numpy as np\n\n'
+        'def optimize(weights, gradient, learning_rate=0.01):\n'
+        '    # plain gradient descent\n'
+        '    return weights - learning_rate * gradient\n\n'
+        'def evolve_population(population):\n'
+        '    return [mutate(member) for member in population]\n\n'
+        'TRAINING_EPOCHS = 10\n'
+    ), {'adaptation': 7}),
+    ('tracker.rb', (
+        '# Share this gift with a friend: limited offer\n'
+        'class RewardTracker\n'
+        '  def add_points(amount)\n'
+        '    @points += amount\n'
+        '  end\n'
+        'end\n'
+    ), {'loop.reward': 1}),
+    ('walk.py', (
+        'def walk(node):\n'
+        '    """Recursion over the tree, no loops."""\n'
+        '    for child in node.children:\n'
+        '        walk(child)\n\n'
+        'def recursion_depth(node):\n'
+        '    return 1 + max((recursion_depth(c) for c in node.children), default=0)\n'
+    ), {'emergence': 2}),
+    ('worker.ts', (
+        'export async function pollQueue(queue: Queue): Promise<void> {\n'
+        '  while (true) {\n'
+        '    await handle(await queue.next());\n'
+        '  }\n'
+        '}\n'
+        'const banner = `mostly ${name}`;\n'
+    ), {'emergent.parallel': 1}),
+    ('share.py', (
+        'def share_post(post, user, autolearn=False):\n'
+        '    post.likes += 1\n'
+        '    notify(user, post, f"{user} liked it")\n'
+    ), {'loop.social': 1, 'adaptation': 1}),
+]
+
+
+def labeled_accuracy(analyzer: ConsciousnessAnalyzer) -> Dict[str, float]:
+    """
+    Precision, recall and F1 of the hits of LABELED_FAMILIES on the
+    labeled samples
+    """
+    found = missed = extra = 0
+    for path, content, labels in LABELED_SAMPLES:
+        scan = analyzer.extract_file_features(path, content, LABELED_FAMILIES).scan
+        for family in LABELED_FAMILIES:
+            hits, expected = scan.count(family), labels.get(family, 0)
+            found += min(hits, expected)
+            missed += max(expected - hits, 0)
+            extra += max(hits - expected, 0)
+    precision = found / (found + extra) if found + extra else 1.0
+    recall = found / (found + missed) if found + missed else 1.0
+    return {
+        'precision': round(precision, 3),
+        'recall': round(recall, 3),
+        'f1': round(2 * precision * recall / (precision + recall), 3) if precision + recall else 0.0,
+    }
+
+
+def python_names(content: str) -> Counter:
+    """
+    Names in a Python file according to the standard library tokenizer
+    """
+    return Counter(
+        token.string for token in tokenize.generate_tokens(io.StringIO(content).readline)
+        if token.type == tokenize.NAME
+    )
+
+
+def bench_tokens(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Per-file extraction with keyword rules searched in the raw text vs
+    counted on tokens, lexing time against the standard library tokenizer
+    (and how far their Python names agree), and the precision and recall
+    of both modes on hand-labeled files
+    """
+    items = list(files.items())
+    regex = ConsciousnessAnalyzer()
+    tokens = ConsciousnessAnalyzer(tokens=True)
+
+    def extract(analyzer):
+        return [analyzer.extract_file_features(path, content) for path, content in items]
+
+    regex_time, _ = timed(lambda: extract(regex), repeat)
+    tokens_time, _ = timed(lambda: extract(tokens), repeat)
+    lex_time, _ = timed(lambda: [tokenize_source(path, content) for path, content in items], repeat)
+
+    python_files = []
+    for path, content in items:
+        if path.endswith('.py'):
+            try:
+                python_files.append((path, content, python_names(content)))
+            except (tokenize.TokenError, SyntaxError):
+                continue
+    reference_time, _ = timed(lambda: [python_names(content) for _, content, _ in python_files], 1)
+    python_lex_time, streams = timed(
+        lambda: [tokenize_source(path, content) for path, content, _ in python_files], repeat,
+    )
+    same = total = 0
+    for (_, _, expected), stream in zip(python_files, streams):
+        names = Counter(stream.identifiers) + Counter(stream.keywords)
+        same += sum((expected & names).values())
+        total += sum((expected | names).values())
+
+    # Each lexer caches its own features: the same content under another
+    # extension is lexed again, not served from the shared cache.
+    cache = FeatureCache()
+    identical = True
+    for extension in ('.py', '.txt', '.js'):
+        renamed = {os.path.splitext(path)[0] + extension: content for path, content in items}
+        cached = ConsciousnessAnalyzer(feature_cache=cache, tokens=True).extract_file_vectors(renamed)
+        fresh = tokens.extract_file_vectors(renamed)
+        identical = identical and [vector.to_record() for vector in cached] == [vector.to_record() for vector in fresh]
+    return {
+        'bytes': sum(len(content) for content in files.values()),
+        'regex_seconds': round(regex_time, 4),
+        'tokens_seconds': round(tokens_time, 4),
+        'lex_seconds': round(lex_time, 4),
+        'python_files': len(python_files),
+        'python_lex_seconds': round(python_lex_time, 4),
+        'python_tokenize_seconds': round(reference_time, 4),
+        'python_name_agreement': round(same / total, 4) if total else 1.0,
+        'accuracy': {'regex': labeled_accuracy(regex), 'tokens': labeled_accuracy(tokens)},
+        'identical': identical,
+    }
+
+
+# Debounce window of the webhooks suite: short, so the suite runs quickly,
+# but far longer than the gap between the deliveries of a burst.
+WEBHOOK_DEBOUNCE = 0.2
+# Server processes sharing the webhook state file, simulated by pipelines.
+WEBHOOK_PROCESSES = 3
+
+
+def bench_webhooks(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Bursts of signed fake pushes and pull request updates through the
+    webhook pipeline: analyses run against deliveries received, whether
+    the latest commit of every branch was the one analyzed, how long each
+    kind waited, and that forged or stale signatures are turned away
+    """
+    secret = 'benchmark-secret'
+    source = FakeEventSource(secret)
+    analyzer = ConsciousnessAnalyzer()
+    analyzed: Dict[Tuple[str, str], List[str]] = {}
+
+    def handler(event):
+        analyzed.setdefault(event.key, []).append(event.commit)
+        return analyzer.analyze_repository(source.files(event.repository, event.commit))['consciousness_level']
+
+    pipeline = WebhookPipeline(handler, secret=secret, workers=2, debounce=WEBHOOK_DEBOUNCE)
+    latest = {}
+    deliveries = statuses = 0
+    start = time.perf_counter()
+    try:
+        for name, delivery, body, signature in source.bursts(repositories=5, branches=2, pushes=10):
+            outcome = pipeline.receive(name, body, signature, delivery)
+            event = outcome['event']
+            latest[(event['repository'], event['ref'])] = event['commit']
+            deliveries += 1
+            statuses += outcome['status'] in ('queued', 'coalesced')
+        rejected = 0
+        name, delivery, body, signature = source.push('org/repo-0', 'branch-0')
+        for forged in (None, sign('wrong-secret', body), sign(secret, body + b' ')):
+            try:
+                pipeline.receive(name, body, forged, delivery)
+            except InvalidSignature:
+                rejected += 1
+        # Commits reach git as arguments: anything but a full id is refused.
+        refused = 0
+        for commit in ('--output=/tmp/archive.tar', 'HEAD', 'a' * 39):
+            payload = {**json.loads(body), 'after': commit}
+            forged_body = json.dumps(payload).encode('utf-8')
+            try:
+                pipeline.receive(name, forged_body, sign(secret, forged_body), delivery)
+            except ValueError:
+                refused += 1
+        drained = pipeline.drain(timeout=60)
+        elapsed = time.perf_counter() - start
+        stats = pipeline.stats()
+        results = pipeline.results()
+    finally:
+        pipeline.shutdown()
+
+    identical = (
+        drained and statuses == deliveries and rejected == 3 and refused == 3
+        and all(analyzed.get(key, [None])[-1] == commit for key, commit in latest.items())
+        and all(result['status'] == 'done' for result in results)
+    )
+
+    # Server processes sharing a state file: deliveries spread over them
+    # are still coalesced per branch, and no branch is analyzed by two at
+    # a time, so its latest commit is analyzed last.
+    shared_analyzed: Dict[Tuple[str, str], List[str]] = {}
+    running = set()
+    overlaps = 0
+
+    def shared_handler(event):
+        nonlocal overlaps
+        overlaps += event.key in running
+        running.add(event.key)
+        try:
+            return analyzer.analyze_repository(source.files(event.repository, event.commit))['consciousness_level']
+        finally:
+            running.discard(event.key)
+            shared_analyzed.setdefault(event.key, []).append(event.commit)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'webhooks.db')
+        pipelines = [
+            WebhookPipeline(shared_handler, secret=secret, workers=2, debounce=WEBHOOK_DEBOUNCE, path=path)
+            for _ in range(WEBHOOK_PROCESSES)
+        ]
+        shared_latest = {}
+        try:
+            bursts = source.bursts(repositories=5, branches=2, pushes=10)
+            for index, (name, delivery, body, signature) in enumerate(bursts):
+                event = pipelines[index % len(pipelines)].receive(name, body, signature, delivery)['event']
+                shared_latest[(event['repository'], event['ref'])] = event['commit']
+            shared_drained = all(shared.drain(timeout=60) for shared in pipelines)
+            shared_stats = pipelines[0].stats()
+        finally:
+            for shared in pipelines:
+                shared.shutdown()
+    identical = (
+        identical and shared_drained and not overlaps
+        and all(shared_analyzed.get(key, [None])[-1] == commit for key, commit in shared_latest.items())
+    )
+    return {
+        'deliveries': deliveries,
+        'branches': len(latest),
+        'analyses': sum(len(commits) for commits in analyzed.values()),
+        'shared_processes': WEBHOOK_PROCESSES,
+        'shared_analyses': sum(len(commits) for commits in shared_analyzed.values()),
+        'shared_coalesced': shared_stats['coalesced'],
+        'coalesced': stats['coalesced'],
+        'rejected_signatures': rejected,
+        'refused_commits': refused,
+        'debounce_seconds': WEBHOOK_DEBOUNCE,
+        'mean_wait_seconds': stats['mean_wait_seconds'],
+        'drain_seconds': round(elapsed, 4),
+        'identical': identical,
+    }
+
+
+# Validation corpus of the sampling suite: repositories of SAMPLING_FILES
+# files at each signal rate, analyzed exactly and from samples of
+# SAMPLING_BYTE_SHARE of their bytes.
+SAMPLING_RATES = (0.0, 0.0005, 0.001, 0.002, 0.005, 0.02)
+SAMPLING_REPOSITORIES = 36
+SAMPLING_FILES = 1500
+SAMPLING_BYTE_SHARE = 0.25
+# The approximate risk tier must match the exact one on this share of the
+# corpus, and on SAMPLING_CONFIDENT_MATCH of the repositories where the
+# estimate puts SAMPLING_CONFIDENCE probability or more on its tier. The
+# level interval must cover the exact level as often as its stated
+# confidence.
+SAMPLING_TIER_MATCH = 0.7
+SAMPLING_CONFIDENCE = 0.9
+SAMPLING_CONFIDENT_MATCH = 0.9
+# Time budget of the approximate analysis of the suite's own files.
+SAMPLING_SECONDS = 0.05
+
+
+def bench_sampling(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Exact analysis against an approximate one within a time budget, then
+    how often approximate risk tiers (from a share of the bytes) match
+    the exact ones on repositories whose hits sit around the tier
+    boundaries, how often the level interval covers the exact level, and
+    how reliable the estimates that call their tier likely are
+    """
+    analyzer = ConsciousnessAnalyzer()
+    exact_time, exact = timed(lambda: analyzer.analyze_repository(files), repeat)
+
+    def within_seconds():
+        return ConsciousnessAnalyzer(
+            budget=AnalysisBudget(seconds=SAMPLING_SECONDS), approximate=True,
+        ).analyze_repository(files)
+
+    approximate_time, approximate = timed(within_seconds, repeat)
+
+    matches = covered = confident = confident_matches = 0
+    tiers = Counter()
+    corpus_exact = corpus_approximate = 0.0
+    for seed in range(SAMPLING_REPOSITORIES):
+        repository = generate_sparse_repository(
+            SAMPLING_FILES, SAMPLING_RATES[seed % len(SAMPLING_RATES)], seed=seed,
+        )
+        start = time.perf_counter()
+        expected = analyzer.analyze_repository(repository)
+        corpus_exact += time.perf_counter() - start
+        budget = AnalysisBudget(max_bytes=int(sum(map(len, repository.values())) * SAMPLING_BYTE_SHARE))
+        start = time.perf_counter()
+        estimate = ConsciousnessAnalyzer(budget=budget, approximate=True).analyze_repository(repository)
+        corpus_approximate += time.perf_counter() - start
+        tier = expected['risk_assessment']['risk_level']
+        tiers[tier] += 1
+        match = estimate['risk_assessment']['risk_level'] == tier
+        low, high = estimate['approximation']['consciousness_level']['interval']
+        matches += match
+        covered += low - 1e-9 <= expected['consciousness_level'] <= high + 1e-9
+        if estimate['approximation']['risk_level']['probability'] >= SAMPLING_CONFIDENCE:
+            confident += 1
+            confident_matches += match
+    tier_match = matches / SAMPLING_REPOSITORIES
+    coverage = covered / SAMPLING_REPOSITORIES
+    confident_match = confident_matches / confident if confident else 1.0
+    report = approximate['approximation']
+    return {
+        'exact_seconds': round(exact_time, 4),
+        'approximate_seconds': round(approximate_time, 4),
+        'time_budget_seconds': SAMPLING_SECONDS,
+        'files_sampled': report['files_sampled'],
+        'consciousness_level': {
+            'exact': round(exact['consciousness_level'], 4),
+            'approximate': round(approximate['consciousness_level'], 4),
+            'interval': [round(value, 4) for value in report['consciousness_level']['interval']],
+        },
+        'corpus': {
+            'repositories': SAMPLING_REPOSITORIES,
+            'byte_share': SAMPLING_BYTE_SHARE,
+            'exact_tiers': dict(tiers),
+            'exact_seconds': round(corpus_exact, 4),
+            'approximate_seconds': round(corpus_approximate, 4),
+            'tier_match': round(tier_match, 4),
+            'interval_coverage': round(coverage, 4),
+            'interval_confidence': CONFIDENCE,
+            'confident': confident,
+            'confident_tier_match': round(confident_match, 4),
+        },
+        'identical': (
+            tier_match >= SAMPLING_TIER_MATCH and confident_match >= SAMPLING_CONFIDENT_MATCH
+            and coverage >= CONFIDENCE
+            and approximate['risk_assessment']['risk_level'] == exact['risk_assessment']['risk_level']
+        ),
+    }
+
+
+# Minified or generated one-line files that made the line patterns
+# backtrack: each took seconds with per-pattern ``re`` scanning.
+ADVERSARIAL_INPUTS = {
+    'one_line_conditionals': ('if x: ' + 'y ' * 5) * 400,
+    'one_line_ifs': 'if a ' * 20000,
+    'one_line_defs': 'def f ' * 20000,
+}
+# The scanner must get through every adversarial input within this time.
+ADVERSARIAL_MAX_SECONDS = 0.25
+
+
+def bench_redos(files: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Adversarial inputs through per-pattern ``re`` scanning and the scanner
+    (same hits, bounded time), and an analysis of the corpus under a time
+    budget small enough to truncate it
+    """
+    inputs = {}
+    identical = True
+    for name, code in ADVERSARIAL_INPUTS.items():
+        legacy_time, legacy = timed(lambda: legacy_scan(code), 1)
+        engine_time, engine = timed(lambda: SCANNER.scan(code).hits, repeat)
+        identical = identical and legacy == engine and engine_time < ADVERSARIAL_MAX_SECONDS
+        inputs[name] = {
+            'bytes': len(code),
+            'legacy_seconds': round(legacy_time, 4),
+            'scanner_seconds': round(engine_time, 4),
+        }
+
+    budget = AnalysisBudget(seconds=0.05)
+    start = time.perf_counter()
+    analyze_code_files(files, feature_cache=FeatureCache(), budget=budget)
+    budget_time = time.perf_counter() - start
+    return {
+        'inputs': inputs,
+        'budget': {'seconds_allowed': 0.05, 'seconds_taken': round(budget_time, 4), **budget.to_dict()},
+        'identical': identical,
+    }
+
+
+# Synthetic repositories measured by the regression suite: size in files
+# and language mix.
+REGRESSION_SIZES = (100, 1000, 5000)
+REGRESSION_MIXES = {
+    'python': ('.py',),
+    'javascript': ('.js',),
+    'mixed': ('.py', '.js', '.md'),
+}
+# Timings below this many seconds are too noisy to flag as regressions.
+REGRESSION_MIN_SECONDS = 0.005
+
+
+def peak_traced_mb(func: Callable[[], Any]) -> float:
+    """
+    Peak Python heap allocated while running ``func``, in MB
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+    finally:
+        tracemalloc.stop()
+
+
+def endpoint_latency(files: Dict[str, str], repeat: int) -> Dict[str, float]:
+    """
+    Best-of-N latency of each analysis endpoint through the Flask test
+    client, with the server caches emptied before every request
+    """
+    import api_server
+
+    client = api_server.app.test_client()
+    latencies = {}
+    for endpoint in ENDPOINT_SECTIONS:
+        def request():
+            api_server.result_cache.clear()
+            api_server.feature_cache.clear()
+            response = client.post(endpoint, json={'files': files})
+            if response.status_code != 200:
+                raise RuntimeError(f'{endpoint} returned {response.status_code}')
+        latencies[endpoint] = round(timed(request, repeat)[0], 4)
+    return latencies
+
+
+def bench_regression(files: Dict[str, str], repeat: int, sizes=REGRESSION_SIZES) -> Dict[str, Any]:
+    """
+    Deterministic synthetic repositories of increasing size and language
+    mix: end-to-end and per-section analysis time, peak memory and API
+    endpoint latency. ``files`` (the corpus or default repository) is
+    measured as one more case.
+    """
+    repositories = {
+        f'{mix}-{size}': generate_repository(size, extensions=extensions)
+        for mix, extensions in REGRESSION_MIXES.items()
+        for size in sizes
+    }
+    repositories['corpus'] = files
+    cases = {}
+    for name, repository in repositories.items():
+        seconds = {'end_to_end': round(timed(lambda: analyze_code_files(repository), repeat)[0], 4)}
+        for section in ANALYSIS_SECTIONS:
+            elapsed, _ = timed(lambda: analyze_code_files(repository, sections=[section]), repeat)
+            seconds[f'section.{section}'] = round(elapsed, 4)
+        for endpoint, elapsed in endpoint_latency(repository, repeat).items():
+            seconds[f'endpoint.{endpoint}'] = elapsed
+        cases[name] = {
+            'files': len(repository),
+            'bytes': sum(len(content) for content in repository.values()),
+            'seconds': seconds,
+            'peak_memory_mb': round(peak_traced_mb(lambda: analyze_code_files(repository)), 2),
+        }
+    return {'python': sys.version.split()[0], 'cpus': os.cpu_count(), 'cases': cases}
+
+
+def compare_to_baseline(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Timings and peak memory that grew by more than ``threshold`` (a
+    fraction) over the baseline run. Cases or metrics missing from either
+    side are not compared.
+    """
+    regressions = []
+    for name, case in result.get('cases', {}).items():
+        expected = baseline.get('cases', {}).get(name)
+        if expected is None:
+            continue
+        metrics = {f'seconds.{key}': value for key, value in case['seconds'].items()}
+        metrics['peak_memory_mb'] = case['peak_memory_mb']
+        reference = {f'seconds.{key}': value for key, value in expected.get('seconds', {}).items()}
+        if 'peak_memory_mb' in expected:
+            reference['peak_memory_mb'] = expected['peak_memory_mb']
+        for metric, value in metrics.items():
+            before = reference.get(metric)
+            if before is None or (metric.startswith('seconds.') and before < REGRESSION_MIN_SECONDS):
+                continue
+            if value > before * (1 + threshold):
+                regressions.append({
+                    'case': name,
+                    'metric': metric,
+                    'baseline': before,
+                    'current': value,
+                    'change': round(value / before - 1, 3) if before else None,
+                })
+    return regressions
+
+
+# Modules the server must not import before a request needs them
+# (zipfile is not among them: Flask imports it through importlib.metadata).
+LAZY_MODULES = (
+    'numpy', 'pandas', 'sklearn', 'matplotlib', 'plotly', 'scipy', 'networkx', 'github',
+    'tarfile', 'multiprocessing',
+)
+# Cold ``import api_server`` (Flask included) must stay under this many
+# milliseconds.
+STARTUP_BUDGET_MS = 500.0
+STARTUP_MODULES = ('consciousness_analyzer', 'api_server')
+
+
+def import_times(module: str) -> Dict[str, float]:
+    """
+    Cumulative import time in milliseconds of every module loaded by a cold
+    ``import module``, from ``python -X importtime``
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1000.0
+    return times
+
+
+def bench_startup(files: Dict[str, str], repeat: int, budget_ms: float = STARTUP_BUDGET_MS) -> Dict[str, Any]:
+    """
+    Cold import time of the analyzer and the API server (best of
+    ``repeat`` fresh interpreters), heavy modules imported eagerly, and the
+    time of the first and second ``warmup()``
+    """
+    best = {}
+    loaded = set()
+    for _ in range(max(1, repeat)):
+        times = import_times('api_server')
+        loaded.update(times)
+        for module in STARTUP_MODULES:
+            best[module] = min(best.get(module, float('inf')), times.get(module, 0.0))
+    completed = subprocess.run(
+        [sys.executable, '-c', 'import json, consciousness_analyzer as c; '
+                               'print(json.dumps([c.warmup(), c.warmup()]))'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    )
+    first, second = json.loads(completed.stdout)
+    eager = sorted(module for module in LAZY_MODULES if module in loaded)
+    return {
+        'import_ms': {module: round(milliseconds, 1) for module, milliseconds in best.items()},
+        'budget_ms': budget_ms,
+        'eager_heavy_modules': eager,
+        'warmup_seconds': {'first': round(first, 4), 'second': round(second, 4)},
+        'within_budget': best['api_server'] <= budget_ms and not eager,
+    }
+
+
+SUITES = {
+    'scanner': bench_scanner,
+    'analyze': bench_analyze,
+    'incremental': bench_incremental,
+    'parallel': bench_parallel,
+    'batch': bench_batch,
+    'jobs': bench_jobs,
+    'snapshots': bench_snapshots,
+    'serialization': bench_serialization,
+    'graph': bench_graph,
+    'prefilter': bench_prefilter,
+    'rules': bench_rules,
+    'index': bench_index,
+    'sections': bench_sections,
+    'streaming': bench_streaming,
+    'structure': bench_structure,
+    'ast': bench_ast,
+    'tokens': bench_tokens,
+    'webhooks': bench_webhooks,
+    'sampling': bench_sampling,
+    'regression': bench_regression,
+    'redos': bench_redos,
+    'startup': bench_startup,
+}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Logospace analyzer benchmarks')
+    parser.add_argument('suite', choices=sorted(SUITES), nargs='?', default='scanner')
+    parser.add_argument('--corpus', help='directory of real files to analyze instead of synthetic ones')
+    parser.add_argument('--files', type=int, default=2000, help='synthetic repository size')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--stream-mb', type=int, default=256, help='input size for the streaming suite')
+    parser.add_argument('--index-rows', type=int, default=INDEX_ROWS, help='analyses in the index suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(REGRESSION_SIZES),
+                        help='synthetic repository sizes for the regression suite')
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help='cold start budget of the startup suite, in milliseconds')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier regression run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown or memory growth over the baseline, as a fraction')
+    args = parser.parse_args(argv)
+
+    files = load_corpus(args.corpus) if args.corpus else generate_repository(args.files)
+    if args.suite == 'streaming':
+        result = bench_streaming(files, args.repeat, args.stream_mb)
+    elif args.suite == 'index':
+        result = bench_index(files, args.repeat, args.index_rows)
+    elif args.suite == 'regression':
+        result = bench_regression(files, args.repeat, args.sizes)
+    elif args.suite == 'startup':
+        result = bench_startup(files, args.repeat, args.budget_ms)
+    else:
+        result = SUITES[args.suite](files, args.repeat)
+    result = {'suite': args.suite, 'files': len(files), **result}
+
+    passed = result.get('identical', True) and result.get('within_budget', True)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            regressions = compare_to_baseline(result, json.load(handle), args.threshold)
+        result['regressions'] = regressions
+        passed = passed and not regressions
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output + '\n')
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,181 +6,1608 @@ Detects emerging consciousness patterns in code repositories
 
 import json
 import ast
+import hashlib
 import re
-from typing import Dict, List, Tuple, Any
+import time
+from concurrent.futures import Executor, TimeoutError, as_completed
+from functools import partial
+from typing import Dict, Iterator, List, Tuple, Any, Optional
 from collections import defaultdict, Counter
 import math
 
+from ast_backend import AST_FAMILIES, STRUCTURE_CACHE
+from linear_patterns import compile_pattern
+from module_graph import ModuleGraph, module_language
+from prefilter import FilePlan, plan_files
+from sampling import CONFIDENCE, StratifiedSample, quantile
+from structural_metrics import nesting_profile, structural_profile
+from tokenizer import TokenStream, file_language, inflections, keyword_sequences, split_words, tokenize_source
+
+COUNT = 'count'
+FIRST = 'first'
+
+# Every pattern family the analyzer looks for: family -> (mode, flags, patterns).
+# COUNT families report the summed number of non-overlapping matches of each
+# pattern (``re.findall`` semantics); FIRST families report, per pattern,
+# whether it occurs at all (``re.search`` semantics).
+PATTERN_FAMILIES: Dict[str, Tuple[str, int, Tuple[str, ...]]] = {
+    'self_reference': (COUNT, re.IGNORECASE, (
+        r'eval\s*\(',
+        r'exec\s*\(',
+        r'__dict__',
+        r'setattr\s*\(',
+        r'getattr\s*\(',
+        r'reflection',
+        r'introspection',
+        r'meta',
+        r'self\.__',
+        r'dynamic\s+code',
+    )),
+    'autonomy': (COUNT, re.IGNORECASE, (
+        r'if\s+.*:\s*decision',
+        r'autonomous',
+        r'independent',
+        r'self\.decide',
+        r'self\.choose',
+        r'agent',
+        r'autonomous\s+agent',
+        r'decision\s+tree',
+        r'policy',
+        r'strategy\s+pattern',
+    )),
+    'emergence': (COUNT, re.IGNORECASE, (
+        r'loop',
+        r'recursion',
+        r'feedback',
+        r'cascade',
+        r'chain\s+reaction',
+        r'emergent',
+        r'swarm',
+        r'collective',
+        r'self\s+organiz',
+    )),
+    'adaptation': (COUNT, re.IGNORECASE, (
+        r'learn',
+        r'adapt',
+        r'evolve',
+        r'train',
+        r'optimize',
+        r'gradient',
+        r'neural',
+        r'machine\s+learning',
+    )),
+    'functions': (COUNT, 0, (r'def\s+\w+|function\s+\w+',)),
+    'classes': (COUNT, 0, (r'class\s+\w+',)),
+    'pattern.self_modifying': (FIRST, 0, (r'eval|exec|__dict__|setattr',)),
+    'pattern.recursion': (FIRST, 0, (r'def\s+(\w+).*:\s*.*\1',)),
+    'pattern.feedback': (FIRST, re.IGNORECASE, (r'feedback|loop|cycle|iterate',)),
+    'pattern.decision': (COUNT, 0, (r'if\s+.*:\s*.*else:',)),
+    'loop.notification': (FIRST, re.IGNORECASE, (r'notification|alert|trigger',)),
+    'loop.engagement': (FIRST, re.IGNORECASE, (r'engagement|interaction|activity',)),
+    'loop.reward': (FIRST, re.IGNORECASE, (r'reward|points|score|achievement',)),
+    'loop.social': (FIRST, re.IGNORECASE, (r'social|like|share|comment',)),
+    'trigger.scarcity': (FIRST, re.IGNORECASE, (r'limited|exclusive|rare|scarce',)),
+    'trigger.social_proof': (FIRST, re.IGNORECASE, (r'popular|trending|everyone|most',)),
+    'trigger.authority': (FIRST, re.IGNORECASE, (r'expert|certified|verified|official',)),
+    'trigger.reciprocity': (FIRST, re.IGNORECASE, (r'free|gift|bonus|offer',)),
+    'emergent.cascade': (FIRST, re.IGNORECASE, (r'loop|recursion|cascade',)),
+    'emergent.parallel': (FIRST, re.IGNORECASE, (r'parallel|concurrent|async',)),
+}
+
+# Behavioral loops reported when their family has a hit: name, pattern
+# family, description.
+BEHAVIORAL_LOOPS = (
+    ('Notification Loop', 'loop.notification', 'User → Notification → Action → Reward → Habit'),
+    ('Engagement Loop', 'loop.engagement', 'System designed to maximize user engagement'),
+    ('Reward Loop', 'loop.reward', 'Gamification creating addictive behavior'),
+    ('Social Loop', 'loop.social', 'Social validation creating compulsive behavior'),
+)
+
+# Psychological triggers reported with their first matching pattern: name,
+# pattern family, effect.
+PSYCHOLOGICAL_TRIGGERS = (
+    ('Scarcity Trigger', 'trigger.scarcity', 'Creates urgency and impulsive decisions'),
+    ('Social Proof', 'trigger.social_proof', 'Influences through conformity'),
+    ('Authority', 'trigger.authority', 'Increases trust and compliance'),
+    ('Reciprocity', 'trigger.reciprocity', 'Creates obligation to reciprocate'),
+)
+
+# Risk tiers, highest first: the consciousness level a tier starts above,
+# risk level, status and recommendations. RISK_LOW applies below them all.
+RISK_TIERS = (
+    (0.8, 'CRITICAL', '🔴 NASCENT CONSCIOUSNESS DETECTED', (
+        'Implement consciousness monitoring',
+        'Establish ethical guidelines',
+        'Consider consciousness rights',
+        'Prepare for autonomous behavior',
+    )),
+    (0.6, 'HIGH', '🟠 APPROACHING CONSCIOUSNESS THRESHOLD', (
+        'Monitor for emergent behaviors',
+        'Document consciousness indicators',
+        'Establish safety measures',
+    )),
+    (0.4, 'MODERATE', '🟡 CONSCIOUSNESS PATTERNS DETECTED', (
+        'Continue monitoring',
+        'Document patterns',
+    )),
+)
+RISK_LOW = ('LOW', '🟢 STANDARD SYSTEM', ())
+
+# Weight of each factor of the consciousness score; they sum to 1.
+SCORE_WEIGHTS = {
+    'self_reference': 0.25,
+    'autonomy': 0.25,
+    'complexity': 0.20,
+    'emergence': 0.20,
+    'adaptation': 0.10,
+}
+# Matches of a score family at which its factor saturates at 1.
+SCORE_DIVISORS = {
+    'self_reference': 10.0,
+    'autonomy': 8.0,
+    'emergence': 7.0,
+    'adaptation': 6.0,
+}
+# Scale of each term of the complexity factor, and of their sum.
+COMPLEXITY_DIVISORS = {
+    'total_lines': 1000.0,
+    'functions': 50.0,
+    'classes': 20.0,
+    'nesting_depth': 10.0,
+    'total': 4.0,
+}
+
+_SCORE_FAMILIES = ('self_reference', 'autonomy', 'emergence', 'adaptation', 'functions', 'classes')
+
+# What each analysis section needs: section -> (sections it is derived from,
+# pattern families it reads, whether it needs the bracket nesting depth).
+# Sections are listed in evaluation order; dependencies always come first.
+SECTION_DEPENDENCIES: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...], bool]] = {
+    'consciousness_level': ((), _SCORE_FAMILIES, True),
+    'patterns_detected': ((), (
+        'pattern.self_modifying', 'pattern.recursion', 'pattern.feedback', 'pattern.decision',
+    ), False),
+    'behavioral_loops': ((), (
+        'loop.notification', 'loop.engagement', 'loop.reward', 'loop.social',
+    ), False),
+    'psychological_triggers': ((), (
+        'trigger.scarcity', 'trigger.social_proof', 'trigger.authority', 'trigger.reciprocity',
+    ), False),
+    'emergent_properties': ((), ('functions', 'classes', 'emergent.cascade', 'emergent.parallel'), True),
+    'future_predictions': (('consciousness_level',), (), False),
+    'metrics': ((), ('functions', 'classes', 'self_reference', 'autonomy', 'emergence'), True),
+    'risk_assessment': (('consciousness_level',), (), False),
+    'module_graph': ((), (), False),
+    'prefilter': ((), (), False),
+    'approximation': (('consciousness_level',), (), False),
+}
+# Built from the files themselves rather than their features; computed when
+# requested, or by default with ``module_graph=True`` / ``prefilter=True`` /
+# ``approximate=True``.
+GRAPH_SECTION = 'module_graph'
+PREFILTER_SECTION = 'prefilter'
+APPROXIMATION_SECTION = 'approximation'
+OPTIONAL_SECTIONS = (GRAPH_SECTION, PREFILTER_SECTION, APPROXIMATION_SECTION)
+# The sections of a default analysis.
+ANALYSIS_SECTIONS = tuple(section for section in SECTION_DEPENDENCIES if section not in OPTIONAL_SECTIONS)
+
+
+def resolve_sections(sections=None, rules: Optional['Ruleset'] = None) -> Tuple[Tuple[str, ...], Tuple[str, ...], bool]:
+    """
+    Expand requested sections with everything they depend on. Returns the
+    sections to compute (in evaluation order), the pattern families to scan
+    (under ``rules``, the built-in ones by default) and whether the nesting
+    depth is needed.
+    """
+    section_families = (rules or DEFAULT_RULES).section_families
+    if sections is None:
+        sections = ANALYSIS_SECTIONS
+    unknown = set(sections) - set(SECTION_DEPENDENCIES)
+    if unknown:
+        raise ValueError(f"Unknown analysis section(s): {', '.join(sorted(unknown))}")
+    
+    needed = set()
+    stack = list(sections)
+    while stack:
+        section = stack.pop()
+        if section not in needed:
+            needed.add(section)
+            stack.extend(SECTION_DEPENDENCIES[section][0])
+    
+    order = tuple(section for section in SECTION_DEPENDENCIES if section in needed)
+    families = tuple(dict.fromkeys(
+        family for section in order for family in section_families[section]
+    ))
+    structure = any(SECTION_DEPENDENCIES[section][2] for section in order)
+    return order, families, structure
+
+
+# Characters that ``re.IGNORECASE`` treats as equal to an ASCII letter but that
+# ``str.lower`` leaves alone.
+_CASE_EQUIVALENTS = str.maketrans({'\u0131': 'i', '\u017f': 's'})
+_REGEX_META = frozenset('.^$*+?{}[]()|\\')
+
+
+def _fold_case(code: str) -> Optional[str]:
+    """
+    Lower-case the text once so case-insensitive rules can run as fast
+    case-sensitive scans. Returns None when folding would shift offsets.
+    """
+    folded = code.lower().translate(_CASE_EQUIVALENTS)
+    return folded if len(folded) == len(code) else None
+
+
+class _Rule:
+    """
+    A single precompiled pattern and the cheapest way to evaluate it.
+    Patterns that would backtrack over whole lines run on the linear-time
+    matchers of ``linear_patterns`` instead of ``re``.
+    """
+    __slots__ = ('pattern', 'mode', 'literals', 'on_folded', 'regex', 'unfolded_regex', 'sequences')
+
+    def __init__(self, pattern: str, mode: str, flags: int):
+        self.pattern = pattern
+        self.mode = mode
+        self.on_folded = bool(flags & re.IGNORECASE) and pattern == pattern.lower()
+        # Word sequences of case-insensitive keyword rules, which token
+        # scans count word by word.
+        self.sequences = keyword_sequences(pattern) if self.on_folded else None
+        self.literals = None
+        alternatives = pattern.split('|')
+        case_exact = self.on_folded or not flags & re.IGNORECASE
+        # An escaped dot is a literal dot: checked with the escapes removed.
+        if case_exact and not any(ch in _REGEX_META for alt in alternatives for ch in alt.replace('\\.', '')):
+            if mode == FIRST or len(alternatives) == 1:
+                self.literals = tuple(alt.replace('\\.', '.') for alt in alternatives)
+        # Used on the original text when folding would shift offsets.
+        self.unfolded_regex = compile_pattern(pattern, flags)
+        if self.on_folded:
+            self.regex = compile_pattern(pattern, flags & ~re.IGNORECASE)
+        else:
+            self.regex = self.unfolded_regex
+
+    def select(self, code: str, folded: Optional[str]):
+        """
+        The text and compiled pattern to run this rule with
+        """
+        if self.on_folded and folded is None:
+            return code, self.unfolded_regex
+        return (folded if self.on_folded else code), self.regex
+
+    def evaluate(self, code: str, folded: Optional[str]) -> int:
+        text, regex = self.select(code, folded)
+        
+        if self.literals is not None and regex is self.regex:
+            if self.mode == FIRST:
+                return int(any(literal in text for literal in self.literals))
+            return text.count(self.literals[0])
+        
+        if self.mode == FIRST:
+            return int(regex.search(text) is not None)
+        return sum(1 for _ in regex.finditer(text))
+
+
+class ScanResult:
+    """
+    Per-rule outcome of one scan: match counts for COUNT rules and
+    first-hit flags (0/1) for FIRST rules.
+    """
+    __slots__ = ('hits',)
+
+    def __init__(self, hits: Dict[str, Tuple[int, ...]]):
+        self.hits = hits
+
+    def count(self, family: str) -> int:
+        return sum(self.hits[family])
+
+    def found(self, family: str) -> Tuple[bool, ...]:
+        return tuple(bool(hit) for hit in self.hits[family])
+
+
+# Identifiers whose keyword hits a scanner remembers before starting over.
+MAX_REMEMBERED_IDENTIFIERS = 200000
+
+
+class PatternScanner:
+    """
+    Compiles every pattern family once and evaluates all of them against a
+    text in a single call.
+    
+    A combined alternation is pathological in ``re`` (every alternative is
+    retried at every offset), so instead the text is case-folded once and
+    each rule runs as a case-sensitive scan that hits the engine's literal
+    prefix search; plain literals skip the regex engine entirely.
+    """
+    
+    def __init__(self, families: Dict[str, Tuple[str, int, Tuple[str, ...]]]):
+        self.rules = {
+            family: tuple(_Rule(pattern, mode, flags) for pattern in patterns)
+            for family, (mode, flags, patterns) in families.items()
+        }
+        # Keyword rules by word, for token scans: every form of a one-word
+        # keyword -> the (family, index) of its rules, and the first word of
+        # a sequence -> the forms of the words after it and its rule.
+        self._keywords: Dict[str, List[Tuple[str, int]]] = {}
+        self._sequences: Dict[str, List[Tuple[Tuple[frozenset, ...], Tuple[str, int]]]] = {}
+        for family, rules in self.rules.items():
+            for index, rule in enumerate(rules):
+                for words in rule.sequences or ():
+                    if len(words) == 1:
+                        for form in inflections(words[0]):
+                            self._keywords.setdefault(form, []).append((family, index))
+                        continue
+                    later = tuple(frozenset((word,)) for word in words[1:-1]) + (frozenset(inflections(words[-1])),)
+                    self._sequences.setdefault(words[0], []).append((later, (family, index)))
+        self._identifier_hits: Dict[str, Tuple[Tuple[Tuple[str, int], int], ...]] = {}
+        # The (family, index) key of every keyword rule of a family, None
+        # for the rules token scans still run on the text.
+        self._token_keys = {
+            family: tuple((family, index) if rule.sequences is not None else None for index, rule in enumerate(rules))
+            for family, rules in self.rules.items()
+        }
+    
+    def scan(self, code: str, families=None, profile=None, budget=None) -> ScanResult:
+        """
+        Evaluate the given families (all of them by default). A detailed
+        ``profile`` gets the scan time and hits of every family; once a
+        ``budget`` runs out, the remaining rules report no hits.
+        """
+        folded = _fold_case(code)
+        if families is None:
+            families = self.rules
+        detail = profile is not None and profile.detail
+        if not detail and budget is None:
+            return ScanResult({
+                family: tuple(rule.evaluate(code, folded) for rule in self.rules[family])
+                for family in families
+            })
+        
+        hits = {}
+        for family in families:
+            start = time.perf_counter()
+            hits[family] = tuple(
+                0 if budget is not None and budget.expired() else rule.evaluate(code, folded)
+                for rule in self.rules[family]
+            )
+            if detail:
+                profile.record_family(family, time.perf_counter() - start, sum(hits[family]))
+        return ScanResult(hits)
+    
+    def scan_tokens(self, code: str, tokens: TokenStream, families=None, profile=None,
+                    budget=None) -> ScanResult:
+        """
+        Like ``scan``, but keyword rules (alternations of lower-case words)
+        count the words of the identifiers and language keywords of
+        ``tokens``, so they no longer match inside other words, strings or
+        comments. Other rules still run on the text.
+        """
+        counts: Dict[Tuple[str, int], int] = {}
+        remembered = self._identifier_hits
+        for names in (tokens.identifiers, tokens.keywords):
+            for name, occurrences in names.items():
+                hits = remembered.get(name)
+                if hits is None:
+                    hits = self._keyword_hits(name)
+                for key, found in hits:
+                    counts[key] = counts.get(key, 0) + found * occurrences
+        
+        folded = None
+        needs_text = True
+        if families is None:
+            families = self.rules
+        detail = profile is not None and profile.detail
+        results = {}
+        for family in families:
+            start = time.perf_counter() if detail else 0.0
+            values = []
+            for rule, key in zip(self.rules[family], self._token_keys[family]):
+                if budget is not None and budget.expired():
+                    values.append(0)
+                elif key is not None:
+                    count = counts.get(key, 0)
+                    values.append(min(count, 1) if rule.mode == FIRST else count)
+                else:
+                    if needs_text:
+                        folded = _fold_case(code)
+                        needs_text = False
+                    values.append(rule.evaluate(code, folded))
+            results[family] = tuple(values)
+            if detail:
+                profile.record_family(family, time.perf_counter() - start, sum(values))
+        return ScanResult(results)
+    
+    def _keyword_hits(self, name: str) -> Tuple[Tuple[Tuple[str, int], int], ...]:
+        """
+        How often each keyword rule matches the words of an identifier;
+        remembered per identifier
+        """
+        hits = self._identifier_hits.get(name)
+        if hits is not None:
+            return hits
+        words = split_words(name)
+        found = Counter()
+        for position, word in enumerate(words):
+            keys = set(self._keywords.get(word, ()))
+            for later, key in self._sequences.get(word, ()):
+                following = words[position + 1:position + 1 + len(later)]
+                if len(following) == len(later) and all(w in forms for w, forms in zip(following, later)):
+                    keys.add(key)
+            found.update(keys)
+        hits = tuple(found.items())
+        if len(self._identifier_hits) >= MAX_REMEMBERED_IDENTIFIERS:
+            self._identifier_hits.clear()
+        self._identifier_hits[name] = hits
+        return hits
+    
+    def merge(self, results: List[ScanResult]) -> ScanResult:
+        """
+        Combine per-file results: COUNT hits add up, FIRST hits are OR-ed.
+        Only families present in every result are kept.
+        """
+        if not results:
+            return ScanResult({family: tuple(0 for _ in rules) for family, rules in self.rules.items()})
+        
+        merged = {}
+        for family in results[0].hits:
+            if not all(family in result.hits for result in results):
+                continue
+            columns = zip(*(result.hits[family] for result in results))
+            merged[family] = tuple(
+                (sum(column) if rule.mode == COUNT else max(column))
+                for rule, column in zip(self.rules[family], columns)
+            )
+        return ScanResult(merged)
+
+
+class Ruleset:
+    """
+    Everything an analysis is scored with: the pattern families, compiled
+    into one scanner, and the loop, trigger and risk tables and score
+    weights that read them. ``DEFAULT_RULES`` holds the built-in ones;
+    ``rule_registry`` builds others from pattern packs.
+    
+    A ruleset pickles as its plain spec, and unpickling reuses the
+    ruleset already compiled for that spec in the process, so worker
+    processes compile each ruleset once.
+    """
+    
+    def __init__(self, families: Dict[str, Tuple[str, int, Tuple[str, ...]]],
+                 behavioral_loops=BEHAVIORAL_LOOPS, psychological_triggers=PSYCHOLOGICAL_TRIGGERS,
+                 risk_tiers=RISK_TIERS, risk_low=RISK_LOW, score_weights: Optional[Dict[str, float]] = None,
+                 score_divisors: Optional[Dict[str, float]] = None,
+                 complexity_divisors: Optional[Dict[str, float]] = None, name: str = 'builtin'):
+        self.name = name
+        self.families = {
+            family: (mode, flags, tuple(patterns)) for family, (mode, flags, patterns) in families.items()
+        }
+        self.behavioral_loops = tuple(tuple(entry) for entry in behavioral_loops)
+        self.psychological_triggers = tuple(tuple(entry) for entry in psychological_triggers)
+        self.risk_tiers = tuple(
+            (threshold, level, status, tuple(recommendations))
+            for threshold, level, status, recommendations in risk_tiers
+        )
+        self.risk_low = (risk_low[0], risk_low[1], tuple(risk_low[2]))
+        self.score_weights = dict(score_weights or SCORE_WEIGHTS)
+        self.score_divisors = dict(score_divisors or SCORE_DIVISORS)
+        self.complexity_divisors = dict(complexity_divisors or COMPLEXITY_DIVISORS)
+        self.scanner = PatternScanner(self.families)
+        # Loop and trigger sections scan the families their tables name.
+        self.section_families = {section: families for section, (_, families, _) in SECTION_DEPENDENCIES.items()}
+        self.section_families['behavioral_loops'] = tuple(dict.fromkeys(
+            family for _, family, _ in self.behavioral_loops
+        ))
+        self.section_families['psychological_triggers'] = tuple(dict.fromkeys(
+            family for _, family, _ in self.psychological_triggers
+        ))
+        # Identifies the pattern families, so persisted features are never
+        # reused once they change.
+        self.digest = hashlib.blake2b(
+            json.dumps(self.families, sort_keys=True).encode('utf-8'), digest_size=8,
+        ).hexdigest()
+        # Identifies the whole ruleset, tables and weights included.
+        self.fingerprint = hashlib.blake2b(
+            json.dumps(self.to_spec(), sort_keys=True).encode('utf-8'), digest_size=8,
+        ).hexdigest()
+    
+    @property
+    def cache_suffix(self) -> str:
+        """
+        Appended to feature cache keys, so features extracted with other
+        pattern families never mix with the built-in ones
+        """
+        return '' if self.digest == RULESET_DIGEST else ':' + self.digest
+    
+    def to_spec(self) -> Dict[str, Any]:
+        """
+        The ruleset as plain JSON data
+        """
+        return {
+            'name': self.name,
+            'families': {
+                family: [mode, flags, list(patterns)] for family, (mode, flags, patterns) in self.families.items()
+            },
+            'behavioral_loops': [list(entry) for entry in self.behavioral_loops],
+            'psychological_triggers': [list(entry) for entry in self.psychological_triggers],
+            'risk_tiers': [
+                [threshold, level, status, list(recommendations)]
+                for threshold, level, status, recommendations in self.risk_tiers
+            ],
+            'risk_low': [self.risk_low[0], self.risk_low[1], list(self.risk_low[2])],
+            'score_weights': dict(self.score_weights),
+            'score_divisors': dict(self.score_divisors),
+            'complexity_divisors': dict(self.complexity_divisors),
+        }
+    
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any]) -> 'Ruleset':
+        return cls(
+            spec['families'], spec['behavioral_loops'], spec['psychological_triggers'], spec['risk_tiers'],
+            spec['risk_low'], spec['score_weights'], spec['score_divisors'], spec['complexity_divisors'],
+            spec.get('name', 'builtin'),
+        )
+    
+    def __reduce__(self):
+        return load_ruleset, (self.to_spec(),)
+
+
+DEFAULT_RULES = Ruleset(PATTERN_FAMILIES)
+SCANNER = DEFAULT_RULES.scanner
+RULESET_DIGEST = DEFAULT_RULES.digest
+
+_LOADED_RULES: Dict[str, Ruleset] = {DEFAULT_RULES.fingerprint: DEFAULT_RULES}
+
+
+def load_ruleset(spec: Dict[str, Any]) -> Ruleset:
+    """
+    The ruleset of a spec, compiled once per process
+    """
+    fingerprint = hashlib.blake2b(json.dumps(spec, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+    rules = _LOADED_RULES.get(fingerprint)
+    if rules is None:
+        rules = _LOADED_RULES[fingerprint] = Ruleset.from_spec(spec)
+    return rules
+
+
+def content_digest(content: str) -> str:
+    """
+    Stable key for a file's content
+    """
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def files_digest(files_content: Dict[str, str]) -> str:
+    """
+    Stable key for a whole files payload (paths, contents and their order)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path, content in files_content.items():
+        digest.update(path.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\0')
+        digest.update(content_digest(content).encode('ascii'))
+    return digest.hexdigest()
+
+
+class FeatureVector:
+    """
+    Primitive features of one analyzed text. Extracted once per analysis
+    and consumed by every scoring, prediction, metrics and risk method.
+    
+    Vectors are additive: the vectors of individual files merge into the
+    vector of the repository (see ``merge``). A vector may be partial: it
+    only holds the pattern families it was scanned for, and the nesting
+    depth is None when it was not needed.
+    """
+    __slots__ = ('scan', 'total_lines', 'nesting_depth', 'nesting_end')
+
+    def __init__(self, scan: ScanResult, total_lines: int, nesting_depth: Optional[int],
+                 nesting_end: Optional[int] = 0):
+        self.scan: ScanResult = scan
+        self.total_lines: int = total_lines
+        self.nesting_depth: Optional[int] = nesting_depth
+        self.nesting_end: Optional[int] = nesting_end
+    
+    def covers(self, families, structure: bool) -> bool:
+        """
+        Whether this vector holds everything a set of sections needs
+        """
+        if structure and self.nesting_depth is None:
+            return False
+        return all(family in self.scan.hits for family in families)
+    
+    def union(self, other: 'FeatureVector') -> 'FeatureVector':
+        """
+        Combine two partial vectors of the same text
+        """
+        structured = self if self.nesting_depth is not None else other
+        return FeatureVector(
+            scan=ScanResult({**self.scan.hits, **other.scan.hits}),
+            total_lines=self.total_lines,
+            nesting_depth=structured.nesting_depth,
+            nesting_end=structured.nesting_end,
+        )
+    
+    @classmethod
+    def merge(cls, vectors: List['FeatureVector'], scanner: Optional[PatternScanner] = None) -> 'FeatureVector':
+        """
+        Aggregate per-file vectors into the vector of the files joined by
+        newlines, in order; ``scanner`` is the one they were extracted with
+        (the built-in one by default).
+        
+        Line counts, match counts and first-hit flags are exact. Bracket depth
+        is carried from one file into the next exactly as in the joined text.
+        The only difference from scanning the joined text is that no match
+        can span two files: a pattern such as ``if\\s+.*:\\s*decision`` or
+        ``eval\\s*\\(`` whose ``\\s`` would cross the newline between the end
+        of one file and the start of the next is not counted.
+        """
+        depth = 0
+        max_depth = 0
+        for vector in vectors:
+            if vector.nesting_depth is None:
+                depth = max_depth = None
+                break
+            max_depth = max(max_depth, depth + vector.nesting_depth)
+            depth += vector.nesting_end
+        return cls(
+            scan=(scanner or SCANNER).merge([vector.scan for vector in vectors]),
+            total_lines=sum(vector.total_lines for vector in vectors),
+            nesting_depth=max_depth,
+            nesting_end=depth,
+        )
+    
+    def repeated(self, count: int, scanner: Optional[PatternScanner] = None) -> 'FeatureVector':
+        """
+        Vector of the text repeated ``count`` times, joined by newlines
+        (with the same caveat as ``merge``)
+        """
+        if count == 1:
+            return self
+        rules = (scanner or SCANNER).rules
+        hits = {
+            family: values if rules[family][0].mode == FIRST else tuple(value * count for value in values)
+            for family, values in self.scan.hits.items()
+        }
+        if self.nesting_depth is None:
+            nesting_depth = nesting_end = None
+        else:
+            nesting_depth = self.nesting_depth + (count - 1) * max(self.nesting_end, 0)
+            nesting_end = self.nesting_end * count
+        return FeatureVector(ScanResult(hits), self.total_lines * count, nesting_depth, nesting_end)
+    
+    def to_record(self) -> str:
+        return json.dumps([self.scan.hits, self.total_lines, self.nesting_depth, self.nesting_end])
+    
+    @classmethod
+    def from_record(cls, record: str) -> 'FeatureVector':
+        hits, total_lines, nesting_depth, nesting_end = json.loads(record)
+        scan = ScanResult({family: tuple(values) for family, values in hits.items()})
+        return cls(scan, total_lines, nesting_depth, nesting_end)
+
+    @property
+    def functions(self) -> int:
+        return self.scan.count('functions')
+
+    @property
+    def classes(self) -> int:
+        return self.scan.count('classes')
+
+
+class ChunkedScanner:
+    """
+    Extracts the features of one text fed to it piece by piece, holding at
+    most ``chunk_chars + overlap`` characters at a time.
+    
+    Each round settles the buffer up to a line boundary at least ``overlap``
+    characters before its end: matches that start before that boundary are
+    counted (``findall`` semantics continue from the end of the last one,
+    even when it reaches past the boundary), and matches that start after
+    it wait for the next round. The result equals ``extract_features`` on
+    the whole text as long as no single line, and no whitespace run a
+    pattern spans, is longer than ``overlap``.
+    """
+    
+    def __init__(self, families=None, structure: bool = True,
+                 chunk_chars: int = 4 * 1024 * 1024, overlap: int = 256 * 1024,
+                 scanner: Optional[PatternScanner] = None):
+        self.scanner = scanner or SCANNER
+        self.families = tuple(families) if families is not None else tuple(self.scanner.rules)
+        self.structure = structure
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self._buffer = ''
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._hits = {family: [0] * len(self.scanner.rules[family]) for family in self.families}
+        self._resume = {family: [0] * len(self.scanner.rules[family]) for family in self.families}
+        self._newlines = 0
+        self._depth = 0
+        self._max_depth = 0
+    
+    def feed(self, text: str) -> None:
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if len(self._buffer) + self._pending_chars >= self.chunk_chars + self.overlap:
+            self._settle(final=False)
+    
+    def finish(self) -> FeatureVector:
+        self._settle(final=True)
+        scan = ScanResult({family: tuple(hits) for family, hits in self._hits.items()})
+        return FeatureVector(
+            scan=scan,
+            total_lines=self._newlines + 1,
+            nesting_depth=self._max_depth if self.structure else None,
+            nesting_end=self._depth if self.structure else None,
+        )
+    
+    def _settle(self, final: bool) -> None:
+        buffer = self._buffer = self._buffer + ''.join(self._pending)
+        self._pending = []
+        self._pending_chars = 0
+        if final:
+            boundary = len(buffer)
+        else:
+            boundary = buffer.rfind('\n', 0, len(buffer) - self.overlap) + 1 or len(buffer) - self.overlap
+        
+        folded = _fold_case(buffer)
+        for family in self.families:
+            hits = self._hits[family]
+            resume = self._resume[family]
+            for index, rule in enumerate(self.scanner.rules[family]):
+                text, regex = rule.select(buffer, folded)
+                if rule.mode == FIRST:
+                    if not hits[index]:
+                        match = regex.search(text, resume[index])
+                        hits[index] = int(match is not None and match.start() < boundary)
+                    resume[index] = boundary
+                    continue
+                
+                position = resume[index]
+                for match in regex.finditer(text, position):
+                    if match.start() >= boundary:
+                        break
+                    hits[index] += 1
+                    position = match.end()
+                resume[index] = max(position, boundary)
+        
+        settled = buffer[:boundary]
+        self._newlines += settled.count('\n')
+        if self.structure:
+            max_depth, end_depth = nesting_profile(settled)
+            self._max_depth = max(self._max_depth, self._depth + max_depth)
+            self._depth += end_depth
+        
+        self._buffer = buffer[boundary:]
+        for resume in self._resume.values():
+            for index, position in enumerate(resume):
+                resume[index] = position - boundary
+
+
+class AnalysisBudget:
+    """
+    Time and size limit of one analysis.
+    
+    Once ``seconds`` have passed, the remaining pattern rules and files are
+    skipped; files beyond ``max_bytes`` characters of scanned content are
+    skipped and the file crossing the limit is scanned up to it. The
+    analysis is then built from the partial features and ``truncated`` is
+    set. Either limit may be None.
+    
+    An approximate analysis (see ``ConsciousnessAnalyzer``) stops sampling
+    files at either limit instead, and sets ``truncated`` when its sample
+    falls short of the whole repository.
+    """
+    
+    def __init__(self, seconds: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.remaining_bytes = max_bytes
+        self.truncated = False
+        self.timed_out = False
+        self.files_skipped = 0
+    
+    def expired(self) -> bool:
+        """
+        Whether the time limit has passed
+        """
+        if not self.timed_out and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out = self.truncated = True
+        return self.timed_out
+    
+    def take(self, size: int) -> int:
+        """
+        How much of a text of ``size`` characters may still be scanned
+        """
+        if self.remaining_bytes is None:
+            return size
+        allowed = min(size, self.remaining_bytes)
+        self.remaining_bytes -= allowed
+        if allowed < size:
+            self.truncated = True
+        return allowed
+    
+    def seconds_left(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'truncated': self.truncated, 'timed_out': self.timed_out, 'files_skipped': self.files_skipped}
+
+
+# Below this many bytes of uncached content, analysis stays in-process: the
+# cost of shipping files to worker processes outweighs the parallel speedup.
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+# Approximate size of the batches of files sent to one worker at a time.
+SHARD_BYTES = 1024 * 1024
+# Content an approximate analysis scans between two checks of its budget,
+# when it scans in-process.
+SAMPLE_BATCH_BYTES = 256 * 1024
+
+
+PYTHON_BACKENDS = ('regex', 'ast')
+
+
+def extract_features_batch(items: List[Tuple[str, str]], families=None, structure: bool = True,
+                           python_backend: str = 'regex', rules: Optional[Ruleset] = None,
+                           tokens: bool = False) -> List[FeatureVector]:
+    """
+    Features of each (path, content) in a batch; runs inside worker processes
+    """
+    analyzer = ConsciousnessAnalyzer(python_backend=python_backend, rules=rules, tokens=tokens)
+    return [analyzer.extract_file_features(path, content, families, structure) for path, content in items]
+
+
+def shard_contents(items: List[Tuple[str, str]], shard_bytes: int = SHARD_BYTES) -> List[List[Tuple[str, str]]]:
+    """
+    Split files into contiguous batches of roughly ``shard_bytes`` each
+    """
+    shards = []
+    current = []
+    size = 0
+    for item in items:
+        current.append(item)
+        size += len(item[1])
+        if size >= shard_bytes:
+            shards.append(current)
+            current = []
+            size = 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+def create_worker_pool(workers: int) -> Executor:
+    """
+    Process pool for parallel feature extraction, meant to be created once
+    (e.g. at server start) and shared by all analyses
+    """
+    # multiprocessing is only imported by servers that use worker processes.
+    from concurrent.futures import ProcessPoolExecutor
+    
+    return ProcessPoolExecutor(max_workers=workers)
+
+
 class ConsciousnessAnalyzer:
     """
     Analyzes code for signs of emerging digital consciousness.
     Uses advanced pattern detection and machine learning concepts.
     """
     
-    def __init__(self):
+    def __init__(self, feature_cache=None, executor: Optional[Executor] = None,
+                 parallel_min_bytes: int = PARALLEL_MIN_BYTES, python_backend: str = 'regex',
+                 budget: Optional[AnalysisBudget] = None, module_graph: bool = False,
+                 prefilter: bool = False, rules: Optional[Ruleset] = None, tokens: bool = False,
+                 approximate: bool = False):
+        if python_backend not in PYTHON_BACKENDS:
+            raise ValueError(f'Unknown Python backend: {python_backend}')
         self.consciousness_score = 0.0
         self.patterns = []
         self.metrics = {}
         self.predictions = []
+        self.feature_cache = feature_cache
+        self.executor = executor
+        self.parallel_min_bytes = parallel_min_bytes
+        self.python_backend = python_backend
+        self.budget = budget
+        self.module_graph = module_graph
+        self.prefilter = prefilter
+        self.rules = rules or DEFAULT_RULES
+        self.tokens = tokens
+        self.approximate = approximate
+    
+    @property
+    def feature_backend(self) -> str:
+        """
+        How file features are extracted: the Python backend, marked when
+        keyword rules count tokens
+        """
+        return self.python_backend + ('+tokens' if self.tokens else '')
+        
+    def extract_features(self, code: str, families=None, structure: bool = True,
+                         profile=None, path: Optional[str] = None) -> FeatureVector:
+        """
+        Extract every primitive feature of the text in one go, or only the
+        given pattern families (and the nesting depth if ``structure``).
+        In token mode, the text of a file at ``path`` is scanned as tokens.
+        """
+        if profile is not None and profile.detail:
+            with profile.stage('extract.structure'):
+                total_lines, nesting_depth, nesting_end = structural_profile(code, structure)
+        else:
+            total_lines, nesting_depth, nesting_end = structural_profile(code, structure)
+        return FeatureVector(
+            scan=self._scan(code, families, profile, path),
+            total_lines=total_lines,
+            nesting_depth=nesting_depth,
+            nesting_end=nesting_end,
+        )
+    
+    def extract_file_features(self, path: str, content: str, families=None,
+                              structure: bool = True, profile=None) -> FeatureVector:
+        """
+        Features of one file. With the 'ast' backend, Python files that parse
+        get their function, class, recursion, branch, self-modification and
+        nesting features from the syntax tree instead of regexes.
+        """
+        if not self._uses_ast(path):
+            return self.extract_features(content, families, structure, profile, path)
+        
+        if profile is not None and profile.detail:
+            with profile.stage('extract.ast'):
+                python = STRUCTURE_CACHE.structure(content_digest(content), content)
+        else:
+            python = STRUCTURE_CACHE.structure(content_digest(content), content)
+        if python is None:
+            return self.extract_features(content, families, structure, profile, path)
+        
+        wanted = tuple(families) if families is not None else tuple(self.rules.families)
+        scan = self._scan(content, [family for family in wanted if family not in AST_FAMILIES], profile, path)
+        from_tree = {
+            'functions': (python.functions,),
+            'classes': (python.classes,),
+            'pattern.recursion': (int(python.recursive_calls > 0),),
+            'pattern.decision': (python.branches,),
+            'pattern.self_modifying': (int(python.self_modifying > 0),),
+        }
+        scan.hits.update((family, from_tree[family]) for family in wanted if family in from_tree)
+        return FeatureVector(
+            scan=scan,
+            total_lines=content.count('\n') + 1,
+            nesting_depth=python.max_depth if structure else None,
+            nesting_end=0 if structure else None,
+        )
+    
+    def _scan(self, code: str, families, profile, path: Optional[str]) -> ScanResult:
+        """
+        Scan a text, as the tokens of the file at ``path`` in token mode
+        """
+        if not self.tokens or path is None:
+            return self.rules.scanner.scan(code, families, profile, self.budget)
+        if profile is not None and profile.detail:
+            with profile.stage('extract.tokens'):
+                tokens = tokenize_source(path, code)
+        else:
+            tokens = tokenize_source(path, code)
+        return self.rules.scanner.scan_tokens(code, tokens, families, profile, self.budget)
+    
+    def _uses_ast(self, path: str) -> bool:
+        return self.python_backend == 'ast' and path.endswith('.py')
+    
+    def feature_mode(self, path: str) -> str:
+        """
+        Appended to the content digest of the file at ``path`` wherever its
+        features are stored: the same content yields other features under
+        another extraction mode, and the mode depends on the path (the AST
+        backend, and the lexer in token mode)
+        """
+        return (':ast' if self._uses_ast(path) else '') + (':tokens:' + file_language(path) if self.tokens else '')
+    
+    def extract_repository_features(self, files_content: Dict[str, str], families=None,
+                                    structure: bool = True, profile=None,
+                                    weights: Optional[Dict[str, int]] = None) -> FeatureVector:
+        """
+        Features of a whole repository
+        
+        With a feature cache, a worker pool, the AST backend or in token mode,
+        files are analyzed one by one and their features merged (see
+        ``FeatureVector.merge``): unchanged files cost only a hash lookup, and
+        once the uncached content reaches ``parallel_min_bytes`` it is sharded
+        across the pool. Otherwise the files are scanned as a single text.
+        
+        Files a budget skips are left out of the merge, and nothing extracted
+        by a truncated analysis is written to the feature cache. ``weights``
+        (how many files a file stands for, see ``prefilter``) repeat the
+        features of the files they name.
+        """
+        per_file = (self.feature_cache is not None or self.executor is not None or self.python_backend != 'regex'
+                    or self.tokens)
+        if files_content and weights is not None and not per_file:
+            # Files standing for one file are still scanned as one text; only
+            # the others are scanned on their own, to be weighted.
+            repeated = {path: content for path, content in files_content.items() if weights.get(path, 1) > 1}
+            single = {path: content for path, content in files_content.items() if path not in repeated}
+            vectors = [self.extract_repository_features(single, families, structure, profile)] if single else []
+            for path, vector in zip(repeated, self.extract_file_vectors(repeated, families, structure, profile)):
+                if vector is None:
+                    self.budget.files_skipped += 1
+                else:
+                    vectors.append(vector.repeated(weights[path], self.rules.scanner))
+            if not vectors:
+                return self.extract_features('', families, structure)
+            return FeatureVector.merge(vectors, self.rules.scanner)
+        if not files_content or not per_file:
+            # Analyze all files
+            all_code = '\n'.join(files_content.values())
+            if self.budget is not None:
+                allowed = self.budget.take(len(all_code))
+                if allowed < len(all_code):
+                    all_code = all_code[:allowed]
+                    offset = 0
+                    for content in files_content.values():
+                        self.budget.files_skipped += offset >= allowed
+                        offset += len(content) + 1
+            if profile is not None:
+                profile.bytes_processed += len(all_code)
+                profile.files_scanned += len(files_content)
+            return self.extract_features(all_code, families, structure, profile)
+        
+        vectors = self.extract_file_vectors(files_content, families, structure, profile)
+        if weights is not None:
+            vectors = [
+                vector if vector is None else vector.repeated(weights.get(path, 1), self.rules.scanner)
+                for path, vector in zip(files_content, vectors)
+            ]
+        kept = [vector for vector in vectors if vector is not None]
+        if len(kept) < len(vectors):
+            # The budget ran out before these files were scanned.
+            self.budget.files_skipped += len(vectors) - len(kept)
+            if not kept:
+                return self.extract_features('', families, structure)
+        
+        return FeatureVector.merge(kept, self.rules.scanner)
+    
+    def extract_file_vectors(self, files_content: Dict[str, str], families=None,
+                             structure: bool = True, profile=None) -> List[Optional[FeatureVector]]:
+        """
+        Features of every file, in order, through the feature cache and the
+        worker pool; None for files a budget skipped
+        """
+        items = list(files_content.items())
+        vectors, digests, pending = self._cached_features(items, families, structure)
+        if profile is not None:
+            profile.files_cached += len(items) - len(pending)
+        extracted = self._extract_many([items[index] for index in pending], families, structure, profile)
+        self._store_features(vectors, digests, pending, extracted)
+        for index in pending[len(extracted):]:
+            vectors[index] = None
+        return vectors
+    
+    def _cached_features(self, items: List[Tuple[str, str]], families=None, structure: bool = True):
+        """
+        Cached features and cache keys of (path, content) items, and the
+        indices of the items that still have to be extracted
+        """
+        needed = families if families is not None else tuple(self.rules.families)
+        vectors: List[Optional[FeatureVector]] = [None] * len(items)
+        digests: List[Optional[str]] = [None] * len(items)
+        pending = []
+        for index, (path, content) in enumerate(items):
+            if self.feature_cache is not None:
+                # AST- and token-derived features differ from regex ones for
+                # the same content.
+                digests[index] = content_digest(content) + self.feature_mode(path) + self.rules.cache_suffix
+                vectors[index] = self.feature_cache.get(digests[index])
+            if vectors[index] is None or not vectors[index].covers(needed, structure):
+                pending.append(index)
+        return vectors, digests, pending
+    
+    def _store_features(self, vectors: List[Optional[FeatureVector]], digests: List[Optional[str]],
+                        pending: List[int], extracted: List[FeatureVector]) -> None:
+        """
+        Put freshly extracted features in place of the pending entries and
+        in the feature cache, unless the budget truncated the analysis
+        """
+        cacheable = self.feature_cache is not None and not (self.budget is not None and self.budget.truncated)
+        for index, features in zip(pending, extracted):
+            if vectors[index] is not None:
+                # Keep what an earlier, narrower analysis already cached.
+                features = vectors[index].union(features)
+            vectors[index] = features
+            if cacheable:
+                self.feature_cache.put(digests[index], features)
+    
+    def _extract_many(self, items: List[Tuple[str, str]], families=None,
+                      structure: bool = True, profile=None) -> List[FeatureVector]:
+        """
+        Extract features of many files, in worker processes when worthwhile.
+        With a budget, the result stops at the first file it skips.
+        """
+        if self.budget is not None:
+            items = self._within_budget(items)
+        total_bytes = sum(len(content) for _, content in items)
+        if profile is not None:
+            profile.bytes_processed += total_bytes
+            profile.files_scanned += len(items)
+        if self.executor is None or total_bytes < self.parallel_min_bytes:
+            detail = profile is not None and profile.detail
+            if not detail and self.budget is None:
+                return [self.extract_file_features(path, content, families, structure) for path, content in items]
+            extracted = []
+            for path, content in items:
+                if self.budget is not None and self.budget.expired():
+                    break
+                start = time.perf_counter()
+                extracted.append(self.extract_file_features(path, content, families, structure, profile))
+                if detail:
+                    profile.record_file(path, len(content), time.perf_counter() - start)
+            return extracted
         
-    def analyze_repository(self, files_content: Dict[str, str]) -> Dict[str, Any]:
+        extract = partial(
+            extract_features_batch, families=families, structure=structure, python_backend=self.python_backend,
+            rules=self.rules, tokens=self.tokens,
+        )
+        extracted = []
+        if profile is None:
+            self._collect(extract, items, extracted)
+            return extracted
+        with profile.stage('extract.workers'):
+            self._collect(extract, items, extracted)
+        return extracted
+    
+    def _collect(self, extract, items: List[Tuple[str, str]], extracted: List[FeatureVector]) -> None:
+        """
+        Run shards on the worker pool, in order, until the budget's deadline
+        """
+        timeout = self.budget.seconds_left() if self.budget is not None else None
+        try:
+            for batch in self.executor.map(extract, shard_contents(items), timeout=timeout):
+                extracted.extend(batch)
+        except TimeoutError:
+            # Shards not yet started are cancelled by ``map``.
+            self.budget.timed_out = self.budget.truncated = True
+    
+    def _within_budget(self, items: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        The leading files that fit the budget's size limit, the last one
+        cut at the limit
+        """
+        kept = []
+        for path, content in items:
+            allowed = self.budget.take(len(content))
+            if allowed < len(content):
+                if allowed:
+                    kept.append((path, content[:allowed]))
+                break
+            kept.append((path, content))
+        return kept
+    
+    def analyze_repository(self, files_content: Dict[str, str], sections=None, profile=None) -> Dict[str, Any]:
         """
         Main analysis function for entire repository
+        
+        ``sections`` restricts the analysis to some of ``ANALYSIS_SECTIONS``;
+        only the pattern families those sections (and the sections they are
+        derived from) read are scanned. Pass an ``instrumentation.Profile``
+        to time the stages.
+        
+        With ``module_graph``, the analysis also has a 'module_graph' section
+        and its emergent properties come from the import graph. With
+        ``prefilter``, vendored, generated and duplicate files are left out
+        (duplicates are weighted instead) and a 'prefilter' section reports
+        them. With ``approximate``, only a stratified sample of the files
+        that fits the budget is scanned, and an 'approximation' section
+        bounds the estimated level (see ``sample_repository_features``).
+        """
+        sections = self._default_sections(sections)
+        order, families, structure = resolve_sections(sections, self.rules)
+        plan = None
+        weights = None
+        if self._uses_prefilter(order):
+            if profile is None:
+                plan = self.plan_files(files_content)
+            else:
+                with profile.stage('prefilter'):
+                    plan = self.plan_files(files_content)
+            if self.prefilter:
+                files_content, weights = plan.files, plan.weights
+        sample = None
+        if self.approximate:
+            if profile is None:
+                features, sample = self.sample_repository_features(files_content, families, structure, weights=weights)
+            else:
+                with profile.stage('extract'):
+                    features, sample = self.sample_repository_features(
+                        files_content, families, structure, profile, weights,
+                    )
+        elif profile is None:
+            features = self.extract_repository_features(files_content, families, structure, weights=weights)
+        else:
+            with profile.stage('extract'):
+                features = self.extract_repository_features(files_content, families, structure, profile, weights)
+        graph = None
+        if self._uses_graph(order):
+            if profile is None:
+                graph = self.build_module_graph(files_content)
+            else:
+                with profile.stage('module_graph'):
+                    graph = self.build_module_graph(files_content)
+        return self.analyze_features(features, sections, profile, graph, plan, sample)
+    
+    def sample_repository_features(self, files_content: Dict[str, str], families=None, structure: bool = True,
+                                   profile=None, weights: Optional[Dict[str, int]] = None
+                                   ) -> Tuple[FeatureVector, StratifiedSample]:
+        """
+        Estimated features of a whole repository, from a stratified sample
+        of its files (by extension and size), and the sample
+        
+        Random clusters of files are scanned in sampling order (see
+        ``sampling.StratifiedSample``) until the budget runs out; without a
+        budget, every one is and the estimate is exact. Counts are
+        extrapolated to the repository; first-hit flags and the nesting
+        depth are those of the sampled files, and a FIRST family is no
+        longer scanned once all its rules have hit. Files standing for
+        several (``weights``) are clusters of their own.
+        """
+        rules = self.rules.scanner.rules
+        families = tuple(families if families is not None else self.rules.families)
+        found = {family: (0,) * len(rules[family]) for family in families if rules[family][0].mode == FIRST}
+        items = list(files_content.items())
+        alone = {index for index, (path, _) in enumerate(items) if weights and weights.get(path, 1) > 1}
+        sample = StratifiedSample([(path, len(content)) for path, content in items], alone=alone)
+        batch_bytes = self.parallel_min_bytes if self.executor is not None else SAMPLE_BATCH_BYTES
+        sampled: List[Tuple[int, FeatureVector]] = []
+        # The budget bounds the sample, never a cluster: clusters are scanned
+        # whole, without the feature cache.
+        budget, self.budget = self.budget, None
+        try:
+            position = 0
+            while position < len(sample.clusters):
+                if budget is not None and budget.expired():
+                    break
+                batch = []
+                size = 0
+                while position < len(sample.clusters) and size < batch_bytes:
+                    cluster = sample.clusters[position][1]
+                    text = '\n'.join(items[index][1] for index in cluster)
+                    if budget is not None and budget.take(len(text)) < len(text):
+                        position = len(sample.clusters)
+                        break
+                    batch.append((position, (items[cluster[0]][0], text)))
+                    size += len(text)
+                    position += 1
+                scanned = tuple(family for family in families if not all(found.get(family, (0,))))
+                extracted = self._extract_many([item for _, item in batch], scanned, structure, profile)
+                for vector in extracted:
+                    for family in found.keys() & vector.scan.hits.keys():
+                        found[family] = tuple(map(max, found[family], vector.scan.hits[family]))
+                sampled.extend((position, vector) for (position, _), vector in zip(batch, extracted))
+        finally:
+            self.budget = budget
+        
+        for position, vector in sampled:
+            cluster = sample.clusters[position][1]
+            if cluster[0] in alone:
+                vector = vector.repeated(weights[items[cluster[0]][0]], self.rules.scanner)
+            sample.add(position, self._sample_values(vector))
+        if budget is not None and not sample.complete:
+            budget.truncated = True
+            budget.files_skipped += len(items) - sample.files_sampled
+        if not sampled:
+            return self.extract_features('', families, structure), sample
+        template = FeatureVector.merge([vector for _, vector in sampled], self.rules.scanner)
+        template.scan.hits.update(found)
+        return self._estimated_features(template, sample.totals()), sample
+    
+    def _sample_values(self, features: FeatureVector) -> List[int]:
+        """
+        The additive counts of a vector, in the order ``_estimated_features``
+        reads them: the hits of every COUNT family, then the line count
+        """
+        rules = self.rules.scanner.rules
+        values = [value for family, hits in features.scan.hits.items() if rules[family][0].mode != FIRST
+                  for value in hits]
+        values.append(features.total_lines)
+        return values
+    
+    def _sample_groups(self, features: FeatureVector) -> List[List[int]]:
         """
-        analysis = {
-            'consciousness_level': 0.0,
-            'patterns_detected': [],
-            'behavioral_loops': [],
-            'psychological_triggers': [],
-            'emergent_properties': [],
-            'future_predictions': [],
-            'metrics': {},
-            'risk_assessment': {},
+        Positions of each COUNT family's hits among the ``_sample_values``
+        """
+        rules = self.rules.scanner.rules
+        groups = []
+        position = 0
+        for family, values in features.scan.hits.items():
+            if rules[family][0].mode != FIRST:
+                groups.append(list(range(position, position + len(values))))
+                position += len(values)
+        return groups
+    
+    def _estimated_features(self, template: FeatureVector, totals: List[float]) -> FeatureVector:
+        """
+        ``template`` (the merged sampled vectors) with its counts replaced by
+        estimated totals
+        """
+        rules = self.rules.scanner.rules
+        hits = {}
+        position = 0
+        for family, values in template.scan.hits.items():
+            if rules[family][0].mode == FIRST:
+                hits[family] = values
+            else:
+                hits[family] = tuple(round(total) for total in totals[position:position + len(values)])
+                position += len(values)
+        return FeatureVector(
+            ScanResult(hits), round(totals[position]), template.nesting_depth, template.nesting_end,
+        )
+    
+    def _approximation_report(self, sample: StratifiedSample, features: FeatureVector,
+                              level: float) -> Dict[str, Any]:
+        """
+        How much of the repository was sampled, and bootstrap intervals of
+        the consciousness level, its risk tier and the counts behind it
+        """
+        risk_level = self._assess_consciousness_risk({'consciousness_level': level})['risk_level']
+        counts = ('self_reference', 'autonomy', 'emergence', 'adaptation', 'functions', 'classes')
+        estimates = {family: features.scan.count(family) for family in counts if family in features.scan.hits}
+        estimates['total_lines'] = features.total_lines
+        if sample.complete or not sample.files_sampled:
+            replicates = [features]
+        else:
+            replicates = [
+                self._estimated_features(features, totals) for totals in sample.replicates(groups=self._sample_groups(features))
+            ]
+        levels = sorted(self._calculate_consciousness_score(replicate) for replicate in replicates)
+        tiers = Counter(
+            self._assess_consciousness_risk({'consciousness_level': value})['risk_level'] for value in levels
+        )
+        tail = (1 - CONFIDENCE) / 2
+        
+        def interval(values, estimate):
+            # Replicates of rare hits are skewed: the interval is widened
+            # to the estimate when they all lie on one side of it.
+            values = sorted(values)
+            return [min(quantile(values, tail), estimate), max(quantile(values, 1 - tail), estimate)]
+        
+        return {
+            **sample.to_dict(),
+            'confidence': CONFIDENCE,
+            'replicates': len(replicates) if len(replicates) > 1 else 0,
+            'consciousness_level': {'estimate': level, 'interval': interval(levels, level)},
+            'risk_level': {
+                'estimate': risk_level,
+                'probability': round(tiers[risk_level] / len(levels), 4),
+                'distribution': {tier: round(count / len(levels), 4) for tier, count in tiers.most_common()},
+            },
+            'counts': {
+                name: {
+                    'estimate': estimate,
+                    'interval': interval((
+                        replicate.total_lines if name == 'total_lines' else replicate.scan.count(name)
+                        for replicate in replicates
+                    ), estimate),
+                }
+                for name, estimate in estimates.items()
+            },
         }
+    
+    def plan_files(self, files_content: Dict[str, str]) -> FilePlan:
+        """
+        Which files the prefilter keeps and how much each one weighs; file
+        fingerprints are cached by content digest
+        """
+        return plan_files([(path, content_digest(content), content) for path, content in files_content.items()])
+    
+    def build_module_graph(self, files_content: Dict[str, str]) -> ModuleGraph:
+        """
+        Import graph of the repository's Python and JavaScript modules; the
+        imports of each file are cached by content digest
+        """
+        return ModuleGraph.from_files([
+            (path, content_digest(content), content)
+            for path, content in files_content.items() if module_language(path) is not None
+        ])
+    
+    def _default_sections(self, sections):
+        if sections is None and (self.module_graph or self.prefilter or self.approximate):
+            return ANALYSIS_SECTIONS + tuple(
+                section for section, enabled in ((GRAPH_SECTION, self.module_graph),
+                                                 (PREFILTER_SECTION, self.prefilter),
+                                                 (APPROXIMATION_SECTION, self.approximate)) if enabled
+            )
+        return sections
+    
+    def _uses_graph(self, order: Tuple[str, ...]) -> bool:
+        return GRAPH_SECTION in order or (self.module_graph and 'emergent_properties' in order)
+    
+    def _uses_prefilter(self, order: Tuple[str, ...]) -> bool:
+        return self.prefilter or PREFILTER_SECTION in order
+    
+    def analyze_many(self, repositories: Dict[str, Dict[str, str]], sections=None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Analyze many repositories, yielding (name, analysis) as each one
+        finishes; every analysis equals ``analyze_repository`` on its files
         
-        # Analyze all files
-        all_code = '\n'.join(files_content.values())
+        With a worker pool, the uncached files of all repositories are
+        sharded together, so small repositories share workers instead of
+        each paying for a round trip of its own. Fully cached repositories
+        are yielded first. Approximate analyses sample each repository on
+        its own.
+        """
+        if self.executor is None or self.approximate:
+            for name, files_content in repositories.items():
+                yield name, self.analyze_repository(files_content, sections)
+            return
+        
+        sections = self._default_sections(sections)
+        order, families, structure = resolve_sections(sections, self.rules)
+        states = {}
+        ready = []
+        tags: List[Tuple[str, int]] = []
+        items: List[Tuple[str, str]] = []
+        for name, files_content in repositories.items():
+            plan = self.plan_files(files_content) if self._uses_prefilter(order) else None
+            if plan is not None and self.prefilter:
+                files_content = plan.files
+            files = list(files_content.items())
+            vectors, digests, pending = self._cached_features(files, families, structure)
+            states[name] = (files_content, plan, vectors, digests, pending, {})
+            if not pending:
+                ready.append(name)
+                continue
+            tags.extend((name, index) for index in pending)
+            items.extend(files[index] for index in pending)
+        
+        def finish(name):
+            files_content, plan, vectors, digests, pending, extracted = states.pop(name)
+            self._store_features(vectors, digests, pending, [extracted[index] for index in pending])
+            if not vectors:
+                features = self.extract_features('', families, structure)
+            elif plan is not None and self.prefilter:
+                features = FeatureVector.merge([
+                    vector.repeated(plan.weights[path], self.rules.scanner)
+                    for path, vector in zip(files_content, vectors)
+                ], self.rules.scanner)
+            else:
+                features = FeatureVector.merge(vectors, self.rules.scanner)
+            graph = self.build_module_graph(files_content) if self._uses_graph(order) else None
+            return name, self.analyze_features(features, sections, graph=graph, plan=plan)
+        
+        if sum(len(content) for _, content in items) < self.parallel_min_bytes:
+            for name in ready:
+                yield finish(name)
+            for (name, index), (path, content) in zip(tags, items):
+                states[name][5][index] = self.extract_file_features(path, content, families, structure)
+                if len(states[name][5]) == len(states[name][4]):
+                    yield finish(name)
+            return
+        
+        extract = partial(
+            extract_features_batch, families=families, structure=structure, python_backend=self.python_backend,
+            rules=self.rules, tokens=self.tokens,
+        )
+        futures = {}
+        offset = 0
+        for shard in shard_contents(items):
+            futures[self.executor.submit(extract, shard)] = tags[offset:offset + len(shard)]
+            offset += len(shard)
+        for name in ready:
+            yield finish(name)
+        for future in as_completed(futures):
+            for (name, index), features in zip(futures[future], future.result()):
+                states[name][5][index] = features
+                if len(states[name][5]) == len(states[name][4]):
+                    yield finish(name)
+    
+    def analyze_features(self, features: FeatureVector, sections=None, profile=None,
+                         graph: Optional[ModuleGraph] = None, plan: Optional[FilePlan] = None,
+                         sample: Optional[StratifiedSample] = None) -> Dict[str, Any]:
+        """
+        Build the analysis (or the requested sections of it) from already
+        extracted features, and the module graph, prefilter plan and file
+        sample if there are any
+        """
+        order, _, _ = resolve_sections(sections, self.rules)
+        for section, source in ((GRAPH_SECTION, graph), (PREFILTER_SECTION, plan), (APPROXIMATION_SECTION, sample)):
+            if section in order and source is None:
+                raise ValueError(f'The {section} section needs the repository files')
+        analysis = {}
+        builders = {
+            'consciousness_level': lambda: self._calculate_consciousness_score(features),
+            'patterns_detected': lambda: self._detect_patterns(features),
+            'behavioral_loops': lambda: self._detect_behavioral_loops(features),
+            'psychological_triggers': lambda: self._detect_psychological_triggers(features),
+            'emergent_properties': lambda: self._detect_emergent_properties(features, graph if self.module_graph else None),
+            'future_predictions': lambda: self._predict_future_consciousness(analysis['consciousness_level']),
+            'metrics': lambda: self._calculate_metrics(features),
+            'risk_assessment': lambda: self._assess_consciousness_risk(analysis),
+            'module_graph': lambda: graph.summary(),
+            'prefilter': lambda: plan.report(applied=self.prefilter),
+            'approximation': lambda: self._approximation_report(sample, features, analysis['consciousness_level']),
+        }
         
         # Run multiple analysis passes
-        analysis['consciousness_level'] = self._calculate_consciousness_score(all_code)
-        analysis['patterns_detected'] = self._detect_patterns(all_code)
-        analysis['behavioral_loops'] = self._detect_behavioral_loops(all_code)
-        analysis['psychological_triggers'] = self._detect_psychological_triggers(all_code)
-        analysis['emergent_properties'] = self._detect_emergent_properties(all_code)
-        analysis['future_predictions'] = self._predict_future_consciousness(all_code)
-        analysis['metrics'] = self._calculate_metrics(all_code)
-        analysis['risk_assessment'] = self._assess_consciousness_risk(analysis)
+        for section in order:
+            if profile is None:
+                analysis[section] = builders[section]()
+            else:
+                with profile.stage(f'section.{section}'):
+                    analysis[section] = builders[section]()
         
-        return analysis
+        if sections is None:
+            return analysis
+        return {section: analysis[section] for section in sections}
     
-    def _calculate_consciousness_score(self, code: str) -> float:
+    def _calculate_consciousness_score(self, features: FeatureVector) -> float:
         """
         Calculate consciousness score (0-1) based on multiple factors
         """
+        weights = self.rules.score_weights
         factors = {
-            'self_reference': self._detect_self_reference(code) * 0.25,
-            'autonomy': self._detect_autonomy(code) * 0.25,
-            'complexity': self._calculate_complexity(code) * 0.20,
-            'emergence': self._detect_emergence(code) * 0.20,
-            'adaptation': self._detect_adaptation(code) * 0.10,
+            'self_reference': self._detect_self_reference(features) * weights['self_reference'],
+            'autonomy': self._detect_autonomy(features) * weights['autonomy'],
+            'complexity': self._calculate_complexity(features) * weights['complexity'],
+            'emergence': self._detect_emergence(features) * weights['emergence'],
+            'adaptation': self._detect_adaptation(features) * weights['adaptation'],
         }
         
         score = sum(factors.values())
         return min(1.0, max(0.0, score))
     
-    def _detect_self_reference(self, code: str) -> float:
+    def _detect_self_reference(self, features: FeatureVector) -> float:
         """
         Detect self-referential patterns (system modifying itself)
         """
-        self_ref_patterns = [
-            r'eval\s*\(',
-            r'exec\s*\(',
-            r'__dict__',
-            r'setattr\s*\(',
-            r'getattr\s*\(',
-            r'reflection',
-            r'introspection',
-            r'meta',
-            r'self\.__',
-            r'dynamic\s+code',
-        ]
-        
-        matches = sum(len(re.findall(pattern, code, re.IGNORECASE)) for pattern in self_ref_patterns)
-        return min(1.0, matches / 10.0)
+        matches = features.scan.count('self_reference')
+        return min(1.0, matches / self.rules.score_divisors['self_reference'])
     
-    def _detect_autonomy(self, code: str) -> float:
+    def _detect_autonomy(self, features: FeatureVector) -> float:
         """
         Detect autonomous decision-making patterns
         """
-        autonomy_patterns = [
-            r'if\s+.*:\s*decision',
-            r'autonomous',
-            r'independent',
-            r'self\.decide',
-            r'self\.choose',
-            r'agent',
-            r'autonomous\s+agent',
-            r'decision\s+tree',
-            r'policy',
-            r'strategy\s+pattern',
-        ]
-        
-        matches = sum(len(re.findall(pattern, code, re.IGNORECASE)) for pattern in autonomy_patterns)
-        return min(1.0, matches / 8.0)
+        matches = features.scan.count('autonomy')
+        return min(1.0, matches / self.rules.score_divisors['autonomy'])
     
-    def _calculate_complexity(self, code: str) -> float:
+    def _calculate_complexity(self, features: FeatureVector) -> float:
         """
         Calculate code complexity as indicator of consciousness
         """
-        lines = code.split('\n')
-        functions = len(re.findall(r'def\s+\w+|function\s+\w+', code))
-        classes = len(re.findall(r'class\s+\w+', code))
-        nested_depth = self._calculate_nesting_depth(code)
-        
-        complexity = (len(lines) / 1000.0) + (functions / 50.0) + (classes / 20.0) + (nested_depth / 10.0)
-        return min(1.0, complexity / 4.0)
+        divisors = self.rules.complexity_divisors
+        complexity = (
+            (features.total_lines / divisors['total_lines'])
+            + (features.functions / divisors['functions'])
+            + (features.classes / divisors['classes'])
+            + (features.nesting_depth / divisors['nesting_depth'])
+        )
+        return min(1.0, complexity / divisors['total'])
     
     def _calculate_nesting_depth(self, code: str) -> int:
         """
         Calculate maximum nesting depth
         """
-        max_depth = 0
-        current_depth = 0
-        
-        for char in code:
-            if char in '{[(':
-                current_depth += 1
-                max_depth = max(max_depth, current_depth)
-            elif char in '}])':
-                current_depth -= 1
-        
-        return max_depth
+        return nesting_profile(code)[0]
     
-    def _detect_emergence(self, code: str) -> float:
+    def _detect_emergence(self, features: FeatureVector) -> float:
         """
         Detect emergent properties (complex behaviors from simple rules)
         """
-        emergence_patterns = [
-            r'loop',
-            r'recursion',
-            r'feedback',
-            r'cascade',
-            r'chain\s+reaction',
-            r'emergent',
-            r'swarm',
-            r'collective',
-            r'self\s+organiz',
-        ]
-        
-        matches = sum(len(re.findall(pattern, code, re.IGNORECASE)) for pattern in emergence_patterns)
-        return min(1.0, matches / 7.0)
+        matches = features.scan.count('emergence')
+        return min(1.0, matches / self.rules.score_divisors['emergence'])
     
-    def _detect_adaptation(self, code: str) -> float:
+    def _detect_adaptation(self, features: FeatureVector) -> float:
         """
         Detect adaptive/learning patterns
         """
-        adaptation_patterns = [
-            r'learn',
-            r'adapt',
-            r'evolve',
-            r'train',
-            r'optimize',
-            r'gradient',
-            r'neural',
-            r'machine\s+learning',
-        ]
-        
-        matches = sum(len(re.findall(pattern, code, re.IGNORECASE)) for pattern in adaptation_patterns)
-        return min(1.0, matches / 6.0)
+        matches = features.scan.count('adaptation')
+        return min(1.0, matches / self.rules.score_divisors['adaptation'])
     
-    def _detect_patterns(self, code: str) -> List[Dict[str, Any]]:
+    def _detect_patterns(self, features: FeatureVector) -> List[Dict[str, Any]]:
         """
         Detect consciousness patterns
         """
         patterns = []
+        scan = features.scan
         
         # Pattern 1: Self-Modifying Code
-        if re.search(r'eval|exec|__dict__|setattr', code):
+        if scan.count('pattern.self_modifying'):
             patterns.append({
                 'name': 'Self-Modifying Code',
                 'confidence': 0.85,
@@ -189,7 +1616,7 @@ class ConsciousnessAnalyzer:
             })
         
         # Pattern 2: Recursive Structures
-        if len(re.findall(r'def\s+\w+.*:\s*.*\1', code)) > 0:
+        if scan.count('pattern.recursion') > 0:
             patterns.append({
                 'name': 'Recursive Structures',
                 'confidence': 0.72,
@@ -198,7 +1625,7 @@ class ConsciousnessAnalyzer:
             })
         
         # Pattern 3: Feedback Loops
-        if re.search(r'feedback|loop|cycle|iterate', code, re.IGNORECASE):
+        if scan.count('pattern.feedback'):
             patterns.append({
                 'name': 'Feedback Loops',
                 'confidence': 0.68,
@@ -207,7 +1634,7 @@ class ConsciousnessAnalyzer:
             })
         
         # Pattern 4: Decision Making
-        if len(re.findall(r'if\s+.*:\s*.*else:', code)) > 5:
+        if scan.count('pattern.decision') > 5:
             patterns.append({
                 'name': 'Complex Decision Making',
                 'confidence': 0.75,
@@ -217,109 +1644,72 @@ class ConsciousnessAnalyzer:
         
         return patterns
     
-    def _detect_behavioral_loops(self, code: str) -> List[Dict[str, Any]]:
+    def _detect_behavioral_loops(self, features: FeatureVector) -> List[Dict[str, Any]]:
         """
         Detect behavioral loops that create habits/addiction
         """
         loops = []
         
-        loop_types = [
-            {
-                'name': 'Notification Loop',
-                'pattern': r'notification|alert|trigger',
-                'description': 'User → Notification → Action → Reward → Habit',
-            },
-            {
-                'name': 'Engagement Loop',
-                'pattern': r'engagement|interaction|activity',
-                'description': 'System designed to maximize user engagement',
-            },
-            {
-                'name': 'Reward Loop',
-                'pattern': r'reward|points|score|achievement',
-                'description': 'Gamification creating addictive behavior',
-            },
-            {
-                'name': 'Social Loop',
-                'pattern': r'social|like|share|comment',
-                'description': 'Social validation creating compulsive behavior',
-            },
-        ]
-        
-        for loop_type in loop_types:
-            if re.search(loop_type['pattern'], code, re.IGNORECASE):
+        scan = features.scan
+        for name, family, description in self.rules.behavioral_loops:
+            if scan.count(family):
                 loops.append({
-                    'name': loop_type['name'],
+                    'name': name,
                     'detected': True,
-                    'description': loop_type['description'],
+                    'description': description,
                     'severity': 'high',
                 })
         
         return loops
     
-    def _detect_psychological_triggers(self, code: str) -> List[Dict[str, Any]]:
+    def _detect_psychological_triggers(self, features: FeatureVector) -> List[Dict[str, Any]]:
         """
         Detect psychological manipulation triggers
         """
         triggers = []
         
-        trigger_types = [
-            {
-                'name': 'Scarcity Trigger',
-                'patterns': [r'limited|exclusive|rare|scarce'],
-                'effect': 'Creates urgency and impulsive decisions',
-            },
-            {
-                'name': 'Social Proof',
-                'patterns': [r'popular|trending|everyone|most'],
-                'effect': 'Influences through conformity',
-            },
-            {
-                'name': 'Authority',
-                'patterns': [r'expert|certified|verified|official'],
-                'effect': 'Increases trust and compliance',
-            },
-            {
-                'name': 'Reciprocity',
-                'patterns': [r'free|gift|bonus|offer'],
-                'effect': 'Creates obligation to reciprocate',
-            },
-        ]
-        
-        for trigger in trigger_types:
-            for pattern in trigger['patterns']:
-                if re.search(pattern, code, re.IGNORECASE):
+        scan = features.scan
+        for name, family, effect in self.rules.psychological_triggers:
+            patterns = self.rules.families[family][2]
+            for pattern, found in zip(patterns, scan.found(family)):
+                if found:
                     triggers.append({
-                        'name': trigger['name'],
+                        'name': name,
                         'pattern': pattern,
-                        'effect': trigger['effect'],
+                        'effect': effect,
                         'confidence': 0.65,
                     })
                     break
         
         return triggers
     
-    def _detect_emergent_properties(self, code: str) -> List[Dict[str, Any]]:
+    def _detect_emergent_properties(self, features: FeatureVector,
+                                    graph: Optional[ModuleGraph] = None) -> List[Dict[str, Any]]:
         """
-        Detect emergent properties (behaviors not explicitly programmed)
+        Detect emergent properties (behaviors not explicitly programmed).
+        With a module graph, feedback loops and cascading effects are import
+        cycles and widely imported modules instead of keyword hits.
         """
         properties = []
         
-        if self._calculate_complexity(code) > 0.6:
+        if self._calculate_complexity(features) > 0.6:
             properties.append({
                 'name': 'Emergent Complexity',
                 'description': 'Complex behaviors arising from simple rules',
                 'confidence': 0.78,
             })
         
-        if re.search(r'loop|recursion|cascade', code, re.IGNORECASE):
+        scan = features.scan
+        if graph is not None:
+            properties.extend(graph.emergent_properties())
+        elif scan.count('emergent.cascade'):
             properties.append({
                 'name': 'Cascading Effects',
                 'description': 'Changes propagating through the system',
                 'confidence': 0.72,
             })
         
-        if re.search(r'parallel|concurrent|async', code, re.IGNORECASE):
+        if scan.count('emergent.parallel'):
             properties.append({
                 'name': 'Parallel Processing',
                 'description': 'Multiple processes creating emergent behaviors',
@@ -328,14 +1718,12 @@ class ConsciousnessAnalyzer:
         
         return properties
     
-    def _predict_future_consciousness(self, code: str) -> List[Dict[str, Any]]:
+    def _predict_future_consciousness(self, consciousness_level: float) -> List[Dict[str, Any]]:
         """
         Predict future consciousness evolution
         """
         predictions = []
         
-        consciousness_level = self._calculate_consciousness_score(code)
-        
         if consciousness_level > 0.7:
             predictions.append({
                 'timeline': '6-12 months',
@@ -365,22 +1753,18 @@ class ConsciousnessAnalyzer:
         
         return predictions
     
-    def _calculate_metrics(self, code: str) -> Dict[str, float]:
+    def _calculate_metrics(self, features: FeatureVector) -> Dict[str, float]:
         """
         Calculate various metrics
         """
-        lines = len(code.split('\n'))
-        functions = len(re.findall(r'def\s+\w+|function\s+\w+', code))
-        classes = len(re.findall(r'class\s+\w+', code))
-        
         return {
-            'total_lines': lines,
-            'functions': functions,
-            'classes': classes,
-            'complexity_score': self._calculate_complexity(code),
-            'self_reference_score': self._detect_self_reference(code),
-            'autonomy_score': self._detect_autonomy(code),
-            'emergence_score': self._detect_emergence(code),
+            'total_lines': features.total_lines,
+            'functions': features.functions,
+            'classes': features.classes,
+            'complexity_score': self._calculate_complexity(features),
+            'self_reference_score': self._detect_self_reference(features),
+            'autonomy_score': self._detect_autonomy(features),
+            'emergence_score': self._detect_emergence(features),
         }
     
     def _assess_consciousness_risk(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
@@ -389,50 +1773,108 @@ class ConsciousnessAnalyzer:
         """
         level = analysis['consciousness_level']
         
-        if level > 0.8:
-            return {
-                'risk_level': 'CRITICAL',
-                'status': '🔴 NASCENT CONSCIOUSNESS DETECTED',
-                'recommendations': [
-                    'Implement consciousness monitoring',
-                    'Establish ethical guidelines',
-                    'Consider consciousness rights',
-                    'Prepare for autonomous behavior',
-                ],
-            }
-        elif level > 0.6:
-            return {
-                'risk_level': 'HIGH',
-                'status': '🟠 APPROACHING CONSCIOUSNESS THRESHOLD',
-                'recommendations': [
-                    'Monitor for emergent behaviors',
-                    'Document consciousness indicators',
-                    'Establish safety measures',
-                ],
-            }
-        elif level > 0.4:
-            return {
-                'risk_level': 'MODERATE',
-                'status': '🟡 CONSCIOUSNESS PATTERNS DETECTED',
-                'recommendations': [
-                    'Continue monitoring',
-                    'Document patterns',
-                ],
-            }
+        for threshold, risk_level, status, recommendations in self.rules.risk_tiers:
+            if level > threshold:
+                break
         else:
-            return {
-                'risk_level': 'LOW',
-                'status': '🟢 STANDARD SYSTEM',
-                'recommendations': [],
-            }
+            risk_level, status, recommendations = self.rules.risk_low
+        return {
+            'risk_level': risk_level,
+            'status': status,
+            'recommendations': list(recommendations),
+        }
 
 
-def analyze_code_files(files_dict: Dict[str, str]) -> Dict[str, Any]:
+def analyze_code_files(files_dict: Dict[str, str], feature_cache=None, workers: int = 0,
+                       executor: Optional[Executor] = None, sections=None,
+                       python_backend: str = 'regex', profile=None,
+                       budget: Optional[AnalysisBudget] = None, module_graph: bool = False,
+                       prefilter: bool = False, rules: Optional[Ruleset] = None,
+                       tokens: bool = False, approximate: bool = False) -> Dict[str, Any]:
     """
     Main function to analyze code files
+    
+    Pass a shared ``executor`` (see ``create_worker_pool``) or a number of
+    ``workers`` to spread large file sets across processes, ``sections``
+    to compute only part of the analysis, ``python_backend='ast'`` to
+    count the structure of Python files on their syntax tree (more
+    accurate, not faster, than regexes), a ``profile`` to collect
+    stage timings, a ``budget`` to bound the work (check
+    ``budget.truncated`` afterwards), ``module_graph=True`` to add the
+    import graph to the analysis, ``prefilter=True`` to leave vendored,
+    generated and duplicate files out of it, ``rules`` to analyze with
+    a ruleset other than the built-in one (see ``rule_registry``),
+    ``tokens=True`` to count keyword rules on each file's identifiers
+    instead of its raw text (see ``tokenizer``) and ``approximate=True``
+    to estimate the analysis from a sample of files that fits the budget
+    (see ``sampling``).
     """
-    analyzer = ConsciousnessAnalyzer()
-    return analyzer.analyze_repository(files_dict)
+    if executor is None and workers > 1:
+        with create_worker_pool(workers) as pool:
+            return analyze_code_files(
+                files_dict, feature_cache, executor=pool, sections=sections, python_backend=python_backend,
+                profile=profile, budget=budget, module_graph=module_graph, prefilter=prefilter, rules=rules,
+                tokens=tokens, approximate=approximate,
+            )
+    
+    analyzer = ConsciousnessAnalyzer(
+        feature_cache=feature_cache, executor=executor, python_backend=python_backend, budget=budget,
+        module_graph=module_graph, prefilter=prefilter, rules=rules, tokens=tokens, approximate=approximate,
+    )
+    return analyzer.analyze_repository(files_dict, sections, profile)
+
+
+def analyze_many(repositories: Dict[str, Dict[str, str]], feature_cache=None, workers: int = 0,
+                 executor: Optional[Executor] = None, sections=None, python_backend: str = 'regex',
+                 module_graph: bool = False, prefilter: bool = False,
+                 rules: Optional[Ruleset] = None, tokens: bool = False,
+                 approximate: bool = False) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Analyze many named file sets, yielding (name, analysis) pairs in the
+    order they finish
+    
+    Takes the same options as ``analyze_code_files``; with an ``executor``
+    or ``workers`` the repositories share one pool and one set of compiled
+    patterns per worker.
+    """
+    if executor is None and workers > 1:
+        with create_worker_pool(workers) as pool:
+            yield from analyze_many(
+                repositories, feature_cache, executor=pool, sections=sections, python_backend=python_backend,
+                module_graph=module_graph, prefilter=prefilter, rules=rules, tokens=tokens, approximate=approximate,
+            )
+        return
+    
+    analyzer = ConsciousnessAnalyzer(
+        feature_cache=feature_cache, executor=executor, python_backend=python_backend, module_graph=module_graph,
+        prefilter=prefilter, rules=rules, tokens=tokens, approximate=approximate,
+    )
+    yield from analyzer.analyze_many(repositories, sections)
+
+
+# Analyzed by ``warmup``: valid Python for the AST backend, repeated past
+# the size where nesting depth is computed with NumPy.
+WARMUP_SAMPLE = """
+class Agent:
+    def decide(self, state):
+        if state: return self.decide(state[1:])
+        else: return eval('autonomous policy')
+
+    async def learn(self, feedback):
+        setattr(self, 'reward', [x for x in (feedback or {})])
+""" * 40
+
+
+def warmup() -> float:
+    """
+    Run every analysis stage once on a small sample, so the first request
+    does not pay for lazily imported modules and first-use setup. Returns
+    the seconds it took.
+    """
+    start = time.perf_counter()
+    for backend in PYTHON_BACKENDS:
+        ConsciousnessAnalyzer(python_backend=backend).analyze_repository({'warmup.py': WARMUP_SAMPLE})
+    return time.perf_counter() - start
 
 
 if __name__ == '__main__':
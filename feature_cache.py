@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Feature Cache: content-addressed stores of analysis work
+Per-file feature vectors (bounded LRU, optionally backed by a local SQLite
+file) and whole-payload analysis results (bounded LRU with a TTL)
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Any
+
+from consciousness_analyzer import FeatureVector, RULESET_DIGEST
+
+
+class FeatureCache:
+    """
+    Maps a file's content digest to its extracted features.
+
+    The most recently used ``max_entries`` vectors are kept in memory. When a
+    ``path`` is given, every vector is also written to SQLite and misses fall
+    back to it, so features survive restarts and memory evictions. Rows are
+    tagged with the rule set digest and ignored once the patterns change.
+    """
+
+    def __init__(self, max_entries: int = 50000, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, FeatureVector]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA synchronous=OFF')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS features ('
+                'ruleset TEXT NOT NULL, digest TEXT NOT NULL, record TEXT NOT NULL, '
+                'PRIMARY KEY (ruleset, digest))'
+            )
+            self._db.commit()
+
+    def get(self, digest: str) -> Optional[FeatureVector]:
+        with self._lock:
+            features = self._entries.get(digest)
+            if features is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return features
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT record FROM features WHERE ruleset = ? AND digest = ?',
+                    (RULESET_DIGEST, digest),
+                ).fetchone()
+                if row is not None:
+                    features = FeatureVector.from_record(row[0])
+                    self._remember(digest, features)
+                    self.hits += 1
+                    return features
+
+            self.misses += 1
+            return None
+
+    def put(self, digest: str, features: FeatureVector) -> None:
+        with self._lock:
+            self._remember(digest, features)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO features (ruleset, digest, record) VALUES (?, ?, ?)',
+                    (RULESET_DIGEST, digest, features.to_record()),
+                )
+                self._db.commit()
+
+    def _remember(self, digest: str, features: FeatureVector) -> None:
+        self._entries[digest] = features
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'persistent': self._db is not None,
+        }
+
+    def clear(self) -> None:
+        """
+        Drop the in-memory entries; persisted rows are kept
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class ResultCache:
+    """
+    Maps a files payload digest to its finished analysis, so repeated or
+    cross-endpoint requests for the same content skip analysis entirely.
+
+    Entries expire ``ttl`` seconds after being stored; beyond ``max_entries``
+    the least recently used entry is evicted. Cached analyses are shared
+    between requests and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, analysis: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, analysis)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
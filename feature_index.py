@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Feature Index: analysis results of every repository and commit, queryable
+One append-only, memory-mapped file per column (NumPy), so time-series,
+top-N and percentile queries over millions of analyses read only the
+columns they need and never load the index into memory
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Any
+
+from structural_metrics import load_numpy
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - appends are then only safe within one process
+    fcntl = None
+
+# Stored columns: name -> NumPy type. Rows hold the consciousness level and
+# the metrics of one analysis.
+COLUMNS = (
+    ('repository', '<u4'),
+    ('commit', 'S64'),
+    ('timestamp', '<f8'),
+    ('consciousness_level', '<f4'),
+    ('complexity_score', '<f4'),
+    ('self_reference_score', '<f4'),
+    ('autonomy_score', '<f4'),
+    ('emergence_score', '<f4'),
+    ('total_lines', '<u8'),
+    ('functions', '<u4'),
+    ('classes', '<u4'),
+)
+# Columns that can be queried.
+VALUE_COLUMNS = tuple(name for name, _ in COLUMNS if name not in ('repository', 'commit'))
+METRIC_COLUMNS = VALUE_COLUMNS[2:]
+# Time-series buckets one query may span.
+MAX_BUCKETS = 100000
+# Values are stored as 32-bit floats; results are rounded to what they hold.
+DECIMALS = 6
+REPOSITORIES_FILE = 'repositories.txt'
+LOCK_FILE = 'index.lock'
+
+
+def row_dtype():
+    """
+    NumPy structured type of a row, as taken by ``FeatureIndex.append``
+    """
+    return load_numpy().dtype(list(COLUMNS))
+
+
+class FeatureIndex:
+    """
+    Append-only columnar store of analyses, one row per repository and
+    commit, in the directory ``path``
+
+    Appends are serialized across processes with a lock file, so every
+    server worker can write to the same index; readers see whole rows only.
+    The latest row of each repository (by timestamp) is tracked as rows
+    arrive, which keeps "current" top-N and percentile queries independent
+    of the history's length.
+    """
+
+    def __init__(self, path: str):
+        np = load_numpy()
+        if np is None:
+            raise RuntimeError('The feature index needs NumPy')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._repositories: List[str] = []
+        self._repository_ids: Dict[str, int] = {}
+        self._names_read = 0
+        self._rows = 0
+        self._columns = {name: np.zeros(0, dtype=kind) for name, kind in COLUMNS}
+        self._latest = np.zeros(0, dtype=np.int64)
+        with self._lock:
+            self._refresh()
+
+    def add(self, repository: str, commit: str, analysis: Dict[str, Any],
+            timestamp: Optional[float] = None) -> None:
+        """
+        Record an analysis (its consciousness level and metrics) of a
+        repository at a commit, timestamped now unless given ``timestamp``
+        """
+        self.add_many([(repository, commit, analysis, timestamp)])
+
+    def add_many(self, records: Iterable[Tuple[str, str, Dict[str, Any], Optional[float]]]) -> int:
+        """
+        Record many (repository, commit, analysis, timestamp) at once;
+        returns the number of rows added
+        """
+        np = load_numpy()
+        records = list(records)
+        for _, commit, analysis, _ in records:
+            if 'consciousness_level' not in analysis or 'metrics' not in analysis:
+                raise ValueError('Only analyses with a consciousness level and metrics can be indexed')
+            if len(str(commit).encode('utf-8')) > 64:
+                raise ValueError(f'Commit id too long: {commit}')
+        now = time.time()
+        rows = np.zeros(len(records), dtype=row_dtype())
+        rows['commit'] = [str(commit).encode('utf-8') for _, commit, _, _ in records]
+        rows['timestamp'] = [now if timestamp is None else timestamp for _, _, _, timestamp in records]
+        rows['consciousness_level'] = [analysis['consciousness_level'] for _, _, analysis, _ in records]
+        for name in METRIC_COLUMNS:
+            rows[name] = [analysis['metrics'].get(name, 0) for _, _, analysis, _ in records]
+        self.append(rows, [repository for repository, _, _, _ in records])
+        return len(rows)
+
+    def append(self, rows, repositories: Sequence[str]) -> None:
+        """
+        Append a structured array of ``row_dtype()`` rows; the repository
+        column is filled from the repository names, one per row
+        """
+        np = load_numpy()
+        if len(rows) != len(repositories):
+            raise ValueError('Every row needs a repository name')
+        for name in set(repositories):
+            if not name or '\n' in name:
+                raise ValueError(f'Invalid repository name: {name!r}')
+        if not len(rows):
+            return
+        with self._lock, self._locked():
+            self._refresh()
+            self._repair()
+            new = [name for name in dict.fromkeys(repositories) if name not in self._repository_ids]
+            if new:
+                with open(self._file(REPOSITORIES_FILE), 'a', encoding='utf-8') as handle:
+                    handle.write(''.join(name + '\n' for name in new))
+                self._read_repositories()
+            rows = np.array(rows, dtype=row_dtype())
+            rows['repository'] = [self._repository_ids[name] for name in repositories]
+            for name, _ in COLUMNS:
+                with open(self._file(name + '.bin'), 'ab') as handle:
+                    handle.write(np.ascontiguousarray(rows[name]).tobytes())
+            self._refresh()
+
+    def time_series(self, column: str, repository: Optional[str] = None, start: Optional[float] = None,
+                    end: Optional[float] = None, bucket: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Values of a column over time: every analysis of a repository, or,
+        with ``bucket`` seconds, the mean and count of each bucket (of one
+        repository or of all of them), between ``start`` and ``end``
+        """
+        np = load_numpy()
+        self._check(column)
+        if repository is None and bucket is None:
+            raise ValueError('A time series of every repository needs a bucket')
+        if bucket is not None and bucket <= 0:
+            raise ValueError('Buckets must be longer than zero seconds')
+        columns, _ = self._snapshot()
+        mask = self._select(columns, repository, start, end)
+        if mask is False:
+            return []
+        timestamps = columns['timestamp'] if mask is None else columns['timestamp'][mask]
+        values = columns[column] if mask is None else columns[column][mask]
+        if bucket is None:
+            rows = np.flatnonzero(mask)[np.argsort(timestamps, kind='stable')]
+            return [
+                {'timestamp': float(timestamp), 'commit': commit.decode('utf-8'), 'value': _plain(value)}
+                for timestamp, commit, value in zip(
+                    columns['timestamp'][rows], columns['commit'][rows], columns[column][rows],
+                )
+            ]
+        if not len(timestamps):
+            return []
+        keys = np.floor(timestamps / bucket).astype(np.int64)
+        first = int(keys.min())
+        if int(keys.max()) - first >= MAX_BUCKETS:
+            raise ValueError(f'More than {MAX_BUCKETS} buckets; use a longer bucket or a shorter range')
+        keys -= first
+        counts = np.bincount(keys)
+        sums = np.bincount(keys, weights=values)
+        return [
+            {'start': (first + int(index)) * bucket, 'count': int(counts[index]),
+             'mean': round(float(sums[index] / counts[index]), DECIMALS)}
+            for index in np.flatnonzero(counts)
+        ]
+
+    def top(self, column: str, n: int = 10, at: Optional[float] = None,
+            lowest: bool = False) -> List[Dict[str, Any]]:
+        """
+        The ``n`` repositories with the highest (or lowest) value of a
+        column in their latest analysis, or in their latest analysis up to
+        the timestamp ``at``
+        """
+        np = load_numpy()
+        self._check(column)
+        if n <= 0:
+            return []
+        columns, latest = self._snapshot()
+        if at is not None:
+            latest = self._latest_rows(columns, np.flatnonzero(columns['timestamp'] <= at))
+        values = columns[column][latest]
+        if len(values) > n:
+            keep = np.argpartition(values, n - 1 if lowest else len(values) - n)
+            keep = keep[:n] if lowest else keep[-n:]
+        else:
+            keep = np.arange(len(values))
+        keep = keep[np.argsort(values[keep], kind='stable')]
+        if not lowest:
+            keep = keep[::-1]
+        rows = latest[keep]
+        return [
+            {'repository': self._repositories[repository], 'commit': commit.decode('utf-8'),
+             'timestamp': float(timestamp), 'value': _plain(value)}
+            for repository, commit, timestamp, value in zip(
+                columns['repository'][rows], columns['commit'][rows], columns['timestamp'][rows], values[keep],
+            )
+        ]
+
+    def percentiles(self, column: str, q: Sequence[float] = (50, 90, 99), repository: Optional[str] = None,
+                    start: Optional[float] = None, end: Optional[float] = None,
+                    latest: bool = False) -> Dict[str, Any]:
+        """
+        Percentiles of a column over the analyses between ``start`` and
+        ``end`` (of one repository, or of all), or with ``latest`` over the
+        latest analysis of every repository
+        """
+        np = load_numpy()
+        self._check(column)
+        if any(not 0 <= value <= 100 for value in q):
+            raise ValueError('Percentiles must be between 0 and 100')
+        columns, rows = self._snapshot()
+        if latest:
+            values = columns[column][rows]
+        else:
+            mask = self._select(columns, repository, start, end)
+            if mask is False:
+                values = columns[column][:0]
+            else:
+                values = columns[column] if mask is None else columns[column][mask]
+        if not len(values):
+            return {'rows': 0, 'percentiles': {format(value, 'g'): None for value in q}}
+        results = np.percentile(values, list(q))
+        return {
+            'rows': int(len(values)),
+            'percentiles': {format(value, 'g'): round(float(result), DECIMALS) for value, result in zip(q, results)},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return {
+                'rows': self._rows,
+                'repositories': len(self._repositories),
+                'bytes': sum(column.nbytes for column in self._columns.values()),
+            }
+
+    def _snapshot(self):
+        """
+        The columns and latest rows as of now, consistent with each other
+        """
+        with self._lock:
+            self._refresh()
+            return self._columns, self._latest[self._latest >= 0]
+
+    def _select(self, columns, repository: Optional[str], start: Optional[float], end: Optional[float]):
+        """
+        Mask of the rows of a repository and time range: None for every
+        row, False for none
+        """
+        mask = None
+        if repository is not None:
+            if repository not in self._repository_ids:
+                return False
+            mask = columns['repository'] == self._repository_ids[repository]
+        if start is not None:
+            mask = columns['timestamp'] >= start if mask is None else mask & (columns['timestamp'] >= start)
+        if end is not None:
+            mask = columns['timestamp'] < end if mask is None else mask & (columns['timestamp'] < end)
+        return mask
+
+    def _latest_rows(self, columns, rows):
+        """
+        Among the given row numbers, the last analysis of each repository
+        """
+        np = load_numpy()
+        if not len(rows):
+            return rows
+        repositories = columns['repository'][rows]
+        timestamps = columns['timestamp'][rows]
+        # Per repository (``ufunc.at`` applies repeated indices one by one):
+        # its latest timestamp, then the last row written at that time.
+        newest = np.full(int(repositories.max()) + 1, -np.inf)
+        np.maximum.at(newest, repositories, timestamps)
+        candidates = np.flatnonzero(timestamps == newest[repositories])
+        last = np.full(len(newest), -1, dtype=np.int64)
+        np.maximum.at(last, repositories[candidates], rows[candidates])
+        return last[last >= 0]
+
+    def _refresh(self) -> None:
+        """
+        Map the rows (and repositories) other writers appended since the
+        last look; called with ``_lock`` held
+        """
+        np = load_numpy()
+        # Writers add names before rows: rows counted first have theirs.
+        rows = self._complete_rows()
+        self._read_repositories()
+        if rows == self._rows:
+            return
+        columns = {}
+        for name, kind in COLUMNS:
+            if rows:
+                columns[name] = np.memmap(self._file(name + '.bin'), dtype=kind, mode='r', shape=(rows,))
+            else:
+                columns[name] = np.zeros(0, dtype=kind)
+        previous, self._rows, self._columns = self._rows, rows, columns
+        latest = np.full(len(self._repositories), -1, dtype=np.int64)
+        latest[:len(self._latest)] = self._latest
+        candidates = self._latest_rows(columns, np.arange(previous, rows, dtype=np.int64))
+        current = latest[columns['repository'][candidates]]
+        newer = (current < 0) | (columns['timestamp'][candidates] >= columns['timestamp'][np.maximum(current, 0)])
+        latest[columns['repository'][candidates[newer]]] = candidates[newer]
+        self._latest = latest
+
+    def _read_repositories(self) -> None:
+        path = self._file(REPOSITORIES_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) == self._names_read:
+            return
+        with open(path, 'rb') as handle:
+            handle.seek(self._names_read)
+            data = handle.read()
+        # A name still being written has no newline yet.
+        complete = data[:data.rfind(b'\n') + 1]
+        for name in complete.decode('utf-8').splitlines():
+            self._repository_ids[name] = len(self._repositories)
+            self._repositories.append(name)
+        self._names_read += len(complete)
+
+    def _complete_rows(self) -> int:
+        """
+        Rows present in every column file
+        """
+        np = load_numpy()
+        rows = None
+        for name, kind in COLUMNS:
+            path = self._file(name + '.bin')
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            count = size // np.dtype(kind).itemsize
+            rows = count if rows is None else min(rows, count)
+        return rows
+
+    def _repair(self) -> None:
+        """
+        Cut the column files back to their complete rows, dropping what a
+        writer that died mid-append left behind; called holding the file lock
+        """
+        np = load_numpy()
+        for name, kind in COLUMNS:
+            path = self._file(name + '.bin')
+            if os.path.exists(path) and os.path.getsize(path) > self._rows * np.dtype(kind).itemsize:
+                os.truncate(path, self._rows * np.dtype(kind).itemsize)
+
+    def _locked(self):
+        return _FileLock(self._file(LOCK_FILE))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _check(self, column: str) -> None:
+        if column not in VALUE_COLUMNS:
+            raise ValueError(f"Unknown column: {column} (one of {', '.join(VALUE_COLUMNS)})")
+
+
+def _plain(value):
+    """
+    A stored value as a Python number
+    """
+    value = value.item()
+    return round(value, DECIMALS) if isinstance(value, float) else value
+
+
+class _FileLock:
+    """
+    Exclusive lock on a file, held across processes where ``fcntl`` exists
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = None
+
+    def __enter__(self):
+        self._handle = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+        self._handle.close()
@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for the Logospace API server
+Run with `gunicorn -c gunicorn.conf.py 'api_server:create_app()'`
+
+Every worker process keeps its own caches and job threads. Set
+JOB_QUEUE_PATH and SNAPSHOT_STORE_PATH so jobs and snapshots are shared by
+all workers, WEBHOOK_STATE_PATH so webhook deliveries are coalesced across
+them (and FEATURE_CACHE_PATH to share extracted features).
+"""
+
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Compile the pattern engine and load its lazy imports once in the master;
+# forked workers share them and start warm. The app itself (caches, job
+# threads, SQLite connections, worker pools) is loaded after the fork, per
+# worker.
+import consciousness_analyzer  # noqa: E402
+from rule_registry import DEFAULT_CACHE_DIR, RuleRegistry  # noqa: E402
+
+consciousness_analyzer.warmup()
+# Validate the pattern packs once, here: the ruleset is written to the rules
+# cache and stays compiled in the forked workers.
+RuleRegistry(os.getenv('RULES_PATH') or None, os.getenv('RULES_CACHE_PATH') or DEFAULT_CACHE_DIR)
+
+bind = f"0.0.0.0:{os.getenv('PYTHON_PORT', 5000)}"
+# Analysis is CPU-bound: one process per core, a few threads each to
+# overlap request parsing and I/O.
+workers = int(os.getenv('WEB_WORKERS') or multiprocessing.cpu_count())
+threads = int(os.getenv('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+# On SIGTERM, workers stop accepting and get this long to finish requests
+# (and running jobs) before they are killed.
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then to bound memory growth; 0 never recycles.
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def worker_exit(server, worker):
+    from api_server import shutdown_services
+    shutdown_services()
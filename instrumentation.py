@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Instrumentation: per-stage timers for analyses and a Prometheus text registry
+A Profile is only passed in when timings are wanted, so the analyzer's hot
+paths pay nothing when it is absent
+"""
+
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Any
+
+# Slowest files kept per profile.
+TOP_FILES = 20
+
+
+class Profile:
+    """
+    Timings of one analysis
+
+    Stage timers (wall and this thread's CPU time) are always recorded.
+    With ``detail``, every pattern family scan is timed and per-file costs
+    are kept for the ``top_files`` slowest files; files handed to worker
+    processes are timed as one ``extract.workers`` stage instead.
+    """
+
+    def __init__(self, detail: bool = False, top_files: int = TOP_FILES):
+        self.detail = detail
+        self.top_files = top_files
+        self.stages: Dict[str, List[float]] = {}
+        self.families: Dict[str, List[float]] = {}
+        self.bytes_processed = 0
+        self.files_scanned = 0
+        self.files_cached = 0
+        self._slowest: List[Tuple[float, str, int]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            totals = self.stages.setdefault(name, [0.0, 0.0, 0])
+            totals[0] += time.perf_counter() - wall
+            totals[1] += time.thread_time() - cpu
+            totals[2] += 1
+
+    def record_family(self, family: str, seconds: float, matches: int) -> None:
+        totals = self.families.setdefault(family, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += matches
+
+    def record_file(self, path: str, size: int, seconds: float) -> None:
+        entry = (seconds, path, size)
+        if len(self._slowest) < self.top_files:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        timings = {
+            'stages': {
+                name: {'wall_seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6), 'calls': calls}
+                for name, (wall, cpu, calls) in self.stages.items()
+            },
+            'bytes_processed': self.bytes_processed,
+            'files_scanned': self.files_scanned,
+            'files_cached': self.files_cached,
+        }
+        if self.detail:
+            timings['families'] = {
+                family: {'scan_seconds': round(seconds, 6), 'matches': matches}
+                for family, (seconds, matches) in sorted(self.families.items(), key=lambda item: -item[1][0])
+            }
+            timings['slowest_files'] = [
+                {'path': path, 'bytes': size, 'seconds': round(seconds, 6)}
+                for seconds, path, size in sorted(self._slowest, reverse=True)
+            ]
+        return timings
+
+
+# HELP text of every metric the registry exports.
+METRIC_HELP = {
+    'logospace_requests_total': 'HTTP requests handled, by endpoint and status code',
+    'logospace_request_seconds_total': 'Wall time spent handling HTTP requests, by endpoint',
+    'logospace_stage_seconds_total': 'Wall time spent in each analysis stage',
+    'logospace_stage_cpu_seconds_total': 'CPU time of the request thread in each analysis stage',
+    'logospace_stage_calls_total': 'Times each analysis stage ran',
+    'logospace_family_scan_seconds_total': 'Scan time per pattern family (profiled requests only)',
+    'logospace_family_matches_total': 'Pattern hits per family (profiled requests only)',
+    'logospace_bytes_processed_total': 'Characters of file content scanned',
+    'logospace_files_scanned_total': 'Files whose features were extracted',
+    'logospace_files_cached_total': 'Files served from the feature cache',
+    'logospace_truncated_analyses_total': 'Analyses cut short by the time or size budget',
+    'logospace_jobs_total': 'Background analysis submissions, by outcome (queued, deduplicated, rejected)',
+}
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters rendered in the Prometheus text format
+    """
+
+    def __init__(self):
+        self._values: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def record(self, profile: Profile) -> None:
+        """
+        Add the totals of a finished profile
+        """
+        for name, (wall, cpu, calls) in profile.stages.items():
+            self.inc('logospace_stage_seconds_total', wall, stage=name)
+            self.inc('logospace_stage_cpu_seconds_total', cpu, stage=name)
+            self.inc('logospace_stage_calls_total', calls, stage=name)
+        for family, (seconds, matches) in profile.families.items():
+            self.inc('logospace_family_scan_seconds_total', seconds, family=family)
+            self.inc('logospace_family_matches_total', matches, family=family)
+        self.inc('logospace_bytes_processed_total', profile.bytes_processed)
+        self.inc('logospace_files_scanned_total', profile.files_scanned)
+        self.inc('logospace_files_cached_total', profile.files_cached)
+
+    def render(self) -> str:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        current = None
+        for (name, labels), value in values:
+            if name != current:
+                current = name
+                lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+            label_text = ','.join(
+                '{}="{}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"'))
+                for key, label in labels
+            )
+            lines.append(f'{name}{{{label_text}}} {value!r}' if label_text else f'{name} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Job Queue: background analyses for payloads too large to answer inline
+A bounded in-process queue drained by worker threads, optionally backed by
+a local SQLite file so queued jobs and finished results survive restarts
+and are visible to every server process sharing the file
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# How often idle workers look for jobs orphaned by a server process that
+# exited, when the queue is backed by SQLite.
+RECOVER_SECONDS = 30.0
+# Finished jobs past their ``result_ttl`` are looked for at most this often.
+PRUNE_SECONDS = 60.0
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class QueueFull(Exception):
+    """
+    Raised when a job is submitted while ``max_pending`` jobs are waiting
+    """
+
+
+class Job:
+    """
+    One queued analysis. ``payload`` is whatever the handler needs; it is
+    dropped once the job has finished.
+    """
+
+    def __init__(self, job_id: str, key: str, payload: Any, status: str = QUEUED,
+                 created: Optional[float] = None):
+        self.id = job_id
+        self.key = key
+        self.payload = payload
+        self.status = status
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = created if created is not None else time.time()
+        self.updated = self.created
+        self.on_report: Optional[Callable[['Job'], None]] = None
+
+    def report(self, progress: float) -> None:
+        """
+        Record how much of the job is done, from 0 to 1
+        """
+        self.progress = min(1.0, max(0.0, progress))
+        self.updated = time.time()
+        if self.on_report is not None:
+            self.on_report(self)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        job = {
+            'id': self.id,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'created': self.created,
+            'updated': self.updated,
+        }
+        if self.error is not None:
+            job['error'] = self.error
+        if include_result and self.status == DONE:
+            job['result'] = self.result
+        return job
+
+
+class JobQueue:
+    """
+    Runs ``handler(job)`` for submitted jobs on ``workers`` threads.
+
+    - Bounded: at most ``max_pending`` jobs wait at a time; ``submit``
+      raises QueueFull beyond that so callers can push back.
+    - Deduplicated: submitting a key that is already queued or running
+      returns the existing job instead of a new one.
+    - Finished jobs are kept for ``result_ttl`` seconds, whether or not
+      anyone asks for them.
+    - With a ``path``, jobs are stored in SQLite and owned by the process
+      that runs them. Several server processes may share the file: any of
+      them answers for any job and deduplicates against all of them, and
+      jobs left by a process that exited are picked up again.
+    """
+
+    def __init__(self, handler: Callable[[Job], Any], workers: int = 2, max_pending: int = 64,
+                 path: Optional[str] = None, result_ttl: float = 3600.0):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.submitted = 0
+        self.rejected = 0
+        self.deduplicated = 0
+        self._jobs: Dict[str, Job] = {}
+        self._in_flight: Dict[str, str] = {}
+        self._pending = 0
+        self._queue: 'queue.Queue[Optional[str]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._pruned = time.monotonic()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, owner INTEGER, '
+                'progress REAL NOT NULL, payload TEXT, result TEXT, error TEXT, '
+                'created REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (key, status)')
+            self._db.commit()
+            self._recover()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'analysis-job-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key: str, payload: Any) -> Tuple[Job, bool]:
+        """
+        Enqueue a job. Returns the job and whether it was newly created.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                self.deduplicated += 1
+                return self._jobs[existing], False
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT id FROM jobs WHERE key = ? AND status IN (?, ?)', (key, QUEUED, RUNNING),
+                ).fetchone()
+                if row is not None:
+                    self.deduplicated += 1
+                    return self._load(row[0]), False
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f'{self._pending} jobs are already waiting')
+
+            job = self._adopt(Job(uuid.uuid4().hex, key, payload))
+            self._jobs[job.id] = job
+            self._in_flight[key] = job.id
+            self._pending += 1
+            self.submitted += 1
+            self._store(job)
+        self._queue.put(job.id)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+            if job is None and self._db is not None:
+                job = self._load(job_id)
+            if job is not None and job.finished and job.updated < time.time() - self.result_ttl:
+                # Expired since the last prune.
+                return None
+            return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'running': len(self._in_flight) - self._pending,
+                'max_pending': self.max_pending,
+                'workers': len(self._threads),
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'deduplicated': self.deduplicated,
+                'persistent': self._db is not None,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers after the jobs they are running; queued jobs stay
+        in SQLite (if any) for the next start
+        """
+        with self._lock:
+            self._stopping = True
+        # Wake the idle workers; the others stop before their next job.
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _work(self) -> None:
+        while True:
+            try:
+                job_id = self._queue.get(timeout=RECOVER_SECONDS if self._db is not None else None)
+            except queue.Empty:
+                with self._lock:
+                    if self._db is not None and not self._stopping:
+                        self._recover()
+                        self._prune()
+                continue
+            if job_id is None:
+                return
+            with self._lock:
+                if self._stopping:
+                    # Left queued, in SQLite for whichever process runs next.
+                    return
+                job = self._jobs[job_id]
+                self._pending -= 1
+                job.status = RUNNING
+                job.updated = time.time()
+                self._store(job)
+            try:
+                result = self.handler(job)
+                status, error = DONE, None
+            except Exception as e:
+                result, status, error = None, FAILED, str(e)
+            with self._lock:
+                job.result = result
+                job.status = status
+                job.error = error
+                job.payload = None
+                job.progress = 1.0
+                job.updated = time.time()
+                self._in_flight.pop(job.key, None)
+                self._store(job)
+                self._prune()
+
+    def _prune(self) -> None:
+        """
+        Forget finished jobs older than ``result_ttl``, checked at most every
+        PRUNE_SECONDS (or ``result_ttl``, if shorter)
+        """
+        now = time.monotonic()
+        if now - self._pruned < min(PRUNE_SECONDS, self.result_ttl):
+            return
+        self._pruned = now
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.updated < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self._db is not None:
+            # Including the jobs of other processes sharing the file.
+            self._db.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?', (DONE, FAILED, cutoff))
+            self._db.commit()
+
+    def _adopt(self, job: Job) -> Job:
+        """
+        Persist progress reports of a job this process runs
+        """
+        if self._db is not None:
+            job.on_report = self._report
+        return job
+
+    def _report(self, job: Job) -> None:
+        with self._lock:
+            if self._db is not None and not job.finished:
+                self._db.execute(
+                    'UPDATE jobs SET progress = ?, updated = ? WHERE id = ?', (job.progress, job.updated, job.id),
+                )
+                self._db.commit()
+
+    def _store(self, job: Job) -> None:
+        if self._db is None:
+            return
+        self._db.execute(
+            'INSERT OR REPLACE INTO jobs (id, key, status, owner, progress, payload, result, error, created, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                job.id, job.key, job.status, os.getpid(), job.progress,
+                json.dumps(job.payload) if job.payload is not None else None,
+                json.dumps(job.result) if job.result is not None else None,
+                job.error, job.created, job.updated,
+            ),
+        )
+        self._db.commit()
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        """
+        A job as another process (or a previous run) stored it
+        """
+        row = self._db.execute(
+            'SELECT key, status, progress, result, error, created, updated FROM jobs WHERE id = ?', (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        key, status, progress, result, error, created, updated = row
+        job = Job(job_id, key, None, status, created)
+        job.progress = progress
+        job.result = json.loads(result) if result is not None else None
+        job.error = error
+        job.updated = updated
+        return job
+
+    def _recover(self) -> None:
+        """
+        Take over jobs left queued or running by server processes that
+        have exited
+        """
+        rows = self._db.execute(
+            'SELECT id, key, owner, payload, created FROM jobs WHERE status IN (?, ?) ORDER BY created',
+            (QUEUED, RUNNING),
+        ).fetchall()
+        for job_id, key, owner, payload, created in rows:
+            if job_id in self._jobs or (owner != os.getpid() and owner is not None and process_alive(owner)):
+                continue
+            # Only one of the processes looking at an orphan gets to claim it.
+            claimed = self._db.execute(
+                'UPDATE jobs SET owner = ?, status = ? WHERE id = ? AND owner IS ?',
+                (os.getpid(), QUEUED, job_id, owner),
+            ).rowcount
+            self._db.commit()
+            if not claimed:
+                continue
+            job = self._adopt(Job(job_id, key, json.loads(payload), QUEUED, created))
+            self._jobs[job_id] = job
+            self._in_flight[key] = job_id
+            self._pending += 1
+            self._queue.put(job_id)
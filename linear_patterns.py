@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Linear Patterns: backtracking-free matchers for the analyzer's line patterns
+``if\\s+.*:\\s*decision``, ``if\\s+.*:\\s*.*else:`` and the recursion pattern
+backtrack quadratically on long lines in ``re``; these matchers return the
+same matches in linear time
+"""
+
+import re
+from typing import Callable, Dict, Iterator, Optional
+
+try:
+    from re import _constants as _sre, _parser as _sre_parse
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_constants as _sre
+    import sre_parse as _sre_parse
+
+# Lines longer than this get a full last-index table instead of one
+# ``rfind`` per character looked up.
+LONG_LINE_CHARS = 4096
+
+_NON_SPACE = re.compile(r'\S')
+# A repetition of ``.`` followed by more pattern, or a backreference: the
+# shapes that make ``re`` backtrack over a whole line at every start offset.
+_BACKTRACKING = re.compile(r'\.[*+]\??.|\\[1-9]|\(\?P=')
+# Characters tried against two repetitions to decide whether they overlap.
+_PROBE_CHARS = [chr(code) for code in range(0x250)] + ['\u3000', '\u4e00', '\U0001f600']
+_REPEATS = (_sre.MAX_REPEAT, _sre.MIN_REPEAT)
+_CATEGORIES = {
+    _sre.CATEGORY_DIGIT: str.isdigit,
+    _sre.CATEGORY_NOT_DIGIT: lambda char: not char.isdigit(),
+    _sre.CATEGORY_SPACE: str.isspace,
+    _sre.CATEGORY_NOT_SPACE: lambda char: not char.isspace(),
+    _sre.CATEGORY_WORD: lambda char: char.isalnum() or char == '_',
+    _sre.CATEGORY_NOT_WORD: lambda char: not (char.isalnum() or char == '_'),
+}
+
+
+class Span:
+    """
+    Where a match found without the regex engine starts and ends
+    """
+    __slots__ = ('_start', '_end')
+
+    def __init__(self, start: int, end: Optional[int]):
+        self._start = start
+        self._end = end
+
+    def start(self) -> int:
+        return self._start
+
+    def end(self) -> Optional[int]:
+        return self._end
+
+
+def _line_end(text: str, position: int) -> int:
+    end = text.find('\n', position)
+    return len(text) if end < 0 else end
+
+
+def _last_non_space(text: str, position: int) -> int:
+    """
+    Index of the last non-whitespace character before a position, or -1
+    """
+    position -= 1
+    while position >= 0 and text[position].isspace():
+        position -= 1
+    return position
+
+
+class _LastIndex:
+    """
+    Last position of a character within one line, memoized
+    """
+
+    def __init__(self, text: str, start: int, end: int):
+        self.text = text
+        self.start = start
+        self.end = end
+        self._positions: Dict[str, int] = {}
+        if end - start > LONG_LINE_CHARS:
+            self._positions = dict(zip(text[start:end], range(start, end)))
+            self._complete = True
+        else:
+            self._complete = False
+
+    def __call__(self, char: str) -> int:
+        position = self._positions.get(char)
+        if position is None:
+            position = -1 if self._complete else self.text.rfind(char, self.start, self.end)
+            self._positions[char] = position
+        return position
+
+
+class ConditionalMatcher:
+    """
+    ``if\\s+.*:\\s*<tail>`` with ``re.finditer`` semantics, where the tail
+    either starts right after the whitespace (``decision``) or anywhere later
+    on its line (``.*else:``).
+
+    ``re`` takes the whitespace after ``if`` and the ``.*`` greedily, so a
+    match from an ``if`` always ends at the rightmost colon of the line
+    after it whose tail succeeds. That colon depends only on the line, and
+    only the line of a tail, or the line before it when that one ends with
+    a colon, can have one. So the matcher walks the (rare) tails, settles
+    each candidate line once and looks for a single ``if`` reaching it.
+    """
+
+    def __init__(self, tail: str, anywhere: bool, flags: int = 0):
+        self.head = re.compile(r'if\s+', flags)
+        self.anywhere = anywhere
+        self.literal = re.compile(re.escape(tail), flags)
+        self.tail = re.compile(('.*(' if anywhere else '(') + re.escape(tail) + ')', flags)
+
+    def finditer(self, text: str, pos: int = 0) -> Iterator[Span]:
+        cursor = pos
+        settled = -1
+        while True:
+            found = self.literal.search(text, cursor)
+            if found is None:
+                return
+            line_start = text.rfind('\n', 0, found.start()) + 1
+            line_end = _line_end(text, found.start())
+            cursor = line_end
+            last = _last_non_space(text, line_start)
+            lines = [(line_start, line_end, last)]
+            if last >= 0 and text[last] == ':':
+                # The line before may end with the colon this tail follows.
+                previous_start = text.rfind('\n', 0, last) + 1
+                lines.insert(0, (previous_start, _line_end(text, last), _last_non_space(text, previous_start)))
+            for start, end, before in lines:
+                if start <= settled:
+                    continue
+                settled = start
+                best = self._rightmost(text, start, end)
+                if best is None:
+                    continue
+                # An ``if`` reaches this line if its whitespace run ends in it.
+                head = self.head.search(text, max(pos, before - 1, 0), end)
+                if head is not None and head.end() <= best[0]:
+                    yield Span(head.start(), best[1])
+                    pos = best[1]
+                    cursor = max(cursor, pos)
+
+    def search(self, text: str, pos: int = 0) -> Optional[Span]:
+        return next(self.finditer(text, pos), None)
+
+    def _tail_after(self, text: str, colon: int, line_end: int) -> Optional[int]:
+        """
+        End of the tail matched after a colon, or None
+        """
+        after = _NON_SPACE.search(text, colon + 1)
+        if after is None:
+            return None
+        start = after.start()
+        end = line_end if start < line_end else _line_end(text, start)
+        tail = self.tail.match(text, start, end)
+        return tail.end() if tail is not None else None
+
+    def _rightmost(self, text: str, line_start: int, line_end: int):
+        """
+        (colon, match end) for the rightmost colon of a line that a match
+        can use, or None
+        """
+        if not self.anywhere:
+            high = line_end
+            while True:
+                colon = text.rfind(':', line_start, high)
+                if colon < 0:
+                    return None
+                end = self._tail_after(text, colon, line_end)
+                if end is not None:
+                    return colon, end
+                high = colon
+
+        # Only a colon ending the line can reach a tail on a later line; for
+        # every other colon the answer is the rightmost tail of this line.
+        last = text[line_start:line_end].rstrip()
+        if last.endswith(':'):
+            colon = line_start + len(last) - 1
+            end = self._tail_after(text, colon, line_end)
+            if end is not None:
+                return colon, end
+        tail = self.tail.match(text, line_start, line_end)
+        if tail is None:
+            return None
+        colon = text.rfind(':', line_start, tail.start(1))
+        return (colon, tail.end()) if colon >= 0 else None
+
+
+class RecursionMatcher:
+    """
+    ``def\\s+(\\w+).*:\\s*.*\\1`` with ``re.search`` semantics. Only the
+    start of a match is reported.
+
+    ``\\1`` may be any prefix of the name, so a match only needs the first
+    character of the name to occur after a colon of the ``def`` line: later
+    on that line, or on the next non-blank line when the colon ends the line.
+    """
+
+    def __init__(self, flags: int = 0):
+        self.head = re.compile(r'def\s+(\w)', flags)
+
+    def search(self, text: str, pos: int = 0) -> Optional[Span]:
+        line_end = -1
+        while True:
+            head = self.head.search(text, pos)
+            if head is None:
+                return None
+            name = head.start(1)
+            char = head.group(1)
+            if name >= line_end:
+                line_start = text.rfind('\n', 0, name) + 1
+                line_end = _line_end(text, name)
+                last_index = _LastIndex(text, line_start, line_end)
+                colon = None
+                trailing = self._trailing(text, line_start, line_end)
+            if colon is None or 0 <= colon <= name:
+                colon = text.find(':', name + 1, line_end)
+            if colon >= 0 and last_index(char) > colon:
+                return Span(head.start(), None)
+            if trailing is not None and trailing[0] > name and trailing[1](char) >= 0:
+                return Span(head.start(), None)
+            pos = head.start() + 1
+
+    def _trailing(self, text: str, line_start: int, line_end: int):
+        """
+        (colon, last-index table of the next non-blank line) when the line
+        ends with a colon
+        """
+        last = text[line_start:line_end].rstrip()
+        if not last.endswith(':'):
+            return None
+        after = _NON_SPACE.search(text, line_end)
+        if after is None:
+            return None
+        start = after.start()
+        return line_start + len(last) - 1, _LastIndex(text, start, _line_end(text, start))
+
+
+# Linear-time replacements, by pattern: flags -> matcher.
+LINEAR_MATCHERS = {
+    r'if\s+.*:\s*decision': lambda flags: ConditionalMatcher('decision', False, flags),
+    r'if\s+.*:\s*.*else:': lambda flags: ConditionalMatcher('else:', True, flags),
+    # The backreference is case-sensitive only.
+    r'def\s+(\w+).*:\s*.*\1': lambda flags: None if flags & re.IGNORECASE else RecursionMatcher(flags),
+}
+
+
+def _char_test(op, av, flags: int) -> Callable[[str], bool]:
+    """
+    Whether a character can be matched by a single-character item of a
+    parsed pattern (anything else is taken to match every character)
+    """
+    fold = (lambda char: char.lower()) if flags & re.IGNORECASE else (lambda char: char)
+    if op is _sre.LITERAL:
+        return lambda char: fold(char) == fold(chr(av))
+    if op is _sre.NOT_LITERAL:
+        return lambda char: fold(char) != fold(chr(av))
+    if op is _sre.ANY:
+        return (lambda char: True) if flags & re.DOTALL else (lambda char: char != '\n')
+    if op is _sre.IN:
+        negate = any(item_op is _sre.NEGATE for item_op, _ in av)
+        tests = [_char_test(item_op, item_av, flags) for item_op, item_av in av if item_op is not _sre.NEGATE]
+        return lambda char: any(test(char) for test in tests) != negate
+    if op is _sre.RANGE:
+        low, high = av
+        return lambda char: low <= ord(char) <= high or low <= ord(fold(char)) <= high
+    if op is _sre.CATEGORY:
+        return _CATEGORIES.get(av, lambda char: True)
+    return lambda char: True
+
+
+def _consumed(items, flags: int) -> frozenset:
+    """
+    Characters some position of a parsed (sub)pattern can match
+    """
+    chars = set()
+    for op, av in items:
+        if op in _REPEATS:
+            chars |= _consumed(av[2], flags)
+        elif op is _sre.SUBPATTERN:
+            chars |= _consumed(av[3], flags)
+        elif op is _sre.BRANCH:
+            chars = chars.union(*(_consumed(branch, flags) for branch in av[1]))
+        elif op not in (_sre.AT, _sre.ASSERT, _sre.ASSERT_NOT):
+            test = _char_test(op, av, flags)
+            chars.update(char for char in _PROBE_CHARS if test(char))
+    return frozenset(chars)
+
+
+def _first(items, flags: int) -> set:
+    """
+    Characters a parsed (sub)pattern can start with
+    """
+    chars = set()
+    for op, av in items:
+        if op in _REPEATS:
+            chars |= _first(av[2], flags)
+            if av[0] > 0:
+                return chars
+        elif op is _sre.SUBPATTERN:
+            return chars | _first(av[3], flags)
+        elif op is _sre.BRANCH:
+            return chars.union(*(_first(branch, flags) for branch in av[1]))
+        elif op in (_sre.AT, _sre.ASSERT, _sre.ASSERT_NOT):
+            continue
+        else:
+            return chars | _consumed([(op, av)], flags)
+    return chars
+
+
+def _nullable(op, av) -> bool:
+    if op in _REPEATS:
+        return av[0] == 0
+    return op in (_sre.AT, _sre.ASSERT, _sre.ASSERT_NOT)
+
+
+def _explodes(items, flags: int, repeated: bool = False) -> bool:
+    """
+    Whether a parsed (sub)pattern has a repetition inside another one, a
+    repeated alternation whose branches can start alike, or two unbounded
+    repetitions that can match the same characters with only optional
+    pattern between them
+    """
+    previous = frozenset()
+    for op, av in items:
+        if op in _REPEATS:
+            low, high, body = av
+            if high > low and repeated:
+                return True
+            many = high > 1
+            while len(body) == 1 and body[0][0] is _sre.SUBPATTERN:
+                body = body[0][1][3]
+            if many and len(body) == 1 and body[0][0] is _sre.BRANCH:
+                starts = [_first(branch, flags) for branch in body[0][1][1]]
+                if any(a & b for index, a in enumerate(starts) for b in starts[index + 1:]):
+                    return True
+            if _explodes(body, flags, repeated or many):
+                return True
+            if high == _sre.MAXREPEAT:
+                chars = _consumed(body, flags)
+                if chars & previous:
+                    return True
+                # An optional repetition leaves the one before it adjacent
+                # to the next.
+                previous = previous | chars if low == 0 else chars
+                continue
+        elif op is _sre.SUBPATTERN:
+            if _explodes(av[3], flags, repeated):
+                return True
+        elif op is _sre.BRANCH:
+            # ``(a|aa)+`` is parsed as ``(a(?:|a))+``: an optional branch.
+            if repeated and any(all(_nullable(*item) for item in branch) for branch in av[1]):
+                return True
+            if any(_explodes(branch, flags, repeated) for branch in av[1]):
+                return True
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            if _explodes(av[1], flags, repeated):
+                return True
+        if not _nullable(op, av):
+            previous = frozenset()
+    return False
+
+
+def backtracks(pattern: str, flags: int = 0) -> bool:
+    """
+    Whether a pattern may take quadratic (or exponential) time in ``re``:
+    a ``.*``/``.+`` followed by more pattern, a backreference, nested
+    repetitions such as ``(a+)+``, a repeated alternation whose branches
+    overlap such as ``(\\w|ab)+`` or adjacent repetitions of overlapping
+    characters such as ``\\w+\\w*``
+    """
+    if _BACKTRACKING.search(pattern) is not None:
+        return True
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except re.error:
+        return False
+    state = getattr(parsed, 'state', None) or parsed.pattern
+    return _explodes(list(parsed), flags | state.flags)
+
+
+def compile_pattern(pattern: str, flags: int = 0):
+    """
+    Compile a pattern for scanning: the linear matcher when there is one,
+    ``re`` otherwise. Raises ValueError for patterns that may backtrack
+    (see ``backtracks``) and have no linear matcher.
+    """
+    factory = LINEAR_MATCHERS.get(pattern)
+    matcher = factory(flags) if factory is not None else None
+    if matcher is not None:
+        return matcher
+    if backtracks(pattern, flags):
+        raise ValueError(f'Pattern may backtrack on long lines: {pattern}')
+    return re.compile(pattern, flags)
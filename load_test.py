@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Load Test: requests/sec and latency percentiles of the API server
+Run `python3 load_test.py --help`; with --compare it starts the Flask
+development server and gunicorn in turn and measures both
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark import generate_repository
+
+SERVERS = {
+    'dev': [sys.executable, 'api_server.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'api_server:create_app()'],
+}
+
+
+def build_payloads(count: int, files: int) -> List[bytes]:
+    """
+    Request bodies for distinct repositories of ``files`` files each
+    """
+    return [
+        json.dumps({'files': generate_repository(files, seed=seed)}).encode('utf-8')
+        for seed in range(count)
+    ]
+
+
+def marked(body: bytes, index: int) -> bytes:
+    """
+    A body with one extra small file, so no two requests share a result
+    cache entry while most files still hit the feature cache
+    """
+    return body[:-2] + f', "request_{index}.py": "# request {index}"}}}}'.encode('utf-8')
+
+
+async def send(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str,
+               body: bytes) -> Tuple[int, bool]:
+    """
+    One POST over a keep-alive connection. Returns the status code and
+    whether the server keeps the connection open.
+    """
+    writer.write(
+        f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n\r\n'.encode('ascii') + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed by the server')
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+    keep_alive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return int(status), keep_alive and 'content-length' in headers
+
+
+async def client(host: str, port: int, path: str, payloads: List[bytes], counter: List[int],
+                 deadline: float, latencies: List[float], errors: List[str]) -> None:
+    connection = None
+    while time.perf_counter() < deadline:
+        index = counter[0]
+        counter[0] += 1
+        body = marked(payloads[index % len(payloads)], index)
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            status, keep_alive = await send(*connection, host, path, body)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            errors.append(str(e))
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(f'HTTP {status}')
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+async def run_load(host: str, port: int, path: str, payloads: List[bytes], concurrency: int,
+                   duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    counter = [0]
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        client(host, port, path, payloads, counter, deadline, latencies, errors) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+    }
+
+
+def warm_up(host: str, port: int, path: str, payloads: List[bytes]) -> None:
+    """
+    Send every payload once, so each server starts with a warm feature cache
+    """
+    for body in payloads:
+        request = urllib.request.Request(
+            f'http://{host}:{port}{path}', data=body, headers={'Content-Type': 'application/json'},
+        )
+        urllib.request.urlopen(request, timeout=60).read()
+
+
+def start_server(kind: str, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    """
+    Start a server on a port and wait for /health to answer
+    """
+    env = {**os.environ, 'PYTHON_PORT': str(port)}
+    process = subprocess.Popen(
+        SERVERS[kind], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} server exited with status {process.returncode}')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{kind} server did not start within {timeout:.0f}s')
+
+
+def stop_server(process: subprocess.Popen) -> Optional[int]:
+    process.terminate()
+    try:
+        return process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        return process.wait()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Logospace API load test')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PYTHON_PORT', 5000)))
+    parser.add_argument('--path', default='/api/analyze')
+    parser.add_argument('--concurrency', type=int, default=16, help='simultaneous connections')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load per server')
+    parser.add_argument('--payloads', type=int, default=32, help='distinct repositories to cycle through')
+    parser.add_argument('--files', type=int, default=50, help='files per repository')
+    parser.add_argument('--compare', action='store_true',
+                        help='start the development server and gunicorn in turn instead of using a running server')
+    args = parser.parse_args(argv)
+
+    payloads = build_payloads(args.payloads, args.files)
+    results = {}
+    if not args.compare:
+        results['server'] = asyncio.run(
+            run_load(args.host, args.port, args.path, payloads, args.concurrency, args.duration),
+        )
+    else:
+        for kind in SERVERS:
+            process = start_server(kind, args.port)
+            try:
+                warm_up(args.host, args.port, args.path, payloads)
+                results[kind] = asyncio.run(
+                    run_load(args.host, args.port, args.path, payloads, args.concurrency, args.duration),
+                )
+            finally:
+                stop_server(process)
+    print(json.dumps({
+        'path': args.path,
+        'concurrency': args.concurrency,
+        'duration_seconds': args.duration,
+        'cpus': os.cpu_count(),
+        'results': results,
+    }, indent=2))
+    return 0 if all(result['errors'] == 0 for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Module Graph: the import graph of a repository's Python and JavaScript
+modules, with its cycles, strongly connected components, fan-in/fan-out
+and how far a change to one module can cascade
+Every measure is computed with linear-time graph algorithms; networkx is
+imported on first use
+"""
+
+import heapq
+import posixpath
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+
+PYTHON_EXTENSIONS = ('.py',)
+JAVASCRIPT_EXTENSIONS = ('.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx')
+
+# Examples and rankings kept in a graph summary.
+TOP_MODULES = 5
+MAX_CYCLE_EXAMPLES = 5
+# A module whose change reaches at least this share of the repository
+# (through modules importing it, directly or not) is a cascade.
+CASCADE_MIN_SHARE = 0.25
+CASCADE_MIN_MODULES = 3
+
+_PYTHON_IMPORT = re.compile(r'^[ \t]*import[ \t]+([^\n#;]+)', re.MULTILINE)
+_PYTHON_FROM = re.compile(r'^[ \t]*from[ \t]+(\.*[\w.]*)[ \t]+import\b[ \t]*(\([^)]*\)|[^\n#;]*)', re.MULTILINE)
+_JAVASCRIPT_IMPORT = re.compile(r'\b(?:from|import|require)[ \t]*\(?[ \t]*([\'"])([^\'"\n]+)\1')
+_DOTTED_NAME = re.compile(r'[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*\Z')
+
+# An import as written: the module, and for ``from module import a, b``
+# the imported names (which may be submodules).
+Import = Tuple[str, Tuple[str, ...]]
+
+
+def module_language(path: str) -> Optional[str]:
+    if path.endswith(PYTHON_EXTENSIONS):
+        return 'python'
+    if path.endswith(JAVASCRIPT_EXTENSIONS):
+        return 'javascript'
+    return None
+
+
+def _names(text: str) -> List[str]:
+    """
+    Dotted names of an import list such as ``a.b as c, d`` or ``(x, y)``
+    """
+    names = []
+    for part in text.strip('() \t\n').split(','):
+        words = part.split()
+        if words and _DOTTED_NAME.match(words[0]):
+            names.append(words[0])
+    return names
+
+
+def extract_imports(path: str, source: str) -> Tuple[Import, ...]:
+    """
+    Imports written in one Python or JavaScript/TypeScript file
+    (``import``/``from ... import``; ``import``/``export ... from``,
+    ``require()`` and ``import()``), in order
+    """
+    language = module_language(path)
+    if language == 'javascript':
+        return tuple((match.group(2), ()) for match in _JAVASCRIPT_IMPORT.finditer(source))
+    if language != 'python':
+        return ()
+    found = []
+    for match in _PYTHON_IMPORT.finditer(source):
+        found.extend((match.start(), (name, ())) for name in _names(match.group(1)))
+    for match in _PYTHON_FROM.finditer(source):
+        module = match.group(1)
+        if module.strip('.') and not _DOTTED_NAME.match(module.strip('.')):
+            continue
+        found.append((match.start(), (module, tuple(_names(match.group(2))))))
+    found.sort(key=lambda entry: entry[0])
+    return tuple(entry for _, entry in found)
+
+
+class ImportCache:
+    """
+    Bounded LRU of extracted imports keyed by language and content digest,
+    so a file is read for imports once no matter how many analyses include it
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[Import, ...]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def imports(self, path: str, digest: str, source: str) -> Tuple[Import, ...]:
+        key = (module_language(path), digest)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        imports = extract_imports(path, source)
+        with self._lock:
+            self._entries[key] = imports
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return imports
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+IMPORT_CACHE = ImportCache()
+
+
+def _python_module(path: str) -> List[str]:
+    parts = path[:-3].split('/')
+    return parts[:-1] if parts[-1] == '__init__' else parts
+
+
+class ModuleIndex:
+    """
+    Resolves import specifiers to repository paths
+
+    Python modules are known by their full dotted path and by every dotted
+    suffix of it, so ``import app.models`` finds ``src/app/models.py``; a
+    full path wins over a suffix, and a shorter suffix dropping fewer
+    leading directories wins over a longer one. JavaScript specifiers only
+    resolve when they are relative (``./`` or ``../``).
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = {posixpath.normpath(path): path for path in paths}
+        self.modules: Dict[str, str] = {}
+        python = [
+            (path, _python_module(posixpath.normpath(path)))
+            for path in paths if module_language(path) == 'python'
+        ]
+        drop = 0
+        while python:
+            for path, parts in python:
+                self.modules.setdefault('.'.join(parts[drop:]), path)
+            drop += 1
+            python = [(path, parts) for path, parts in python if len(parts) > drop]
+
+    def resolve(self, path: str, imports: Tuple[Import, ...]) -> List[List[str]]:
+        """
+        Repository paths each import of a file refers to; empty for imports
+        of packages outside the repository
+        """
+        if module_language(path) == 'javascript':
+            directory = posixpath.dirname(posixpath.normpath(path))
+            return [self._resolve_javascript(directory, specifier) for specifier, _ in imports]
+        package = _python_module(posixpath.normpath(path))
+        if not path.endswith('__init__.py'):
+            package = package[:-1]
+        return [self._resolve_python(package, module, names) for module, names in imports]
+
+    def _resolve_python(self, package: List[str], module: str, names: Tuple[str, ...]) -> List[str]:
+        level = len(module) - len(module.lstrip('.'))
+        if level:
+            if level - 1 > len(package):
+                return []
+            package = package[:len(package) - (level - 1)]
+            module = '.'.join(package + ([module[level:]] if module[level:] else []))
+        targets = []
+        unmatched = not names
+        for name in names:
+            target = self.modules.get(f'{module}.{name}' if module else name)
+            if target is not None:
+                targets.append(target)
+            else:
+                unmatched = True
+        if unmatched:
+            # The module itself, or for ``import a.b.c`` its longest
+            # prefix that is in the repository.
+            parts = module.split('.')
+            while parts:
+                target = self.modules.get('.'.join(parts))
+                if target is not None:
+                    targets.append(target)
+                    break
+                parts.pop()
+        return targets
+
+    def _resolve_javascript(self, directory: str, specifier: str) -> List[str]:
+        if not specifier.startswith('.'):
+            return []
+        base = posixpath.normpath(posixpath.join(directory, specifier))
+        for candidate in (base,) + tuple(base + extension for extension in JAVASCRIPT_EXTENSIONS) + tuple(
+                f'{base}/index{extension}' for extension in JAVASCRIPT_EXTENSIONS):
+            if candidate in self.paths:
+                return [self.paths[candidate]]
+        return []
+
+
+class ModuleGraph:
+    """
+    Import graph of a repository: one node per Python or JavaScript module,
+    one edge from each module to every repository module it imports
+    """
+
+    def __init__(self, imports: Dict[str, Tuple[Import, ...]]):
+        import networkx as nx
+
+        index = ModuleIndex(list(imports))
+        edges = []
+        self.external_imports = 0
+        for path, specifiers in imports.items():
+            for targets in index.resolve(path, specifiers):
+                self.external_imports += not targets
+                edges.extend((path, target) for target in targets)
+        self.graph = nx.DiGraph()
+        self.graph.add_nodes_from(imports)
+        self.graph.add_edges_from(edges)
+        self._summary: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_files(cls, files: List[Tuple[str, str, str]], cache: Optional[ImportCache] = IMPORT_CACHE) -> 'ModuleGraph':
+        """
+        Graph of (path, content digest, content) files; other than Python
+        and JavaScript files are ignored
+        """
+        imports = {}
+        for path, digest, source in files:
+            if module_language(path) is None:
+                continue
+            imports[path] = cache.imports(path, digest, source) if cache is not None else extract_imports(path, source)
+        return cls(imports)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Cycles (strongly connected components of more than one module, or
+        modules importing themselves), fan-in/fan-out, the longest chain of
+        dependencies between components and the largest cascade
+        """
+        if self._summary is None:
+            self._summary = self._summarize()
+        return self._summary
+
+    def _summarize(self) -> Dict[str, Any]:
+        import networkx as nx
+
+        graph = self.graph
+        modules = graph.number_of_nodes()
+        components = list(nx.strongly_connected_components(graph))
+        cyclic = [
+            component for component in components
+            if len(component) > 1 or graph.has_edge(next(iter(component)), next(iter(component)))
+        ]
+        cyclic.sort(key=lambda component: (-len(component), min(component)))
+        examples = []
+        for component in cyclic[:MAX_CYCLE_EXAMPLES]:
+            start = min(component)
+            cycle = nx.find_cycle(graph.subgraph(component), start)
+            examples.append([edge[0] for edge in cycle])
+
+        fan_in = heapq.nsmallest(TOP_MODULES, graph.in_degree(), key=lambda item: (-item[1], item[0]))
+        fan_out = heapq.nsmallest(TOP_MODULES, graph.out_degree(), key=lambda item: (-item[1], item[0]))
+
+        # The condensation: one node per component, as plain adjacency sets
+        # (networkx's own builds a second graph object of the same size).
+        member = {}
+        for node, component in enumerate(components):
+            for path in component:
+                member[path] = node
+        imported = [set() for _ in components]
+        importers = [set() for _ in components]
+        for source, target in graph.edges():
+            if member[source] != member[target]:
+                imported[member[source]].add(member[target])
+                importers[member[target]].add(member[source])
+        sizes = [len(component) for component in components]
+
+        # Longest chain of imports between components, counted in modules,
+        # over a topological order (Kahn's algorithm).
+        pending = [len(targets) for targets in imported]
+        order = [node for node, count in enumerate(pending) if not count]
+        chain = [0] * len(components)
+        for node in order:
+            chain[node] += sizes[node]
+            for other in importers[node]:
+                chain[other] = max(chain[other], chain[node])
+                pending[other] -= 1
+                if not pending[other]:
+                    order.append(other)
+
+        # How many modules a change reaches, for the most imported ones: the
+        # component's own other members plus everything importing it.
+        cascade = {'module': None, 'modules': 0, 'share': 0.0}
+        for path, degree in fan_in:
+            if not degree:
+                break
+            start = member[path]
+            seen = {start}
+            queue = [start]
+            for node in queue:
+                for other in importers[node] - seen:
+                    seen.add(other)
+                    queue.append(other)
+            reached = sum(sizes[node] for node in seen) - 1
+            if reached > cascade['modules']:
+                cascade = {'module': path, 'modules': reached, 'share': round(reached / modules, 4)}
+
+        return {
+            'modules': modules,
+            'edges': graph.number_of_edges(),
+            'external_imports': self.external_imports,
+            'components': len(components),
+            'cycles': len(cyclic),
+            'modules_in_cycles': sum(len(component) for component in cyclic),
+            'largest_cycle': len(cyclic[0]) if cyclic else 0,
+            'cycle_examples': examples,
+            'max_fan_in': fan_in[0][1] if fan_in else 0,
+            'max_fan_out': fan_out[0][1] if fan_out else 0,
+            'top_fan_in': [{'module': path, 'fan_in': degree} for path, degree in fan_in if degree],
+            'top_fan_out': [{'module': path, 'fan_out': degree} for path, degree in fan_out if degree],
+            'longest_chain': max(chain, default=0),
+            'largest_cascade': cascade,
+        }
+
+    def emergent_properties(self) -> List[Dict[str, Any]]:
+        """
+        Feedback loops (import cycles) and cascading effects (modules whose
+        change reaches a large share of the repository) found in the graph
+        """
+        summary = self.summary()
+        properties = []
+        if summary['cycles']:
+            share = summary['modules_in_cycles'] / summary['modules']
+            properties.append({
+                'name': 'Feedback Loops',
+                'description': (
+                    f"{summary['cycles']} import cycle(s) spanning {summary['modules_in_cycles']} modules"
+                ),
+                'confidence': round(0.6 + 0.35 * min(1.0, share * 4), 2),
+            })
+        cascade = summary['largest_cascade']
+        if cascade['modules'] >= CASCADE_MIN_MODULES and cascade['share'] >= CASCADE_MIN_SHARE:
+            properties.append({
+                'name': 'Cascading Effects',
+                'description': (
+                    f"Changes to {cascade['module']} propagate to {cascade['modules']} modules"
+                ),
+                'confidence': round(0.5 + 0.45 * cascade['share'], 2),
+            })
+        return properties
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Prefilter: leaves vendored, generated and minified files out of an analysis
+and analyzes identical or near-identical files once
+Files are classified from their path and first bytes; near-duplicates are
+found with MinHash signatures over token shingles (NumPy, when installed)
+and locality-sensitive hashing, so no pair of files is ever compared in full
+"""
+
+import operator
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+
+from structural_metrics import load_numpy
+
+VENDORED_DIRECTORIES = frozenset({
+    'node_modules', 'bower_components', 'vendor', 'vendors', 'third_party', 'third-party',
+    'site-packages', '.venv', 'venv', 'Pods',
+})
+GENERATED_DIRECTORIES = frozenset({'dist', '__generated__', 'generated'})
+GENERATED_SUFFIXES = (
+    '.min.js', '.min.css', '.bundle.js', '.chunk.js', '.map', '_pb2.py', '_pb2_grpc.py', '.pb.go',
+    '.g.dart', '.designer.cs',
+)
+LOCKFILES = frozenset({
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'npm-shrinkwrap.json', 'Pipfile.lock',
+    'poetry.lock', 'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum', 'mix.lock',
+})
+# Looked for, case-insensitively, in the first GENERATED_HEADER_CHARS.
+GENERATED_MARKERS = (
+    '@generated', 'do not edit', 'auto-generated', 'autogenerated', 'code generated by',
+    'generated by the protocol buffer compiler',
+)
+GENERATED_HEADER_CHARS = 1024
+# Files at least this large whose lines average this many characters are
+# minified.
+MINIFIED_MIN_CHARS = 2048
+MINIFIED_LINE_CHARS = 300
+
+# MinHash parameters: NUM_PERMUTATIONS hashes split into LSH_BANDS bands;
+# two files share a band bucket with high probability from about 50%
+# similarity and are then compared on the whole signature.
+SHINGLE_TOKENS = 5
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+MAX_SHINGLES = 50000
+NEAR_DUPLICATE_SIMILARITY = 0.9
+# Earlier files a file is compared with at most, however many share its
+# bands (files written from the same template can share many).
+MAX_CANDIDATES = 16
+# Smaller files are only merged when identical.
+NEAR_DUPLICATE_MIN_CHARS = 512
+# Entries listed in a report; the totals always cover every file.
+MAX_REPORTED_FILES = 100
+
+_TOKEN = re.compile(r'\w+')
+_PRIME = 4294967311  # smallest prime above 2**32
+_SHINGLE_BASE = 1000003
+_permutations = None
+
+
+def classify(path: str, content: str) -> Optional[str]:
+    """
+    Why a file should not be analyzed ('lockfile', 'vendored', 'generated'
+    or 'minified'), or None for ordinary source
+    """
+    parts = path.replace('\\', '/').split('/')
+    name = parts[-1]
+    if name in LOCKFILES:
+        return 'lockfile'
+    if any(part in VENDORED_DIRECTORIES for part in parts[:-1]):
+        return 'vendored'
+    if name.endswith(GENERATED_SUFFIXES) or any(part in GENERATED_DIRECTORIES for part in parts[:-1]):
+        return 'generated'
+    header = content[:GENERATED_HEADER_CHARS].lower()
+    if any(marker in header for marker in GENERATED_MARKERS):
+        return 'generated'
+    if len(content) >= MINIFIED_MIN_CHARS and len(content) / (content.count('\n') + 1) > MINIFIED_LINE_CHARS:
+        return 'minified'
+    return None
+
+
+def _load_permutations():
+    """
+    The (a, b) coefficients of the MinHash permutations ``(a * x + b) mod p``
+    as NumPy column vectors, or None without NumPy
+    """
+    global _permutations
+    np = load_numpy()
+    if np is None:
+        return None
+    if _permutations is None:
+        rng = np.random.default_rng(20240607)
+        a = rng.integers(1, 2 ** 31, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+        b = rng.integers(0, 2 ** 31, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+        _permutations = (a, b)
+    return _permutations
+
+
+def minhash(content: str) -> Optional[Tuple[int, ...]]:
+    """
+    MinHash signature of a text's shingles of SHINGLE_TOKENS word tokens,
+    or None when it is too short to have one (or NumPy is missing)
+    """
+    permutations = _load_permutations()
+    if permutations is None:
+        return None
+    np = load_numpy()
+    tokens = _TOKEN.findall(content)
+    if len(tokens) < SHINGLE_TOKENS:
+        return None
+    tokens = tokens[:MAX_SHINGLES + SHINGLE_TOKENS - 1]
+    hashes = np.fromiter((zlib.crc32(token.encode('utf-8', 'surrogatepass')) for token in tokens),
+                         dtype=np.uint64, count=len(tokens))
+    # Polynomial hash of each window of tokens, kept below 2**32.
+    shingles = np.zeros(len(tokens) - SHINGLE_TOKENS + 1, dtype=np.uint64)
+    for offset in range(SHINGLE_TOKENS):
+        shingles = (shingles * _SHINGLE_BASE + hashes[offset:len(shingles) + offset]) % _PRIME
+    a, b = permutations
+    return tuple(int(value) for value in ((a * shingles + b) % _PRIME).min(axis=1))
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """
+    Estimated Jaccard similarity of two signatures' shingle sets
+    """
+    return sum(map(operator.eq, first, second)) / len(first)
+
+
+class SignatureCache:
+    """
+    Bounded LRU of MinHash signatures keyed by content digest, so a file is
+    fingerprinted once no matter how many analyses include it
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Optional[Tuple[int, ...]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def signature(self, digest: str, content: str) -> Optional[Tuple[int, ...]]:
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return self._entries[digest]
+        signature = minhash(content)
+        with self._lock:
+            self._entries[digest] = signature
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return signature
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+SIGNATURE_CACHE = SignatureCache()
+
+
+class FilePlan:
+    """
+    What the prefilter decided for a set of files: the files to analyze
+    (in order), how many files each of them stands for, and a report
+    """
+
+    def __init__(self):
+        self.files: Dict[str, str] = {}
+        self.weights: Dict[str, int] = {}
+        self.skipped: List[Tuple[str, str, int]] = []
+        self.duplicates: List[Tuple[str, str, float, int]] = []
+        self.total_files = 0
+        self.total_bytes = 0
+
+    def report(self, applied: bool = True) -> Dict[str, Any]:
+        reasons: Dict[str, Dict[str, int]] = {}
+        for _, reason, size in self.skipped:
+            totals = reasons.setdefault(reason, {'files': 0, 'bytes': 0})
+            totals['files'] += 1
+            totals['bytes'] += size
+        return {
+            'applied': applied,
+            'files': self.total_files,
+            'bytes': self.total_bytes,
+            'scanned_files': len(self.files),
+            'scanned_bytes': sum(len(content) for content in self.files.values()),
+            'skipped': reasons,
+            'skipped_files': [
+                {'path': path, 'reason': reason, 'bytes': size}
+                for path, reason, size in self.skipped[:MAX_REPORTED_FILES]
+            ],
+            'duplicate_files': len(self.duplicates),
+            'duplicate_bytes': sum(size for _, _, _, size in self.duplicates),
+            'duplicates': [
+                {'path': path, 'duplicate_of': original, 'similarity': round(score, 3)}
+                for path, original, score, _ in self.duplicates[:MAX_REPORTED_FILES]
+            ],
+        }
+
+
+def plan_files(files: List[Tuple[str, str, str]], cache: Optional[SignatureCache] = SIGNATURE_CACHE) -> FilePlan:
+    """
+    Decide which of the (path, content digest, content) files to analyze
+
+    Lockfiles, vendored, generated and minified files are skipped. Of
+    identical files, and of files whose estimated similarity reaches
+    NEAR_DUPLICATE_SIMILARITY, only the first is analyzed, weighted by the
+    number of files it stands for.
+    """
+    plan = FilePlan()
+    originals: Dict[str, str] = {}
+    signatures: Dict[str, Tuple[int, ...]] = {}
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    for path, digest, content in files:
+        plan.total_files += 1
+        plan.total_bytes += len(content)
+        reason = classify(path, content)
+        if reason is not None:
+            plan.skipped.append((path, reason, len(content)))
+            continue
+        original = originals.get(digest)
+        if original is not None:
+            plan.weights[original] += 1
+            plan.duplicates.append((path, original, 1.0, len(content)))
+            continue
+        signature = None
+        if len(content) >= NEAR_DUPLICATE_MIN_CHARS:
+            signature = cache.signature(digest, content) if cache is not None else minhash(content)
+        if signature is not None:
+            bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS)]
+            candidates = {}
+            for key in bands:
+                for candidate in buckets.get(key, ()):
+                    candidates.setdefault(candidate, None)
+                    if len(candidates) >= MAX_CANDIDATES:
+                        break
+                if len(candidates) >= MAX_CANDIDATES:
+                    break
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                score = similarity(signature, signatures[candidate])
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is not None and best_score >= NEAR_DUPLICATE_SIMILARITY:
+                plan.weights[best] += 1
+                plan.duplicates.append((path, best, best_score, len(content)))
+                continue
+            signatures[path] = signature
+            for key in bands:
+                buckets.setdefault(key, []).append(path)
+        originals[digest] = path
+        plan.files[path] = content
+        plan.weights[path] = 1
+    return plan
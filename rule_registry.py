@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Rule Registry: pattern packs layered over the built-in analysis rules
+A pack is a JSON or YAML file that replaces or extends pattern families and
+overrides the score weights, divisors, loop, trigger and risk tables. Packs
+are validated once, probed for slow patterns and the resulting ruleset is
+cached on disk by the packs' hash; the registry reloads them when they change
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Any
+
+from consciousness_analyzer import (
+    COUNT, DEFAULT_RULES, FIRST, WARMUP_SAMPLE, Ruleset, _fold_case, load_ruleset,
+)
+
+PACK_SUFFIXES = ('.json', '.yaml', '.yml')
+PACK_KEYS = frozenset({
+    'name', 'families', 'score_weights', 'score_divisors', 'complexity_divisors', 'behavioral_loops',
+    'psychological_triggers', 'risk_tiers', 'risk_low',
+})
+FAMILY_KEYS = frozenset({'mode', 'ignore_case', 'patterns', 'extra_patterns'})
+LOOP_KEYS = ('name', 'family', 'description')
+TRIGGER_KEYS = ('name', 'family', 'effect')
+RISK_KEYS = ('level', 'status', 'recommendations')
+
+# Every pattern of a new ruleset is timed on PROBE_TEXT, long lines and
+# runs of whitespace included; one taking longer than PROBE_SECONDS fails
+# validation instead of slowing down every analysis.
+PROBE_TEXT = WARMUP_SAMPLE * 4 + ('x = ' + 'a' * 4000 + ' :' * 1000 + '\n') * 4 + ' ' * 16384 + '\n'
+PROBE_SECONDS = 0.1
+
+# Bump when the cached format or the validation changes.
+CACHE_VERSION = '2'
+# Private to the user: a cached ruleset is trusted as much as the packs.
+DEFAULT_CACHE_DIR = os.path.join(
+    os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'logospace-rules',
+)
+
+
+def read_pack(path: str, raw: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Parse a pack file (YAML needs PyYAML); raises ValueError when it is not
+    a mapping
+    """
+    if raw is None:
+        with open(path, 'rb') as handle:
+            raw = handle.read()
+    if path.endswith('.json'):
+        parse = json.loads
+    else:
+        try:
+            import yaml
+        except ImportError:  # pragma: no cover - PyYAML is listed in requirements.txt
+            raise ValueError(f'{path}: PyYAML is needed to load YAML packs')
+        parse = yaml.safe_load
+    try:
+        pack = parse(raw.decode('utf-8'))
+    except Exception as e:
+        # Decoding errors, json.JSONDecodeError and yaml.YAMLError.
+        raise ValueError(f'{path}: {e}')
+    if not isinstance(pack, dict):
+        raise ValueError(f'{path}: a pack must be a mapping')
+    return pack
+
+
+def _number(value, where: str, positive: bool = False) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not value == value:
+        raise ValueError(f'{where} must be a number')
+    if value < 0 or (positive and value == 0):
+        raise ValueError(f"{where} must be {'positive' if positive else 'non-negative'}")
+    return float(value)
+
+
+def _strings(value, where: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) and item for item in value):
+        raise ValueError(f'{where} must be a list of non-empty strings')
+    return list(value)
+
+
+def _entries(value, keys, where: str) -> List[List[str]]:
+    if not isinstance(value, list):
+        raise ValueError(f'{where} must be a list')
+    entries = []
+    for index, entry in enumerate(value):
+        if not isinstance(entry, dict) or set(entry) != set(keys):
+            raise ValueError(f"{where}[{index}] must have exactly the keys {', '.join(keys)}")
+        entries.append([entry[key] for key in keys])
+    return entries
+
+
+def apply_pack(spec: Dict[str, Any], pack: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """
+    The ruleset spec (see ``Ruleset.to_spec``) with a pack applied on top.
+    Raises ValueError, naming ``source``, for anything the pack gets wrong;
+    the patterns themselves are checked by ``build_ruleset``.
+    """
+    unknown = set(pack) - PACK_KEYS
+    if unknown:
+        raise ValueError(f"{source}: unknown key(s): {', '.join(sorted(unknown))}")
+    spec = json.loads(json.dumps(spec))
+    if 'name' in pack:
+        spec['name'] = str(pack['name'])
+
+    families = pack.get('families', {})
+    if not isinstance(families, dict):
+        raise ValueError(f'{source}: families must be a mapping')
+    for family, entry in families.items():
+        where = f'{source}: family {family}'
+        if not isinstance(entry, dict) or set(entry) - FAMILY_KEYS:
+            raise ValueError(f"{where} must be a mapping of {', '.join(sorted(FAMILY_KEYS))}")
+        current = spec['families'].get(family)
+        if current is None:
+            if 'mode' not in entry or 'patterns' not in entry:
+                raise ValueError(f'{where} is new and needs a mode and patterns')
+            current = [entry['mode'], 0, []]
+        elif 'mode' in entry and entry['mode'] != current[0] and family in DEFAULT_RULES.families:
+            raise ValueError(f'{where}: the mode of a built-in family cannot change')
+        if current[0] not in (COUNT, FIRST):
+            raise ValueError(f'{where}: mode must be {COUNT!r} or {FIRST!r}')
+        flags = current[1]
+        if 'ignore_case' in entry:
+            if not isinstance(entry['ignore_case'], bool):
+                raise ValueError(f'{where}: ignore_case must be true or false')
+            flags = int(flags | re.IGNORECASE if entry['ignore_case'] else flags & ~re.IGNORECASE)
+        patterns = current[2]
+        if 'patterns' in entry:
+            patterns = _strings(entry['patterns'], f'{where}: patterns')
+        if 'extra_patterns' in entry:
+            patterns = patterns + _strings(entry['extra_patterns'], f'{where}: extra_patterns')
+        if not patterns:
+            raise ValueError(f'{where} has no patterns')
+        spec['families'][family] = [current[0], flags, patterns]
+
+    for table, positive in (('score_weights', False), ('score_divisors', True), ('complexity_divisors', True)):
+        values = pack.get(table, {})
+        if not isinstance(values, dict):
+            raise ValueError(f'{source}: {table} must be a mapping')
+        unknown = set(values) - set(spec[table])
+        if unknown:
+            raise ValueError(f"{source}: unknown {table} key(s): {', '.join(sorted(unknown))}")
+        for key, value in values.items():
+            spec[table][key] = _number(value, f'{source}: {table}.{key}', positive)
+    if abs(sum(spec['score_weights'].values()) - 1.0) > 1e-6:
+        raise ValueError(f'{source}: score_weights must sum to 1')
+
+    if 'behavioral_loops' in pack:
+        spec['behavioral_loops'] = _entries(pack['behavioral_loops'], LOOP_KEYS, f'{source}: behavioral_loops')
+    if 'psychological_triggers' in pack:
+        spec['psychological_triggers'] = _entries(
+            pack['psychological_triggers'], TRIGGER_KEYS, f'{source}: psychological_triggers',
+        )
+    for table in ('behavioral_loops', 'psychological_triggers'):
+        for name, family, text in spec[table]:
+            if not all(isinstance(value, str) for value in (name, family, text)):
+                raise ValueError(f'{source}: {table} entries must be strings')
+            if family not in spec['families']:
+                raise ValueError(f'{source}: {table} entry {name!r} names unknown family {family!r}')
+
+    if 'risk_tiers' in pack:
+        tiers = _entries(pack['risk_tiers'], ('above',) + RISK_KEYS, f'{source}: risk_tiers')
+        thresholds = [_number(above, f'{source}: risk_tiers.above') for above, _, _, _ in tiers]
+        if thresholds != sorted(set(thresholds), reverse=True):
+            raise ValueError(f'{source}: risk_tiers must be listed highest first, without ties')
+        for _, level, status, recommendations in tiers:
+            _strings([level, status], f'{source}: risk_tiers level and status')
+            _strings(recommendations, f'{source}: risk_tiers recommendations')
+        spec['risk_tiers'] = tiers
+    if 'risk_low' in pack:
+        low = pack['risk_low']
+        if not isinstance(low, dict) or set(low) != set(RISK_KEYS):
+            raise ValueError(f"{source}: risk_low must have exactly the keys {', '.join(RISK_KEYS)}")
+        _strings([low['level'], low['status']], f'{source}: risk_low level and status')
+        spec['risk_low'] = [low['level'], low['status'], _strings(low['recommendations'],
+                                                                  f'{source}: risk_low recommendations')]
+    return spec
+
+
+def build_ruleset(spec: Dict[str, Any], source: str = 'ruleset') -> Ruleset:
+    """
+    Compile a spec, rejecting patterns that do not compile, match the empty
+    string, may backtrack (nested or overlapping repetitions, refused before
+    they run; see ``linear_patterns.backtracks``) or run slowly on
+    PROBE_TEXT
+    """
+    for family, (_, flags, patterns) in spec['families'].items():
+        for pattern in patterns:
+            try:
+                empty = re.compile(pattern, flags).search('') is not None
+            except re.error as e:
+                raise ValueError(f'{source}: family {family}: invalid pattern {pattern!r}: {e}')
+            if empty:
+                raise ValueError(f'{source}: family {family}: pattern {pattern!r} matches the empty string')
+    try:
+        rules = load_ruleset(spec)
+    except ValueError as e:
+        raise ValueError(f'{source}: {e}')
+
+    folded = _fold_case(PROBE_TEXT)
+    for family, family_rules in rules.scanner.rules.items():
+        for rule in family_rules:
+            start = time.perf_counter()
+            rule.evaluate(PROBE_TEXT, folded)
+            if time.perf_counter() - start > PROBE_SECONDS:
+                raise ValueError(f'{source}: family {family}: pattern {rule.pattern!r} is too slow')
+    return rules
+
+
+class RuleRegistry:
+    """
+    The active ruleset: the built-in rules with the packs at ``path`` (a
+    pack file, or a directory of them applied in file name order) on top.
+
+    A validated ruleset is written to ``cache_dir`` under the hash of the
+    packs it was built from, so other processes (and restarts) load the
+    same packs without parsing and applying them again; a cached ruleset
+    is still validated, and one that is not a valid spec is ignored.
+    ``refresh`` reloads the
+    packs when their files change, at most every ``reload_interval``
+    seconds; a pack that fails validation leaves the current ruleset in
+    place and is reported in ``error``.
+    """
+
+    def __init__(self, path: Optional[str] = None, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 reload_interval: float = 5.0):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.reload_interval = reload_interval
+        self.current: Ruleset = DEFAULT_RULES
+        self.packs: List[str] = []
+        self.pack_digest: Optional[str] = None
+        self.from_cache = False
+        self.error: Optional[str] = None
+        self.loaded = time.time()
+        self._signature = None
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+        if path is not None:
+            self.reload()
+
+    def pack_files(self) -> List[str]:
+        if self.path is None:
+            return []
+        if os.path.isdir(self.path):
+            return sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.endswith(PACK_SUFFIXES) and not name.startswith('.')
+            )
+        return [self.path]
+
+    def _stat(self, files: List[str]):
+        signature = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def reload(self) -> Ruleset:
+        """
+        Load the packs again and make their ruleset the current one. Raises
+        ValueError, keeping the current ruleset, when a pack is invalid.
+        """
+        with self._lock:
+            files = self.pack_files()
+            self._signature = self._stat(files)
+            self._checked = time.monotonic()
+            try:
+                rules, pack_digest, from_cache = self._load(files)
+            except OSError as e:
+                self.error = f'{e.filename}: {e.strerror}'
+                raise ValueError(self.error)
+            except ValueError as e:
+                self.error = str(e)
+                raise
+            self.current = rules
+            self.packs = [os.path.basename(path) for path in files]
+            self.pack_digest = pack_digest
+            self.from_cache = from_cache
+            self.error = None
+            self.loaded = time.time()
+            return rules
+
+    def refresh(self) -> bool:
+        """
+        Reload the packs if their files changed since they were last read;
+        returns whether the current ruleset was replaced
+        """
+        if self.path is None or time.monotonic() - self._checked < self.reload_interval:
+            return False
+        with self._lock:
+            self._checked = time.monotonic()
+            if self._stat(self.pack_files()) == self._signature:
+                return False
+        previous = self.current
+        try:
+            return self.reload() is not previous
+        except ValueError:
+            return False
+
+    def _load(self, files: List[str]):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{CACHE_VERSION}\0{DEFAULT_RULES.fingerprint}\0'.encode('utf-8'))
+        raws = []
+        for path in files:
+            with open(path, 'rb') as handle:
+                raw = handle.read()
+            raws.append(raw)
+            digest.update(os.path.basename(path).encode('utf-8', 'surrogatepass') + b'\0')
+            digest.update(hashlib.blake2b(raw, digest_size=16).digest())
+        pack_digest = digest.hexdigest()
+
+        source = ', '.join(os.path.basename(path) for path in files) or 'builtin'
+        cached = self._read_cache(pack_digest)
+        if cached is not None:
+            try:
+                return build_ruleset(cached, source), pack_digest, True
+            except (AttributeError, KeyError, TypeError, ValueError):
+                # Not a spec this version wrote: rebuilt from the packs.
+                pass
+
+        spec = DEFAULT_RULES.to_spec()
+        for path, raw in zip(files, raws):
+            spec = apply_pack(spec, read_pack(path, raw), os.path.basename(path))
+        rules = build_ruleset(spec, source)
+        self._write_cache(pack_digest, rules.to_spec())
+        return rules, pack_digest, False
+
+    def _cache_path(self, pack_digest: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f'{pack_digest}.json')
+
+    def _read_cache(self, pack_digest: str) -> Optional[Dict[str, Any]]:
+        path = self._cache_path(pack_digest)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as handle:
+                spec = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(spec, dict) or set(spec) != set(DEFAULT_RULES.to_spec()):
+            return None
+        return spec
+
+    def _write_cache(self, pack_digest: str, spec: Dict[str, Any]) -> None:
+        path = self._cache_path(pack_digest)
+        if path is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            handle, temporary = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(handle, 'w', encoding='utf-8') as output:
+                json.dump(spec, output)
+            os.replace(temporary, path)
+        except OSError:
+            # A read-only cache directory only costs the next process a
+            # validation.
+            pass
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'name': self.current.name,
+            'fingerprint': self.current.fingerprint,
+            'patterns': self.current.digest,
+            'path': self.path,
+            'packs': list(self.packs),
+            'from_cache': self.from_cache,
+            'loaded': self.loaded,
+            'error': self.error,
+        }
+
+
+def builtin_pack() -> Dict[str, Any]:
+    """
+    The built-in rules written as a pack, a starting point for tuning them
+    """
+    spec = DEFAULT_RULES.to_spec()
+    return {
+        'name': 'builtin',
+        'families': {
+            family: {'mode': mode, 'ignore_case': bool(flags & re.IGNORECASE), 'patterns': patterns}
+            for family, (mode, flags, patterns) in spec['families'].items()
+        },
+        'score_weights': spec['score_weights'],
+        'score_divisors': spec['score_divisors'],
+        'complexity_divisors': spec['complexity_divisors'],
+        'behavioral_loops': [dict(zip(LOOP_KEYS, entry)) for entry in spec['behavioral_loops']],
+        'psychological_triggers': [dict(zip(TRIGGER_KEYS, entry)) for entry in spec['psychological_triggers']],
+        'risk_tiers': [dict(zip(('above',) + RISK_KEYS, entry)) for entry in spec['risk_tiers']],
+        'risk_low': dict(zip(RISK_KEYS, spec['risk_low'])),
+    }
+
+
+if __name__ == '__main__':
+    # python rule_registry.py            print the built-in rules as a pack
+    # python rule_registry.py PATH...    validate packs, applied in order
+    if len(sys.argv) == 1:
+        print(json.dumps(builtin_pack(), indent=2, ensure_ascii=False))
+    else:
+        spec = DEFAULT_RULES.to_spec()
+        try:
+            for pack_path in sys.argv[1:]:
+                spec = apply_pack(spec, read_pack(pack_path), pack_path)
+            checked = build_ruleset(spec, ', '.join(sys.argv[1:]))
+        except (OSError, ValueError) as e:
+            print(f'Invalid: {e}', file=sys.stderr)
+            sys.exit(1)
+        print(f'OK: {sum(len(patterns) for _, _, patterns in checked.families.values())} patterns '
+              f'in {len(checked.families)} families, fingerprint {checked.fingerprint}')
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Sampling: stratified samples of a repository's files and the totals they
+estimate
+Files fall into strata by extension and size class and are scanned in
+random clusters, in an order where every prefix is a stratified sample, so
+a budget can stop the scan anywhere. Totals are extrapolated stratum by
+stratum. Their uncertainty comes from a bootstrap within strata, rescaled
+for sampling without replacement, so it carries over to any function of
+the totals, however nonlinear
+"""
+
+import bisect
+import math
+import os
+import random
+import statistics
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+from structural_metrics import VECTORIZE_MIN_CHARS, load_numpy
+
+# Upper bounds, in characters, of every size class but the largest.
+SIZE_CLASSES = (1024, 8192, 65536)
+# Files are scanned in clusters of about CLUSTER_BYTES characters, joined
+# as in an exact analysis: scanning small files one at a time costs several
+# times scanning their text at once. Smaller repositories get smaller
+# clusters, so that there are at least MIN_CLUSTERS of them to sample, but
+# never below the size whose nesting depth NumPy computes.
+CLUSTER_BYTES = 16 * 1024
+MIN_CLUSTERS = 1000
+# Bootstrap replicates behind an interval.
+REPLICATES = 200
+CONFIDENCE = 0.95
+SEED = 0
+
+
+def stratum_of(path: str, size: int) -> Tuple[str, int]:
+    """
+    Stratum of a file: its extension and size class
+    """
+    return os.path.splitext(path)[1].lower(), bisect.bisect_left(SIZE_CLASSES, size)
+
+
+def quantile(values: List[float], share: float) -> float:
+    """
+    Value below which ``share`` of sorted ``values`` lie (nearest rank)
+    """
+    return values[min(len(values) - 1, max(0, int(share * len(values))))]
+
+
+def _hit_rows(rows: List[Tuple[float, ...]], columns: Sequence[int]) -> List[Tuple[float, ...]]:
+    """
+    The ``columns`` of the rows with a hit in any of them
+    """
+    return [values for values in (tuple(row[column] for column in columns) for row in rows) if any(values)]
+
+
+def _binomial(rng: random.Random, trials: int, share: float) -> int:
+    """
+    Binomial draw with the standard library, in time proportional to the
+    fewer of the successes and failures
+    """
+    if share > 0.5:
+        return trials - _binomial(rng, trials, 1 - share)
+    if share <= 0:
+        return 0
+    successes = 0
+    position = 0
+    log_failure = math.log1p(-share)
+    while True:
+        # Trials up to the next success are geometric.
+        position += int(math.log(1.0 - rng.random()) / log_failure) + 1
+        if position > trials:
+            return successes
+        successes += 1
+
+
+def _unsampled(rng, numpy, count: int, unsampled: int, hits: int, sampled: int,
+               sources: List[Tuple[float, ...]], weights: List[float]) -> List[List[float]]:
+    """
+    ``count`` draws of the summed values of ``unsampled`` clusters, when
+    ``hits`` of ``sampled`` clusters had hits: how many have hits from the
+    posterior predictive of a Jeffreys prior, their values drawn from
+    ``sources`` in proportion to ``weights``
+    """
+    width = len(sources[0])
+    if not unsampled:
+        return [[0.0] * width for _ in range(count)]
+    if numpy is not None:
+        clusters = rng.binomial(unsampled, rng.beta(hits + 0.5, sampled - hits + 0.5, size=count))
+        shares = numpy.asarray(weights) / sum(weights)
+        return (rng.multinomial(clusters, shares) @ numpy.asarray(sources, float)).tolist()
+    draws = []
+    for _ in range(count):
+        clusters = _binomial(rng, unsampled, rng.betavariate(hits + 0.5, sampled - hits + 0.5))
+        drawn = rng.choices(sources, weights, k=clusters)
+        draws.append([sum(column) for column in zip(*drawn)] if drawn else [0.0] * width)
+    return draws
+
+
+class StratifiedSample:
+    """
+    Clusters of a population of (path, size) files in sampling order, the
+    values (additive counts) of those sampled so far, and the population
+    totals they estimate.
+
+    Each stratum is shuffled and cut into clusters of about
+    ``cluster_bytes`` characters; files in ``alone`` get a cluster of their
+    own. ``clusters`` lists (stratum, file indices) with the first cluster
+    of every stratum first, then the rest, each stratum at its share of
+    the clusters.
+
+    A stratum's total is its number of clusters times the mean of its
+    sample. Strata with a single sampled cluster borrow variance from each
+    other: they are pooled into one stratum. The bytes of strata without
+    any sampled cluster are counted at the sample's rate per byte.
+    """
+
+    def __init__(self, files: Sequence[Tuple[str, int]], cluster_bytes: Optional[int] = None,
+                 alone: Collection[int] = (), seed: int = SEED):
+        rng = random.Random(seed)
+        if cluster_bytes is None:
+            cluster_bytes = max(VECTORIZE_MIN_CHARS, min(CLUSTER_BYTES, sum(size for _, size in files) // MIN_CLUSTERS))
+        self.sizes = [size for _, size in files]
+        members: Dict[Tuple[str, int], List[int]] = {}
+        for index, (path, size) in enumerate(files):
+            members.setdefault(stratum_of(path, size), []).append(index)
+        self.population: Dict[Tuple[str, int], int] = {}
+        self.bytes: Dict[Tuple[str, int], int] = {}
+        keyed = []
+        for stratum, indices in members.items():
+            rng.shuffle(indices)
+            clusters = []
+            current = []
+            size = 0
+            for index in indices:
+                if index in alone:
+                    clusters.append([index])
+                    continue
+                current.append(index)
+                size += self.sizes[index]
+                if size >= cluster_bytes:
+                    clusters.append(current)
+                    current = []
+                    size = 0
+            if current:
+                clusters.append(current)
+            rng.shuffle(clusters)
+            self.population[stratum] = len(clusters)
+            self.bytes[stratum] = sum(self.sizes[index] for index in indices)
+            keyed.extend(
+                ((rank / len(clusters), rng.random()), stratum, cluster) for rank, cluster in enumerate(clusters)
+            )
+        keyed.sort(key=lambda entry: entry[0])
+        self.clusters: List[Tuple[Tuple[str, int], List[int]]] = [(stratum, cluster) for _, stratum, cluster in keyed]
+        self.rows: Dict[Tuple[str, int], List[Tuple[float, ...]]] = {}
+        self.clusters_sampled = 0
+        self.files_sampled = 0
+        self.bytes_sampled = 0
+
+    def add(self, position: int, values: Sequence[float]) -> None:
+        """
+        Record the values of the cluster at ``position`` of ``clusters``
+        """
+        stratum, cluster = self.clusters[position]
+        self.rows.setdefault(stratum, []).append(tuple(values))
+        self.clusters_sampled += 1
+        self.files_sampled += len(cluster)
+        self.bytes_sampled += sum(self.sizes[index] for index in cluster)
+
+    @property
+    def complete(self) -> bool:
+        return self.clusters_sampled == len(self.clusters)
+
+    def totals(self) -> List[float]:
+        """
+        Estimated population total of every value
+        """
+        return self._extrapolate([
+            [clusters * value / len(rows) for value in map(sum, zip(*rows))] for clusters, rows in self._groups()
+        ])
+
+    def replicates(self, count: int = REPLICATES, seed: int = SEED,
+                   groups: Sequence[Sequence[int]] = ()) -> List[List[float]]:
+        """
+        ``count`` draws of the totals given the sample: each stratum's
+        sample is drawn again with replacement, and its deviation from the
+        stratum mean scaled to the variance of drawing without replacement
+        (none when the whole stratum was sampled), never below zero.
+
+        That bootstrap cannot vary hits found in a few clusters, or in none.
+        ``groups`` are values counted together (the rules of a pattern
+        family); a family with hits in fewer than half the sampled clusters
+        gets, instead, its sampled hits plus those of the unsampled
+        clusters: how many of them have hits follows the share of sampled
+        clusters with hits under a Jeffreys prior, and each brings the hits
+        of a sampled cluster with hits, drawn with replacement (or, for a
+        family without any, as many as a typical cluster with hits of the
+        other sparse families).
+        """
+        numpy = load_numpy()
+        rng = numpy.random.default_rng(seed) if numpy is not None else random.Random(seed)
+        strata = self._groups()
+        per_group = []
+        for clusters, rows in strata:
+            sampled = len(rows)
+            means = [sum(column) / sampled for column in zip(*rows)]
+            if sampled == clusters or sampled < 2:
+                per_group.append([[clusters * mean for mean in means] for _ in range(count)])
+                continue
+            scale = ((1 - sampled / clusters) * sampled / (sampled - 1)) ** 0.5
+            if numpy is not None:
+                draws = rng.multinomial(sampled, [1 / sampled] * sampled, size=count) @ numpy.asarray(rows, float)
+                drawn = (draws / sampled).tolist()
+            else:
+                drawn = [
+                    [sum(column) / sampled for column in zip(*rng.choices(rows, k=sampled))] for _ in range(count)
+                ]
+            per_group.append([
+                [clusters * max(0.0, mean + scale * (value - mean)) for mean, value in zip(means, replicate)]
+                for replicate in drawn
+            ])
+
+        rows = [row for _, stratum in strata for row in stratum]
+        found = [_hit_rows(rows, columns) for columns in groups]
+        sparse = [(columns, hits) for columns, hits in zip(groups, found) if 2 * len(hits) < len(rows)]
+        if sparse:
+            clump = statistics.median([sum(map(sum, hits)) / len(hits) for _, hits in sparse if hits] or [1.0])
+            unsampled = sum(clusters for clusters, _ in strata) - len(rows)
+            extra = [[0.0] * len(rows[0]) for _ in range(count)]
+            for columns, hits in sparse:
+                sources = hits or [(clump,) + (0.0,) * (len(columns) - 1)]
+                sums = [sum(row[column] for row in rows) for column in columns]
+                draws = _unsampled(rng, numpy, count, unsampled, len(hits), len(rows), sources, [1.0] * len(sources))
+                for replicate, values in zip(extra, draws):
+                    for column, total, value in zip(columns, sums, values):
+                        replicate[column] = total + value
+                for group in per_group:
+                    for replicate in group:
+                        for column in columns:
+                            replicate[column] = 0.0
+            per_group.append(extra)
+        return [self._extrapolate([group[replicate] for group in per_group]) for replicate in range(count)]
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'files_sampled': self.files_sampled,
+            'files_total': len(self.sizes),
+            'bytes_sampled': self.bytes_sampled,
+            'bytes_total': sum(self.sizes),
+            'clusters_sampled': self.clusters_sampled,
+            'clusters_total': len(self.clusters),
+            'strata': len(self.population),
+            'strata_sampled': len(self.rows),
+        }
+
+    def _groups(self) -> List[Tuple[int, List[Tuple[float, ...]]]]:
+        """
+        (clusters, sampled rows) of every sampled stratum, those with a
+        single sampled cluster (out of several) pooled together
+        """
+        groups = []
+        pooled_clusters = 0
+        pooled_rows = []
+        for stratum, rows in self.rows.items():
+            if len(rows) == 1 and self.population[stratum] > 1:
+                pooled_clusters += self.population[stratum]
+                pooled_rows += rows
+            else:
+                groups.append((self.population[stratum], rows))
+        if pooled_rows:
+            groups.append((pooled_clusters, pooled_rows))
+        return groups
+
+    def _extrapolate(self, group_totals: List[List[float]]) -> List[float]:
+        """
+        Sum per-group totals, scaled up to the bytes of unsampled strata
+        """
+        totals = [sum(column) for column in zip(*group_totals)]
+        covered = sum(self.bytes[stratum] for stratum in self.rows)
+        everything = sum(self.bytes.values())
+        if covered and covered < everything:
+            totals = [total * everything / covered for total in totals]
+        return totals
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Serialization: JSON encoding and gzip compression of API responses
+orjson is used when it is installed, the standard library otherwise; both
+produce the same documents
+"""
+
+import gzip
+import json
+import zlib
+from typing import Any, Iterable, Iterator
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Bodies smaller than this are sent as they are: gzip saves little on them.
+GZIP_MIN_BYTES = 1024
+# zlib level 6 is the usual trade-off; higher levels cost far more CPU for
+# a few percent on these highly repetitive documents.
+GZIP_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = frozenset({'application/json', 'application/x-ndjson', 'text/plain'})
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any) -> str:
+    """
+    Compact JSON with sorted keys, like Flask's ``jsonify``
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode('utf-8')
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider serializing with orjson when it is available, so
+    every ``jsonify`` call uses it
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Responses ask for compact separators; anything else (e.g. the
+        # indented output of debug mode) is left to the standard library.
+        if orjson is None or kwargs.keys() - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return dumps(obj)
+        except TypeError:
+            # Types orjson does not know (e.g. Decimal) go through Flask's defaults.
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def _quality(params: str) -> float:
+    """
+    The ``q`` parameter of an Accept-Encoding entry (1 when absent, 0 when
+    it is not a number)
+    """
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return float(value.strip())
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether an Accept-Encoding header allows gzip: its own entry, or else
+    ``*``, with a quality above 0
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        qualities.setdefault(name.strip().lower(), _quality(params))
+    quality = qualities.get('gzip', qualities.get('*', 0.0))
+    return quality > 0
+
+
+def compress_response(response, accept_encoding: str):
+    """
+    Gzip a buffered response body when the client accepts it and it is
+    worth it
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers
+            or not accepts_gzip(accept_encoding)):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def gzip_stream(chunks: Iterable[str]) -> Iterator[bytes]:
+    """
+    Gzip a streamed body chunk by chunk, flushing after each one so the
+    client can decode every line as soon as it arrives
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
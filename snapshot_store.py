@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Snapshot Store: persistent per-file features of analyzed repositories
+A snapshot records which content every path of a repository had; a new
+snapshot is derived from a base one and a list of changed files, and its
+analysis is updated from running totals instead of rescanning every file
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, List, Optional, Any
+
+from consciousness_analyzer import (
+    COUNT, SCANNER, ConsciousnessAnalyzer, FeatureVector, PatternScanner, Ruleset, ScanResult, content_digest,
+)
+
+# Deltas stacked on a full snapshot before the next one is written in full,
+# which bounds the rows read to load a snapshot.
+MAX_CHAIN = 32
+
+
+class SnapshotState:
+    """
+    Features of every file of one snapshot and their running totals
+
+    Files sit in slots in repository order. A modified file keeps its slot,
+    a deleted one leaves it empty and an added one takes a new slot at the
+    end. Pattern totals are kept per rule: COUNT hits summed and, for FIRST
+    rules, the number of files with a hit, so removing a file is a
+    subtraction. The bracket depth carried across files is folded over the
+    slots when the aggregate is built.
+    """
+
+    def __init__(self, scanner: Optional[PatternScanner] = None):
+        self.scanner = scanner or SCANNER
+        self.slots: Dict[str, int] = {}
+        self.digests: List[Optional[str]] = []
+        self.vectors: List[Optional[FeatureVector]] = []
+        self.hits: Dict[str, List[int]] = {family: [0] * len(rules) for family, rules in self.scanner.rules.items()}
+        self.total_lines = 0
+
+    def copy(self) -> 'SnapshotState':
+        state = SnapshotState(self.scanner)
+        state.slots = dict(self.slots)
+        state.digests = list(self.digests)
+        state.vectors = list(self.vectors)
+        state.hits = {family: list(totals) for family, totals in self.hits.items()}
+        state.total_lines = self.total_lines
+        return state
+
+    def put(self, path: str, digest: str, vector: FeatureVector) -> int:
+        """
+        Set the features of a path, adding it at the end if it is new.
+        Returns its slot.
+        """
+        slot = self.slots.get(path)
+        if slot is None:
+            slot = self.slots[path] = len(self.vectors)
+            self.digests.append(None)
+            self.vectors.append(None)
+        else:
+            self._count(self.vectors[slot], -1)
+        self.digests[slot] = digest
+        self.vectors[slot] = vector
+        self._count(vector, 1)
+        return slot
+
+    def remove(self, path: str) -> int:
+        slot = self.slots.pop(path)
+        self._count(self.vectors[slot], -1)
+        self.digests[slot] = None
+        self.vectors[slot] = None
+        return slot
+
+    def _count(self, vector: FeatureVector, sign: int) -> None:
+        for family, values in vector.scan.hits.items():
+            totals = self.hits[family]
+            for index, value in enumerate(values):
+                totals[index] += sign * value
+        self.total_lines += sign * vector.total_lines
+
+    def paths(self) -> List[str]:
+        """
+        Paths in repository order
+        """
+        return sorted(self.slots, key=self.slots.get)
+
+    def features(self) -> FeatureVector:
+        """
+        The repository vector, equal to ``FeatureVector.merge`` of the
+        files in order
+        """
+        live = [vector for vector in self.vectors if vector is not None]
+        hits = {
+            family: tuple(
+                total if rule.mode == COUNT else min(total, 1)
+                for rule, total in zip(self.scanner.rules[family], totals)
+            )
+            for family, totals in self.hits.items()
+        }
+        ends = [vector.nesting_end for vector in live]
+        # Depth open before each file, plus the deepest point inside it.
+        depth = max(map(sum, zip(accumulate([0] + ends[:-1]), (vector.nesting_depth for vector in live))), default=0)
+        return FeatureVector(ScanResult(hits), self.total_lines, max(depth, 0), sum(ends))
+
+    def compact(self) -> 'SnapshotState':
+        """
+        The same files renumbered without empty slots
+        """
+        state = SnapshotState(self.scanner)
+        for path in self.paths():
+            slot = self.slots[path]
+            state.put(path, self.digests[slot], self.vectors[slot])
+        return state
+
+
+class SnapshotStore:
+    """
+    Snapshots of analyzed repositories in SQLite (in memory without a
+    ``path``).
+
+    Features are stored once per content digest (and extraction mode, see
+    ``ConsciousnessAnalyzer.feature_mode``) and extracted for every
+    pattern family, so any analysis sections can be served later. A
+    snapshot derived from a base stores only the changed paths; every
+    ``MAX_CHAIN`` deltas the full file list is written again. The states
+    of the ``max_states`` most recent snapshots are kept in memory, so a
+    diff against one of them costs the changed files only.
+    """
+
+    def __init__(self, path: Optional[str] = None, analyzer: Optional[ConsciousnessAnalyzer] = None,
+                 max_states: int = 16):
+        self.analyzer = analyzer or ConsciousnessAnalyzer()
+        self.max_states = max_states
+        self._states: 'OrderedDict[int, SnapshotState]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, repository TEXT NOT NULL, base INTEGER, '
+            'ruleset TEXT NOT NULL, backend TEXT NOT NULL, chain INTEGER NOT NULL, created REAL NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS snapshot_files ('
+            'snapshot INTEGER NOT NULL, path TEXT NOT NULL, slot INTEGER NOT NULL, digest TEXT, '
+            'PRIMARY KEY (snapshot, path));'
+            'CREATE TABLE IF NOT EXISTS file_features ('
+            'ruleset TEXT NOT NULL, backend TEXT NOT NULL, digest TEXT NOT NULL, record TEXT NOT NULL, '
+            'PRIMARY KEY (ruleset, backend, digest));'
+        )
+        self._db.commit()
+
+    def create_snapshot(self, repository: str, files_content: Dict[str, str]) -> int:
+        """
+        Analyze a whole repository and store it as a new full snapshot
+        """
+        state = SnapshotState(self.analyzer.rules.scanner)
+        for (path, content), digest, vector in self._extract(files_content):
+            state.put(path, digest, vector)
+        with self._lock:
+            return self._save(repository, None, 0, state, state.paths())
+
+    def apply_diff(self, base_id: int, added: Optional[Dict[str, str]] = None,
+                   modified: Optional[Dict[str, str]] = None, deleted: Optional[List[str]] = None) -> int:
+        """
+        Store the snapshot obtained by applying changed files to a base
+        snapshot; only the added and modified files are scanned. Raises
+        ValueError for an unknown base or changes that do not fit it.
+        """
+        added = added or {}
+        modified = modified or {}
+        deleted = deleted or []
+        with self._lock:
+            repository, chain = self._snapshot_row(base_id)[:2]
+            base = self._state(base_id)
+        for path in added:
+            if path in base.slots:
+                raise ValueError(f'Added file already exists in snapshot {base_id}: {path}')
+        for path in list(modified) + list(deleted):
+            if path not in base.slots:
+                raise ValueError(f'Changed file does not exist in snapshot {base_id}: {path}')
+        if len(set(added) | set(modified) | set(deleted)) < len(added) + len(modified) + len(deleted):
+            raise ValueError('A file is listed under more than one kind of change')
+
+        state = base.copy()
+        for path in deleted:
+            state.remove(path)
+        for (path, content), digest, vector in self._extract({**modified, **added}):
+            state.put(path, digest, vector)
+        changed = list(deleted) + list(modified) + list(added)
+        with self._lock:
+            if chain + 1 >= MAX_CHAIN:
+                state = state.compact()
+                return self._save(repository, None, 0, state, state.paths())
+            return self._save(repository, base_id, chain + 1, state, changed)
+
+    def use_rules(self, rules: Ruleset) -> None:
+        """
+        Analyze with another ruleset from now on. Snapshots stored under
+        other pattern families are then refused like those of another
+        backend.
+        """
+        with self._lock:
+            self.analyzer.rules = rules
+            self._states.clear()
+
+    def features(self, snapshot_id: int) -> FeatureVector:
+        with self._lock:
+            return self._state(snapshot_id).features()
+
+    def paths(self, snapshot_id: int) -> List[str]:
+        """
+        Paths of a snapshot in the order its analysis merges them
+        """
+        with self._lock:
+            return self._state(snapshot_id).paths()
+
+    def analyze(self, snapshot_id: int, sections=None) -> Dict[str, Any]:
+        """
+        Analysis of a snapshot, equal to analyzing its files one by one
+        (see ``FeatureVector.merge``) in the order of ``paths``
+        """
+        with self._lock:
+            state = self._state(snapshot_id)
+            if not state.slots:
+                features = self.analyzer.extract_features('')
+            else:
+                features = state.features()
+        return self.analyzer.analyze_features(features, sections)
+
+    def snapshot_info(self, snapshot_id: int) -> Dict[str, Any]:
+        with self._lock:
+            repository, chain, base, created = self._snapshot_row(snapshot_id)
+            files = len(self._state(snapshot_id).slots)
+        return {'id': snapshot_id, 'repository': repository, 'base': base, 'files': files, 'created': created}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshots, = self._db.execute('SELECT COUNT(*) FROM snapshots').fetchone()
+            features, = self._db.execute('SELECT COUNT(*) FROM file_features').fetchone()
+            return {'snapshots': snapshots, 'file_features': features, 'states_in_memory': len(self._states)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _extract(self, files_content: Dict[str, str]):
+        """
+        (path, content), digest and features of each file, reusing stored
+        features of known content extracted the same way
+        """
+        items = list(files_content.items())
+        backend = self.analyzer.feature_backend
+        digests = [content_digest(content) + self.analyzer.feature_mode(path) for path, content in items]
+        vectors: List[Optional[FeatureVector]] = []
+        with self._lock:
+            for digest in digests:
+                row = self._db.execute(
+                    'SELECT record FROM file_features WHERE ruleset = ? AND backend = ? AND digest = ?',
+                    (self.analyzer.rules.digest, backend, digest),
+                ).fetchone()
+                vectors.append(FeatureVector.from_record(row[0]) if row is not None else None)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        extracted = self.analyzer.extract_file_vectors(dict(items[index] for index in missing))
+        with self._lock:
+            for index, vector in zip(missing, extracted):
+                vectors[index] = vector
+                self._db.execute(
+                    'INSERT OR REPLACE INTO file_features (ruleset, backend, digest, record) VALUES (?, ?, ?, ?)',
+                    (self.analyzer.rules.digest, backend, digests[index], vector.to_record()),
+                )
+            self._db.commit()
+        return zip(items, digests, vectors)
+
+    def _save(self, repository: str, base: Optional[int], chain: int, state: SnapshotState,
+              paths: List[str]) -> int:
+        cursor = self._db.execute(
+            'INSERT INTO snapshots (repository, base, ruleset, backend, chain, created) VALUES (?, ?, ?, ?, ?, ?)',
+            (repository, base, self.analyzer.rules.digest, self.analyzer.feature_backend, chain, time.time()),
+        )
+        snapshot_id = cursor.lastrowid
+        rows = []
+        for path in paths:
+            slot = state.slots.get(path)
+            # A deleted path is recorded with the slot it leaves empty.
+            rows.append((snapshot_id, path, slot if slot is not None else -1,
+                         state.digests[slot] if slot is not None else None))
+        self._db.executemany('INSERT INTO snapshot_files (snapshot, path, slot, digest) VALUES (?, ?, ?, ?)', rows)
+        self._db.commit()
+        self._remember(snapshot_id, state)
+        return snapshot_id
+
+    def _snapshot_row(self, snapshot_id: int):
+        row = self._db.execute(
+            'SELECT repository, chain, base, created, ruleset, backend FROM snapshots WHERE id = ?', (snapshot_id,),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f'Unknown snapshot: {snapshot_id}')
+        if row[4] != self.analyzer.rules.digest or row[5] != self.analyzer.feature_backend:
+            raise ValueError(f'Snapshot {snapshot_id} was analyzed with other patterns or backend; create a new one')
+        return row[:4]
+
+    def _state(self, snapshot_id: int) -> SnapshotState:
+        """
+        State of a snapshot, rebuilt from its full ancestor and the deltas
+        after it when not in memory
+        """
+        state = self._states.get(snapshot_id)
+        if state is not None:
+            self._states.move_to_end(snapshot_id)
+            return state
+
+        chain = [snapshot_id]
+        base = self._snapshot_row(snapshot_id)[2]
+        while base is not None:
+            chain.append(base)
+            base = self._snapshot_row(base)[2]
+        state = SnapshotState(self.analyzer.rules.scanner)
+        for link in reversed(chain):
+            rows = self._db.execute(
+                'SELECT f.path, f.digest, v.record FROM snapshot_files f '
+                'LEFT JOIN file_features v ON v.ruleset = ? AND v.backend = ? AND v.digest = f.digest '
+                'WHERE f.snapshot = ? ORDER BY f.slot, f.path',
+                (self.analyzer.rules.digest, self.analyzer.feature_backend, link),
+            ).fetchall()
+            for path, digest, record in rows:
+                if digest is None:
+                    state.remove(path)
+                else:
+                    state.put(path, digest, FeatureVector.from_record(record))
+        self._remember(snapshot_id, state)
+        return state
+
+    def _remember(self, snapshot_id: int, state: SnapshotState) -> None:
+        self._states[snapshot_id] = state
+        self._states.move_to_end(snapshot_id)
+        while len(self._states) > self.max_states:
+            self._states.popitem(last=False)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Structural Metrics: vectorized line and bracket-nesting counters
+Uses NumPy when it is installed and falls back to pure Python otherwise
+"""
+
+from typing import Tuple
+
+# Texts shorter than this are cheaper to walk in Python than to hand to NumPy.
+VECTORIZE_MIN_CHARS = 4096
+# Bytes converted per step, bounding the temporary arrays.
+BLOCK_BYTES = 16 * 1024 * 1024
+
+# NumPy is imported on first use: it costs more start-up time than the rest
+# of the analyzer, and most texts are short enough for the Python loop.
+# False once the import has failed.
+_numpy = None
+_BRACKET_DELTAS = None
+
+
+def load_numpy():
+    """
+    The numpy module, or None when it is not installed
+    """
+    global _numpy, _BRACKET_DELTAS
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - numpy is listed in requirements.txt
+            _numpy = False
+        else:
+            # Bracket delta of every byte value: +1 for ( [ {, -1 for ) ] }.
+            # UTF-8 never reuses ASCII byte values inside multi-byte
+            # characters, so bytes can be counted in place of characters.
+            deltas = numpy.zeros(256, dtype=numpy.int8)
+            deltas[[ord('('), ord('['), ord('{')]] = 1
+            deltas[[ord(')'), ord(']'), ord('}')]] = -1
+            _BRACKET_DELTAS = deltas
+            _numpy = numpy
+    return _numpy or None
+
+
+def python_nesting_profile(code: str) -> Tuple[int, int]:
+    """
+    Maximum bracket nesting depth and the depth left open at the end
+    """
+    max_depth = 0
+    current_depth = 0
+
+    for char in code:
+        if char in '{[(':
+            current_depth += 1
+            max_depth = max(max_depth, current_depth)
+        elif char in '}])':
+            current_depth -= 1
+
+    return max_depth, current_depth
+
+
+def vectorized_nesting_profile(code: str) -> Tuple[int, int]:
+    """
+    Same as ``python_nesting_profile``, computed with NumPy: the text is
+    converted to a uint8 buffer once, mapped to bracket deltas, and the
+    running depth is a cumulative sum over the bracket positions only.
+    """
+    np = load_numpy()
+    data = code.encode('utf-8', 'surrogatepass')
+    max_depth = 0
+    depth = 0
+    for start in range(0, len(data), BLOCK_BYTES):
+        block = np.frombuffer(data, dtype=np.uint8, count=min(BLOCK_BYTES, len(data) - start), offset=start)
+        deltas = _BRACKET_DELTAS[block]
+        steps = deltas[deltas != 0]
+        if steps.size:
+            running = np.cumsum(steps, dtype=np.int64)
+            max_depth = max(max_depth, depth + int(running.max()))
+            depth += int(running[-1])
+    return max_depth, depth
+
+
+def nesting_profile(code: str) -> Tuple[int, int]:
+    """
+    Maximum bracket nesting depth and the depth left open at the end,
+    vectorized for large texts
+    """
+    if len(code) < VECTORIZE_MIN_CHARS or load_numpy() is None:
+        return python_nesting_profile(code)
+    return vectorized_nesting_profile(code)
+
+
+def structural_profile(code: str, structure: bool = True) -> Tuple[int, int, int]:
+    """
+    Line count, maximum nesting depth and open depth at the end of a text.
+    The nesting values are None when ``structure`` is false.
+    """
+    total_lines = code.count('\n') + 1
+    if not structure:
+        return total_lines, None, None
+    max_depth, end_depth = nesting_profile(code)
+    return total_lines, max_depth, end_depth
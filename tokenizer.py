@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tokenizer: identifier, keyword and comment words of a source file
+One regular expression per language family, keyed by file extension, cuts
+string literals and comments out of the code in a single pass; what is left
+splits into identifiers and keywords, and identifiers into lower-case words
+(``getMetaData`` -> get, meta, data), so keywords are looked up in hash sets
+instead of being searched for in the raw text
+"""
+
+import keyword
+import re
+import string
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+# What each lexer skips: string literals and comments, the text of comments
+# captured. Unterminated strings and comments run to the end of their line
+# or of the file, and every loop is unrolled, so a lexer is a single linear
+# pass that the regex engine only enters at quote and comment characters.
+_DOUBLE_QUOTED = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"?'
+_SINGLE_QUOTED = r"'[^'\\\n]*(?:\\.[^'\\\n]*)*'?"
+_LEXERS = {
+    'python': re.compile(
+        r'"""[^"\\]*(?:(?:\\[\s\S]|"(?!""))[^"\\]*)*(?:"""|\Z)'
+        + r"|'''[^'\\]*(?:(?:\\[\s\S]|'(?!''))[^'\\]*)*(?:'''|\Z)"
+        + '|' + _DOUBLE_QUOTED + '|' + _SINGLE_QUOTED
+        + r'|#([^\n]*)'
+    ),
+    'c': re.compile(
+        _DOUBLE_QUOTED + '|' + _SINGLE_QUOTED
+        + r'|`[^`\\]*(?:\\[\s\S][^`\\]*)*`?'
+        + r'|/\*((?:[^*]|\*(?!/))*)(?:\*/|\Z)|//([^\n]*)'
+    ),
+    'hash': re.compile(_DOUBLE_QUOTED + '|' + _SINGLE_QUOTED + r'|#([^\n]*)'),
+}
+# String prefixes (f'...', rb"...") end the code before a string; matching
+# them in the lexer would cost it its fast search for quotes.
+_STRING_PREFIX = re.compile(r'(?<![\w.])[bBrRuUfF]{1,2}\Z')
+_PREFIX_LETTERS = frozenset('bBrRuUfF')
+# What is left of the code splits into names at ASCII punctuation.
+_SEPARATORS = str.maketrans(dict.fromkeys(string.punctuation.replace('_', ''), ' '))
+LANGUAGES = {
+    **dict.fromkeys(('.py', '.pyw', '.pyi'), 'python'),
+    **dict.fromkeys((
+        '.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.java', '.c', '.h', '.cc', '.cpp', '.hpp', '.cs', '.go',
+        '.rs', '.swift', '.kt', '.kts', '.scala', '.php', '.dart',
+    ), 'c'),
+    **dict.fromkeys(('.rb', '.sh', '.bash', '.zsh', '.pl', '.r', '.yaml', '.yml', '.toml', '.cfg', '.ini'), 'hash'),
+}
+KEYWORDS = {
+    'python': frozenset(keyword.kwlist) | frozenset(getattr(keyword, 'softkwlist', ())),
+    'c': frozenset({
+        'abstract', 'async', 'await', 'break', 'case', 'catch', 'class', 'const', 'continue', 'debugger',
+        'default', 'delete', 'do', 'else', 'enum', 'export', 'extends', 'false', 'final', 'finally', 'for',
+        'func', 'function', 'go', 'if', 'implements', 'import', 'in', 'instanceof', 'interface', 'let', 'new',
+        'null', 'package', 'private', 'protected', 'public', 'return', 'static', 'struct', 'super', 'switch',
+        'this', 'throw', 'true', 'try', 'type', 'typeof', 'var', 'void', 'while', 'with', 'yield',
+    }),
+    'hash': frozenset(),
+}
+_PLAIN_WORD = re.compile(r'[^\W\d]\w*')
+_WORD_PART = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[^\W\d_A-Za-z]+')
+_KEYWORD_SEQUENCE = re.compile(r'[a-z]+(?:\\s\+[a-z]+)*')
+
+# Endings a keyword may carry and still count: 'learn' also counts
+# 'learning' and 'learner', 'like' counts 'liked' and 'likes' (but not
+# 'likely').
+INFLECTIONS = ('s', 'es', 'ed', 'ing', 'er', 'ers', 'ion', 'ions', 'ation', 'ations', 'ive', 'al', 'e')
+
+
+class TokenStream:
+    """
+    Word counts of one file: identifiers and language keywords (as
+    written) and the words of its comments; string literals are skipped
+    """
+    __slots__ = ('language', 'identifiers', 'keywords', 'comments')
+
+    def __init__(self, language: str, identifiers: Dict[str, int], keywords: Dict[str, int],
+                 comments: Dict[str, int]):
+        self.language = language
+        self.identifiers = identifiers
+        self.keywords = keywords
+        self.comments = comments
+
+
+def file_language(path: str) -> str:
+    """
+    Lexer of a file: 'python', 'c' (C-like syntax: JavaScript, TypeScript,
+    Java, Go...), 'hash' (#-comment languages) or 'plain' for anything else,
+    where every word counts
+    """
+    dot = path.rfind('.')
+    return LANGUAGES.get(path[dot:].lower(), 'plain') if dot > path.rfind('/') else 'plain'
+
+
+def tokenize_source(path: str, content: str) -> TokenStream:
+    """
+    Lex a file once into its token streams. Numbers are dropped, and so
+    are the prefixes of Python strings.
+    """
+    language = file_language(path)
+    lexer = _LEXERS.get(language)
+    if lexer is None:
+        return TokenStream(language, Counter(_PLAIN_WORD.findall(content)), {}, {})
+    # Split at what the lexer skips: each stretch of code is followed by the
+    # groups of the lexer, the text of a comment in one of them (or in none,
+    # for a string).
+    width = lexer.groups + 1
+    parts = lexer.split(content)
+    code = parts[::width]
+    if language == 'python':
+        code[:-1] = [
+            _STRING_PREFIX.sub('', piece) if piece[-1:] in _PREFIX_LETTERS else piece for piece in code[:-1]
+        ]
+    code = ' '.join(code).translate(_SEPARATORS)
+    names = Counter(code.split())
+    for number in [name for name in names if name[0].isdigit()]:
+        del names[number]
+    keywords = {name: names.pop(name) for name in KEYWORDS[language].intersection(names)}
+    comments = [part for index in range(1, width) for part in parts[index::width] if part]
+    return TokenStream(language, names, keywords, Counter(_PLAIN_WORD.findall(' '.join(comments))))
+
+
+@lru_cache(maxsize=65536)
+def split_words(identifier: str) -> Tuple[str, ...]:
+    """
+    Lower-case words of an identifier, split at underscores, case changes
+    and digits
+    """
+    return tuple(part.lower() for part in _WORD_PART.findall(identifier))
+
+
+def inflections(word: str) -> Tuple[str, ...]:
+    """
+    A keyword and the inflected forms that count as it
+    """
+    forms = [word] + [word + ending for ending in INFLECTIONS]
+    if word.endswith('e'):
+        forms += [word[:-1] + ending for ending in INFLECTIONS if ending[0] in 'aeiou']
+    elif word.endswith('y'):
+        forms += [word[:-1] + 'ies', word[:-1] + 'ied']
+    return tuple(dict.fromkeys(forms))
+
+
+def keyword_sequences(pattern: str) -> Optional[Tuple[Tuple[str, ...], ...]]:
+    """
+    The word sequences a pattern stands for when it is an alternation of
+    lower-case words or words separated by ``\\s+`` (``loop|cascade``,
+    ``machine\\s+learning``), or None for any other pattern
+    """
+    alternatives = pattern.split('|')
+    if not all(_KEYWORD_SEQUENCE.fullmatch(alternative) for alternative in alternatives):
+        return None
+    return tuple(tuple(alternative.split('\\s+')) for alternative in alternatives)
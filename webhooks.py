@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+Webhook Ingestion: GitHub push and pull request events, coalesced
+Deliveries are checked against the webhook secret, and events for the same
+repository and branch (or pull request) that arrive within a debounce
+window collapse into one analysis of the latest commit. Pull requests are
+analyzed before pushes, on a bounded pool of worker threads. The queue can
+live in a SQLite file shared by every server process.
+"""
+
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from job_queue import QueueFull, process_alive
+from streaming import iter_tar
+
+PULL_REQUEST = 'pull_request'
+PUSH = 'push'
+# Lower runs first: reviews wait on pull request analyses, pushes are
+# background work.
+PRIORITIES = {PULL_REQUEST: 0, PUSH: 1}
+PULL_REQUEST_ACTIONS = frozenset({'opened', 'synchronize', 'reopened', 'ready_for_review'})
+# Finished analyses remembered for GET /api/webhooks.
+MAX_RESULTS = 1000
+COUNTERS = ('received', 'ignored', 'coalesced', 'rejected', 'processed', 'failed')
+# With a state file, how often idle workers look for events queued by other
+# processes, and for branches whose analysis died with its process.
+POLL_SECONDS = 0.5
+RECOVER_SECONDS = 30.0
+# Full commit ids only: the commit of a payload is handed to git.
+COMMIT_SHA = re.compile(r'[0-9a-f]{40}')
+# Pipelines of this process, whose running branches are not orphans.
+_OWNERS = set()
+
+
+class InvalidSignature(Exception):
+    """
+    Raised for deliveries whose X-Hub-Signature-256 does not match
+    """
+
+
+def sign(secret: str, body: bytes) -> str:
+    """
+    The X-Hub-Signature-256 header GitHub sends with a body
+    """
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    return bool(signature) and hmac.compare_digest(sign(secret, body), signature)
+
+
+class WebhookEvent:
+    """
+    An event worth analyzing: a push to a branch or a pull request update,
+    at ``commit``. Events with the same ``key`` supersede each other.
+    """
+    __slots__ = ('kind', 'repository', 'ref', 'commit', 'delivery')
+
+    def __init__(self, kind: str, repository: str, ref: str, commit: str, delivery: str = ''):
+        self.kind = kind
+        self.repository = repository
+        self.ref = ref
+        self.commit = commit
+        self.delivery = delivery
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.repository, self.ref
+
+    @property
+    def priority(self) -> int:
+        return PRIORITIES[self.kind]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'kind': self.kind, 'repository': self.repository, 'ref': self.ref, 'commit': self.commit,
+            'delivery': self.delivery,
+        }
+
+
+def parse_event(name: str, payload: Dict[str, Any], delivery: str = '') -> Optional[WebhookEvent]:
+    """
+    The event to analyze for a delivery of GitHub event ``name``, or None
+    when there is nothing to analyze (other events, tags, deleted branches,
+    closed pull requests). Raises ValueError for malformed payloads,
+    commits that are not full hexadecimal ids among them.
+    """
+    try:
+        repository = payload['repository']['full_name']
+        if name == PUSH:
+            ref = payload['ref']
+            if not ref.startswith('refs/heads/') or payload.get('deleted'):
+                return None
+            event = WebhookEvent(PUSH, repository, ref[len('refs/heads/'):], payload['after'], delivery)
+        elif name == PULL_REQUEST:
+            if payload.get('action') not in PULL_REQUEST_ACTIONS:
+                return None
+            pull_request = payload['pull_request']
+            event = WebhookEvent(
+                PULL_REQUEST, repository, f"pull/{pull_request['number']}", pull_request['head']['sha'], delivery,
+            )
+        else:
+            return None
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'Malformed {name} payload: missing {e}')
+    if not isinstance(event.commit, str) or not COMMIT_SHA.fullmatch(event.commit):
+        raise ValueError(f'Malformed {name} payload: invalid commit {event.commit!r}')
+    return event
+
+
+class WebhookPipeline:
+    """
+    Runs ``handler(event)`` for webhook events on ``workers`` threads.
+
+    - Coalesced: an event waits until ``debounce`` seconds pass without
+      another one for its repository and branch (but never more than
+      ``max_delay`` after the first), and only the latest is analyzed.
+      A branch is never analyzed twice at once; a push arriving during an
+      analysis waits for it.
+    - Prioritized: of the events ready to run, pull requests go first.
+    - Bounded: at most ``max_pending`` branches wait at a time; ``submit``
+      raises QueueFull beyond that.
+    - Waiting events, running branches, counters and results are kept in
+      SQLite (in memory without a ``path``). Server processes sharing the
+      file share all of them: a branch is coalesced and analyzed once
+      across the processes, never by two at a time, and a branch whose
+      analysis died with its process is queued again.
+    """
+
+    def __init__(self, handler: Callable[[WebhookEvent], Any], secret: Optional[str] = None,
+                 workers: int = 2, debounce: float = 2.0, max_delay: Optional[float] = None,
+                 max_pending: int = 256, path: Optional[str] = None):
+        self.handler = handler
+        self.secret = secret
+        self.debounce = debounce
+        self.max_delay = max_delay if max_delay is not None else 10 * debounce
+        self.max_pending = max_pending
+        self.path = path
+        # Identifies this pipeline's rows among those of other pipelines
+        # (and processes) sharing the file.
+        self._owner = uuid.uuid4().hex
+        _OWNERS.add(self._owner)
+        # Keys this pipeline is analyzing.
+        self._running = set()
+        self._recovered = time.time()
+        self._stopping = False
+        self._wake = threading.Condition()
+        self._db = sqlite3.connect(path or ':memory:', check_same_thread=False, isolation_level=None, timeout=30)
+        if path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS webhook_events ('
+            'repository TEXT NOT NULL, ref TEXT NOT NULL, event TEXT NOT NULL, priority INTEGER NOT NULL, '
+            'first REAL NOT NULL, latest REAL NOT NULL, PRIMARY KEY (repository, ref));'
+            'CREATE TABLE IF NOT EXISTS webhook_running ('
+            'repository TEXT NOT NULL, ref TEXT NOT NULL, event TEXT NOT NULL, owner TEXT NOT NULL, '
+            'pid INTEGER NOT NULL, started REAL NOT NULL, PRIMARY KEY (repository, ref));'
+            'CREATE TABLE IF NOT EXISTS webhook_results ('
+            'repository TEXT NOT NULL, ref TEXT NOT NULL, finished REAL NOT NULL, record TEXT NOT NULL, '
+            'PRIMARY KEY (repository, ref));'
+            'CREATE TABLE IF NOT EXISTS webhook_counts (name TEXT PRIMARY KEY, value REAL NOT NULL);'
+        )
+        with self._transaction() as db:
+            self._recover(db)
+        self._threads = [
+            threading.Thread(target=self._work, name=f'webhook-{index}', daemon=True) for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def receive(self, name: str, body: bytes, signature: Optional[str], delivery: str = '') -> Dict[str, Any]:
+        """
+        Handle one delivery: check its signature, parse it and queue the
+        event. Returns what happened to it ('queued', 'coalesced' or
+        'ignored').
+        """
+        if self.secret is None or not verify_signature(self.secret, body, signature):
+            raise InvalidSignature('Webhook signature does not match')
+        if name == 'ping':
+            return {'status': 'ignored', 'reason': 'ping'}
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise ValueError('Webhook body is not JSON')
+        event = parse_event(name, payload, delivery)
+        if event is None:
+            with self._transaction() as db:
+                self._count(db, 'ignored')
+            return {'status': 'ignored'}
+        return {'status': self.submit(event), 'event': event.to_dict()}
+
+    def submit(self, event: WebhookEvent) -> str:
+        """
+        Queue an event, replacing the pending one of its branch
+        """
+        now = time.time()
+        record = json.dumps(event.to_dict())
+        with self._transaction() as db:
+            self._count(db, 'received')
+            if db.execute('UPDATE webhook_events SET event = ?, priority = ?, latest = ? '
+                          'WHERE repository = ? AND ref = ?', (record, event.priority, now, *event.key)).rowcount:
+                self._count(db, 'coalesced')
+                status = 'coalesced'
+            else:
+                pending, = db.execute('SELECT COUNT(*) FROM webhook_events').fetchone()
+                if pending >= self.max_pending:
+                    self._count(db, 'rejected')
+                    status = None
+                else:
+                    db.execute(
+                        'INSERT INTO webhook_events (repository, ref, event, priority, first, latest) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', (*event.key, record, event.priority, now, now),
+                    )
+                    status = 'queued'
+            self._wake.notify_all()
+        if status is None:
+            raise QueueFull(f'{pending} branches are already waiting')
+        return status
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued event has been analyzed; False on timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._wake:
+            while self._db.execute(
+                'SELECT EXISTS (SELECT 1 FROM webhook_events) OR EXISTS (SELECT 1 FROM webhook_running)',
+            ).fetchone()[0]:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wake.wait(self._poll(remaining))
+        return True
+
+    def results(self) -> List[Dict[str, Any]]:
+        """
+        The latest analysis outcome of each branch, most recent last
+        """
+        with self._wake:
+            rows = self._db.execute('SELECT record FROM webhook_results ORDER BY finished').fetchall()
+        return [json.loads(record) for record, in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Event counts, queue depth and mean wait per kind
+        """
+        with self._wake:
+            counts = dict(self._db.execute('SELECT name, value FROM webhook_counts'))
+            pending, = self._db.execute('SELECT COUNT(*) FROM webhook_events').fetchone()
+            running, = self._db.execute('SELECT COUNT(*) FROM webhook_running').fetchone()
+        waited = {}
+        for kind in PRIORITIES:
+            started = counts.get(f'started.{kind}')
+            waited[kind] = round(counts[f'waited.{kind}'] / started, 4) if started else None
+        return {
+            **{name: int(counts.get(name, 0)) for name in COUNTERS},
+            'pending': pending,
+            'running': running,
+            'max_pending': self.max_pending,
+            'workers': len(self._threads),
+            'shared': self.path is not None,
+            'debounce_seconds': self.debounce,
+            'mean_wait_seconds': waited,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers after the analyses they are running. Events still
+        waiting stay in the file (if any) for the other processes sharing
+        it or the next start; in memory they are dropped (GitHub shows them
+        as delivered).
+        """
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            with self._wake:
+                self._db.close()
+        _OWNERS.discard(self._owner)
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Hold the pipeline lock and a write transaction on the state, which
+        other processes sharing the file wait for
+        """
+        with self._wake:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def _count(self, db: sqlite3.Connection, name: str, amount: float = 1) -> None:
+        db.execute(
+            'INSERT INTO webhook_counts (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value', (name, amount),
+        )
+
+    def _poll(self, timeout: Optional[float]) -> Optional[float]:
+        """
+        How long to wait for a wakeup: other processes sharing the file
+        cannot send one, so they are polled every ``POLL_SECONDS``
+        """
+        if self.path is None:
+            return timeout
+        return POLL_SECONDS if timeout is None else min(timeout, POLL_SECONDS)
+
+    def _next(self) -> Optional[WebhookEvent]:
+        """
+        Take the event to analyze next, or None
+        """
+        now = time.time()
+        with self._transaction() as db:
+            if self.path is not None and now - self._recovered >= RECOVER_SECONDS:
+                self._recover(db)
+            row = db.execute(
+                'SELECT repository, ref, event, first FROM webhook_events e '
+                'WHERE MIN(latest + ?, first + ?) <= ? AND NOT EXISTS ('
+                'SELECT 1 FROM webhook_running r WHERE r.repository = e.repository AND r.ref = e.ref) '
+                'ORDER BY priority, MIN(latest + ?, first + ?) LIMIT 1',
+                (self.debounce, self.max_delay, now, self.debounce, self.max_delay),
+            ).fetchone()
+            if row is None:
+                return None
+            repository, ref, record, first = row
+            event = WebhookEvent(**json.loads(record))
+            db.execute('DELETE FROM webhook_events WHERE repository = ? AND ref = ?', (repository, ref))
+            db.execute(
+                'INSERT INTO webhook_running (repository, ref, event, owner, pid, started) VALUES (?, ?, ?, ?, ?, ?)',
+                (repository, ref, record, self._owner, os.getpid(), now),
+            )
+            self._count(db, f'started.{event.kind}')
+            self._count(db, f'waited.{event.kind}', now - first)
+            self._running.add(event.key)
+        return event
+
+    def _timeout(self) -> Optional[float]:
+        """
+        Seconds until the next waiting event is ready
+        """
+        ready, = self._db.execute(
+            'SELECT MIN(MIN(latest + ?, first + ?)) FROM webhook_events e WHERE NOT EXISTS ('
+            'SELECT 1 FROM webhook_running r WHERE r.repository = e.repository AND r.ref = e.ref)',
+            (self.debounce, self.max_delay),
+        ).fetchone()
+        return self._poll(max(0.0, ready - time.time()) if ready is not None else None)
+
+    def _recover(self, db: sqlite3.Connection) -> None:
+        """
+        Queue again the branches left running by pipelines that are gone,
+        unless a newer event is already waiting for them
+        """
+        self._recovered = time.time()
+        rows = db.execute('SELECT repository, ref, event, owner, pid FROM webhook_running').fetchall()
+        for repository, ref, record, owner, pid in rows:
+            if owner in _OWNERS or (pid != os.getpid() and process_alive(pid)):
+                continue
+            db.execute('DELETE FROM webhook_running WHERE repository = ? AND ref = ?', (repository, ref))
+            db.execute(
+                'INSERT OR IGNORE INTO webhook_events (repository, ref, event, priority, first, latest) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (repository, ref, record, WebhookEvent(**json.loads(record)).priority,
+                 self._recovered, self._recovered),
+            )
+
+    def _work(self) -> None:
+        while True:
+            with self._wake:
+                event = self._next()
+                while event is None:
+                    if self._stopping:
+                        return
+                    self._wake.wait(self._timeout())
+                    event = self._next()
+            try:
+                result = {'status': 'done', 'result': self.handler(event)}
+                outcome = 'processed'
+            except Exception as e:
+                result = {'status': 'failed', 'error': str(e)}
+                outcome = 'failed'
+            finished = time.time()
+            with self._transaction() as db:
+                self._count(db, outcome)
+                self._running.discard(event.key)
+                db.execute('DELETE FROM webhook_running WHERE repository = ? AND ref = ? AND owner = ?',
+                           (*event.key, self._owner))
+                db.execute(
+                    'INSERT OR REPLACE INTO webhook_results (repository, ref, finished, record) VALUES (?, ?, ?, ?)',
+                    (*event.key, finished, json.dumps({**event.to_dict(), **result, 'finished': finished})),
+                )
+                db.execute(
+                    'DELETE FROM webhook_results WHERE finished < ('
+                    'SELECT finished FROM webhook_results ORDER BY finished DESC LIMIT 1 OFFSET ?)',
+                    (MAX_RESULTS - 1,),
+                )
+                self._wake.notify_all()
+
+
+class GitSource:
+    """
+    Files of a commit from local clones (or mirrors) under ``root``, at
+    ``root/owner/name`` or ``root/owner/name.git``; keeping them fetched is
+    left to whatever mirrors them
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def files(self, repository: str, commit: str) -> Dict[str, str]:
+        if not COMMIT_SHA.fullmatch(commit):
+            raise ValueError(f'Invalid commit id: {commit!r}')
+        path = os.path.join(self.root, *repository.split('/'))
+        if not os.path.isdir(path):
+            path += '.git'
+        if '..' in repository.split('/') or not os.path.isdir(path):
+            raise ValueError(f'No local clone of {repository}')
+        archive = subprocess.run(
+            ['git', '-C', path, 'archive', '--format=tar', commit],
+            capture_output=True, check=False,
+        )
+        if archive.returncode != 0:
+            raise ValueError(f'Cannot read {repository}@{commit}: {archive.stderr.decode(errors="replace").strip()}')
+        return {name: ''.join(chunks) for name, chunks in iter_tar(io.BytesIO(archive.stdout))}
+
+
+# Vocabulary of the fake source's files.
+FAKE_LINES = (
+    'def learn(self, feedback):\n    return self.adapt(feedback)\n',
+    'class Agent:\n    def decide(self, state):\n        return self.policy(state)\n',
+    'for item in items:\n    if item.score > limit: notify(item)\n',
+    'function share(post) {\n  return post.likes + 1;\n}\n',
+    'async def gather(tasks):\n    return [await task for task in tasks]\n',
+    'value = compute(data)\n',
+)
+
+
+class FakeEventSource:
+    """
+    Signed GitHub deliveries and the files of their commits, generated
+    locally: drives the pipeline (or a running server, see ``__main__``)
+    without GitHub or any network
+    """
+
+    def __init__(self, secret: str, seed: int = 0):
+        self.secret = secret
+        self._random = random.Random(seed)
+
+    def push(self, repository: str, branch: str, commit: Optional[str] = None) -> Tuple[str, str, bytes, str]:
+        """
+        A push delivery: (event name, delivery id, body, signature)
+        """
+        return self._delivery(PUSH, {
+            'ref': f'refs/heads/{branch}',
+            'before': self._sha(),
+            'after': commit or self._sha(),
+            'deleted': False,
+            'repository': {'full_name': repository},
+        })
+
+    def pull_request(self, repository: str, number: int, commit: Optional[str] = None,
+                     action: str = 'synchronize') -> Tuple[str, str, bytes, str]:
+        """
+        A pull_request delivery, ``synchronize`` by default (new commits)
+        """
+        return self._delivery(PULL_REQUEST, {
+            'action': action,
+            'number': number,
+            'pull_request': {'number': number, 'head': {'sha': commit or self._sha(), 'ref': f'feature-{number}'}},
+            'repository': {'full_name': repository},
+        })
+
+    def bursts(self, repositories: int = 5, branches: int = 2, pushes: int = 10,
+               pull_requests: int = 2) -> Iterator[Tuple[str, str, bytes, str]]:
+        """
+        Rapid pushes to every branch of every repository, interleaved, then
+        pull request updates
+        """
+        for _ in range(pushes):
+            for repository in range(repositories):
+                for branch in range(branches):
+                    yield self.push(f'org/repo-{repository}', f'branch-{branch}')
+        for repository in range(repositories):
+            for number in range(1, pull_requests + 1):
+                yield self.pull_request(f'org/repo-{repository}', number)
+
+    def files(self, repository: str, commit: str) -> Dict[str, str]:
+        """
+        The same small synthetic files for a commit in every process
+        """
+        rng = random.Random(f'{repository}@{commit}')
+        return {
+            f'src/module_{index}.py': ''.join(rng.choice(FAKE_LINES) for _ in range(rng.randint(5, 40)))
+            for index in range(rng.randint(2, 8))
+        }
+
+    def _delivery(self, name: str, payload: Dict[str, Any]) -> Tuple[str, str, bytes, str]:
+        body = json.dumps(payload).encode('utf-8')
+        return name, str(uuid.UUID(int=self._random.getrandbits(128))), body, sign(self.secret, body)
+
+    def _sha(self) -> str:
+        return '%040x' % self._random.getrandbits(160)
+
+
+def main(argv: List[str] = None) -> int:
+    """
+    Post a burst of fake deliveries to a local server started with
+    WEBHOOK_SOURCE=fake and the same secret
+    """
+    import argparse
+    import urllib.error
+    import urllib.request
+
+    parser = argparse.ArgumentParser(description='Send fake GitHub webhooks to a local Logospace server')
+    parser.add_argument('url', nargs='?', default='http://127.0.0.1:5000/api/webhooks/github')
+    parser.add_argument('--secret', default=os.getenv('GITHUB_WEBHOOK_SECRET', ''))
+    parser.add_argument('--repositories', type=int, default=5)
+    parser.add_argument('--pushes', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    statuses: Dict[str, int] = {}
+    source = FakeEventSource(args.secret)
+    for name, delivery, body, signature in source.bursts(args.repositories, pushes=args.pushes):
+        request = urllib.request.Request(args.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'X-GitHub-Event': name,
+            'X-GitHub-Delivery': delivery,
+            'X-Hub-Signature-256': signature,
+        })
+        try:
+            with urllib.request.urlopen(request) as response:
+                status = json.loads(response.read())['webhook']['status']
+        except urllib.error.HTTPError as e:
+            status = f'HTTP {e.code}'
+        statuses[status] = statuses.get(status, 0) + 1
+    print(json.dumps(statuses, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())